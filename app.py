@@ -2,158 +2,425 @@
 API com RandomForest + HOG para reconhecimento de alimentos.
 """
 
+import functools
+import hmac
+import io
 import os
 from pathlib import Path
-from datetime import datetime
 import numpy as np
-from PIL import Image
-import joblib
-from skimage.feature import hog
-from skimage import color
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, send_file
 from werkzeug.utils import secure_filename
+import time
 import traceback
 
+from storage import CACHE_IMUTAVEL, BackgroundWriter, UploadStore
+from cache import PredictionCache
+from database import NutritionDB
+from registry import ModelRegistry, bundle_vazio, carregar_bundle, exportar_metricas
+from scheduler import MicroBatcher
+import feature_pool
+import metrics
+from metrics import medir
+
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = "uploads"
 app.config["ALLOWED_EXTENSIONS"] = {"png", "jpg", "jpeg"}
+app.config["MAX_BATCH_SIZE"] = 64
+# Decodificar o upload direto da memória, sem gravar e reabrir do disco
+app.config["DECODIFICAR_EM_MEMORIA"] = os.environ.get("DECODIFICAR_EM_MEMORIA", "1") == "1"
+# Manter uma cópia do original em uploads/ (gravada em segundo plano no modo em memória)
+app.config["SALVAR_UPLOADS"] = os.environ.get("SALVAR_UPLOADS", "1") == "1"
+# Limpeza de uploads/ por tamanho total (MB) e idade (dias); 0 = sem limite
+app.config["UPLOADS_MAX_MB"] = float(os.environ.get("UPLOADS_MAX_MB", "0"))
+app.config["UPLOADS_MAX_DIAS"] = float(os.environ.get("UPLOADS_MAX_DIAS", "0"))
+# Lado máximo (px) das miniaturas usadas no histórico de refeições
+app.config["MINIATURA_PX"] = int(os.environ.get("MINIATURA_PX", "160"))
+# Cache de predições por conteúdo (CACHE_DIR habilita o nível em disco compartilhado)
+app.config["CACHE_MAX_ITENS"] = int(os.environ.get("CACHE_MAX_ITENS", "1024"))
+app.config["CACHE_TTL"] = float(os.environ.get("CACHE_TTL", "3600"))
+app.config["CACHE_DIR"] = os.environ.get("CACHE_DIR")
+# Tamanho máximo do nível em disco (0 = sem limite; as entradas expiradas sempre são removidas)
+app.config["CACHE_DISCO_MAX_MB"] = float(os.environ.get("CACHE_DISCO_MAX_MB", "256"))
+# Usar o motor de inferência compilado (forest.py) no lugar do sklearn
+app.config["FOREST_COMPILADO"] = os.environ.get("FOREST_COMPILADO", "1") == "1"
+# Incorporar o StandardScaler aos thresholds do forest compilado (sem scaler.transform)
+app.config["SCALER_INCORPORADO"] = os.environ.get("SCALER_INCORPORADO", "0") == "1"
+# Agrupar requisições concorrentes em micro-lotes (janela em ms ou tamanho máximo)
+app.config["MICROBATCH"] = os.environ.get("MICROBATCH", "0") == "1"
+app.config["MICROBATCH_JANELA_MS"] = float(os.environ.get("MICROBATCH_JANELA_MS", "5"))
+app.config["MICROBATCH_MAX"] = int(os.environ.get("MICROBATCH_MAX", "32"))
+# Processos dedicados à extração de features (0 = extrair na thread da requisição)
+app.config["PROCESSOS_FEATURES"] = int(os.environ.get("PROCESSOS_FEATURES", "0"))
+# HOG vetorizado em lote (fast_hog.py) no lugar de skimage.feature.hog
+app.config["HOG_VETORIZADO"] = os.environ.get("HOG_VETORIZADO", "1") == "1"
+# Decodificar JPEGs já reduzidos (draft/escala DCT) antes do resize final.
+# Desligado até verificar_decodificacao.py confirmar as predições nas imagens de referência
+app.config["JPEG_DRAFT"] = os.environ.get("JPEG_DRAFT", "0") == "1"
+# Quantidade de classes mais prováveis devolvidas no upload, com dados nutricionais
+app.config["TOP_K"] = int(os.environ.get("TOP_K", "3"))
+# Recarga do modelo: intervalo (s) de verificação de modelos_salvos/ (0 = desligada)
+# e token da rota POST /api/admin/recarregar-modelo (vazio = rota desligada)
+app.config["MODELO_RECARGA_INTERVALO"] = float(os.environ.get("MODELO_RECARGA_INTERVALO", "0"))
+app.config["ADMIN_TOKEN"] = os.environ.get("ADMIN_TOKEN", "")
 
 Path(app.config["UPLOAD_FOLDER"]).mkdir(exist_ok=True)
+upload_writer = BackgroundWriter()
+upload_store = UploadStore(
+    app.config["UPLOAD_FOLDER"],
+    upload_writer,
+    max_bytes=int(app.config["UPLOADS_MAX_MB"] * 1e6),
+    max_idade=app.config["UPLOADS_MAX_DIAS"] * 86400,
+    miniatura=(app.config["MINIATURA_PX"],) * 2,
+)
+prediction_cache = PredictionCache(
+    max_itens=app.config["CACHE_MAX_ITENS"],
+    ttl=app.config["CACHE_TTL"],
+    disk_dir=app.config["CACHE_DIR"],
+    disk_max_bytes=int(app.config["CACHE_DISCO_MAX_MB"] * 1e6),
+    writer=upload_writer,
+)
 
 # ============
 # CARREGAR MODELOS
 # ============
 MODEL_DIR = Path.cwd() / "modelos_salvos"
 
+
+def extractor_options():
+    """Opções do FeatureExtractor definidas pela configuração da aplicação."""
+    return {
+        "hog_vetorizado": app.config["HOG_VETORIZADO"],
+        "jpeg_draft": app.config["JPEG_DRAFT"],
+    }
+
+
+nutrition_db = None
+try:
+    nutrition_db = NutritionDB()
+    nutrition_db.init_app(app)
+except Exception as e:
+    print(f"[ERRO] Erro ao abrir o banco de dados nutricional: {e}")
+    traceback.print_exc()
+
+
+def carregar_modelo():
+    """Carrega a versão atual de `MODEL_DIR` em um `ModelBundle`."""
+    return carregar_bundle(MODEL_DIR, forest_compilado=app.config["FOREST_COMPILADO"],
+                           opcoes_extrator=extractor_options(), nutrition_db=nutrition_db,
+                           incorporar_scaler=app.config["SCALER_INCORPORADO"])
+
+
+def recarregar_e_aquecer():
+    """Carrega uma nova versão para troca em execução.
+
+    Além do aquecimento do bundle, inicia antes da troca o pool de processos
+    do novo layout de features (se ele mudou e o pool estiver em uso).
+    """
+    bundle = carregar_modelo()
+    if app.config["PROCESSOS_FEATURES"] > 0:
+        feature_pool.get_pool(bundle.feature_extractor.spec, app.config["PROCESSOS_FEATURES"],
+                              extractor_options())
+    return bundle
+
+
 # Carregar modelos com tratamento de erro para não travar o processo
-rf_model = None
-scaler = None
-label_encoder = None
 try:
-    print(f"Carregando modelos de: {MODEL_DIR}")
-    rf_model = joblib.load(MODEL_DIR / "rf_food_classifier.joblib")
-    scaler = joblib.load(MODEL_DIR / "scaler.joblib")
-    label_encoder = joblib.load(MODEL_DIR / "label_encoder.joblib")
-    print("[OK] Modelos carregados com sucesso")
-    try:
-        classes = getattr(label_encoder, 'classes_', None)
-        if classes is not None:
-            print(f"[OK] Label encoder com {len(classes)} classes")
-            print(f"[INFO] Classes disponiveis: {list(classes)}")
-    except Exception:
-        pass
+    _bundle_inicial = carregar_modelo()
 except Exception as e:
     print(f"[ERRO] Erro ao carregar modelos: {e}")
     traceback.print_exc()
+    _bundle_inicial = bundle_vazio(MODEL_DIR, extractor_options())
+
+model_registry = ModelRegistry(
+    MODEL_DIR, recarregar_e_aquecer, _bundle_inicial,
+    intervalo=app.config["MODELO_RECARGA_INTERVALO"],
+    ao_trocar=exportar_metricas,
+)
+exportar_metricas(None, _bundle_inicial)
+
+
+def modelos_carregados(bundle=None):
+    return (bundle or model_registry.atual()).carregado
+
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in app.config["ALLOWED_EXTENSIONS"]
 
 
-def extract_hog_features(image_path):
-    """Extrai features compatíveis com o scaler carregado.
+def guardar_upload(data, nome_original):
+    """Prepara os bytes de um upload para a predição.
 
-    Estratégia:
-    - Consulta `scaler.n_features_in_` (se disponível) e tenta produzir features
-      com esse tamanho.
-    - Suporta:
-      * HOG apenas
-      * RGB flatten (64x64x3=12288 ou 96x96x3=27648)
-      * Features combinadas (HOG + RGB) - melhor precisão
-    - Tenta múltiplos formatos automaticamente e retorna o array transformado.
+    O original vai para o armazenamento por conteúdo (`upload_store`): uma
+    imagem repetida não é gravada de novo. No modo em memória, retorna um
+    buffer com os bytes do upload e a gravação (se habilitada) fica para a
+    thread de escrita. Caso contrário, grava o arquivo e retorna o caminho,
+    como antes. Retorna também o nome público do arquivo salvo, ou `None`
+    quando o original não é mantido.
     """
-    # Carregar imagem em RGB
-    img = Image.open(image_path).convert("RGB")
+    if not app.config["DECODIFICAR_EM_MEMORIA"]:
+        with medir("salvar"):
+            filename = upload_store.guardar(data, nome_original, sincrono=True)
+        return str(upload_store.caminho(filename)), filename
 
-    expected = None
-    try:
-        expected = getattr(scaler, 'n_features_in_', None)
-    except Exception:
-        expected = None
-
-    # Tentar diferentes tamanhos e métodos
-    img_sizes = [96, 64, 128]  # Priorizar 96x96 (novo padrão)
-    
-    for img_size in img_sizes:
-        # 1) Features RGB normalizadas
-        img_rgb = img.resize((img_size, img_size))
-        arr_rgb = np.array(img_rgb).astype(np.float32) / 255.0
-        features_rgb = arr_rgb.flatten()
-        
-        # 2) Features HOG
-        img_gray = color.rgb2gray(arr_rgb)
-        features_hog = hog(
-            img_gray,
-            orientations=9,
-            pixels_per_cell=(8, 8),
-            cells_per_block=(2, 2),
-            visualize=False
-        )
-        
-        # 3) Features combinadas (HOG + RGB) - melhor precisão
-        features_combined = np.concatenate([features_rgb, features_hog])
-        
-        # Verificar qual formato corresponde ao esperado
-        if expected is not None:
-            if expected == features_combined.size:
-                # Features combinadas (padrão melhorado)
-                X = np.array([features_combined])
-                return scaler.transform(X)
-            elif expected == features_rgb.size:
-                # Apenas RGB
-                X = np.array([features_rgb])
-                return scaler.transform(X)
-            elif expected == features_hog.size:
-                # Apenas HOG
-                X = np.array([features_hog])
-                return scaler.transform(X)
-    
-    # Se não encontrou correspondência exata, tentar features combinadas (mais comum agora)
-    try:
-        img_size = 96
-        img_rgb = img.resize((img_size, img_size))
-        arr_rgb = np.array(img_rgb).astype(np.float32) / 255.0
-        features_rgb = arr_rgb.flatten()
-        img_gray = color.rgb2gray(arr_rgb)
-        features_hog = hog(
-            img_gray,
-            orientations=9,
-            pixels_per_cell=(8, 8),
-            cells_per_block=(2, 2),
-            visualize=False
-        )
-        features_combined = np.concatenate([features_rgb, features_hog])
-        X = np.array([features_combined])
-        return scaler.transform(X)
-    except Exception as e1:
-        # Fallback para apenas RGB
+    if app.config["SALVAR_UPLOADS"]:
+        with medir("salvar"):
+            filename = upload_store.guardar(data, nome_original)
+        return io.BytesIO(data), filename
+    return io.BytesIO(data), None
+
+
+def _ler_bytes(imagem):
+    if isinstance(imagem, io.BytesIO):
+        return imagem.getvalue()
+    with open(imagem, "rb") as f:
+        return f.read()
+
+
+def extract_raw_features(imagens, bundle=None, falhas=None):
+    """Matriz `(N, n_features)` de features brutas (antes do scaler).
+
+    Com `PROCESSOS_FEATURES > 0` a extração roda no pool de processos de
+    `feature_pool.py`; caso contrário, na thread atual.
+
+    Sem `falhas`, uma imagem ilegível interrompe o lote com a exceção. Com uma
+    lista em `falhas`, os índices das imagens ilegíveis são adicionados a ela
+    e as linhas correspondentes da matriz ficam indefinidas; as demais são
+    extraídas normalmente.
+    """
+    extrator = (bundle or model_registry.atual()).feature_extractor
+    if app.config["PROCESSOS_FEATURES"] > 0:
+        metrics.CAMINHO_FEATURES.inc(len(imagens), execucao="pool",
+                                     hog=extrator.implementacao_hog)
+        pool = feature_pool.get_pool(extrator.spec, app.config["PROCESSOS_FEATURES"],
+                                     extractor_options())
+        # As etapas internas rodam nos processos do pool; aqui só o total
+        with medir("extracao_pool"):
+            return pool.extract_batch([_ler_bytes(imagem) for imagem in imagens], falhas)
+    metrics.CAMINHO_FEATURES.inc(len(imagens), execucao="local",
+                                 hog=extrator.implementacao_hog)
+    if falhas is None:
+        return extrator.extract_batch([extrator.load(imagem) for imagem in imagens])
+
+    carregadas, indices = [], []
+    for i, imagem in enumerate(imagens):
         try:
-            img_size = 96
-            img_rgb = img.resize((img_size, img_size))
-            arr_rgb = np.array(img_rgb).astype(np.float32) / 255.0
-            features_rgb = arr_rgb.flatten()
-            X = np.array([features_rgb])
-            return scaler.transform(X)
-        except Exception as e2:
-            raise Exception(f"Erro ao extrair features: {e1}, fallback: {e2}")
+            carregadas.append(extrator.load(imagem))
+            indices.append(i)
+        except Exception as e:
+            print(f"[WARN] Imagem {i} do lote ilegível: {e}")
+            falhas.append(i)
+    X = np.empty((len(imagens), extrator.spec.n_features), dtype=np.float64)
+    if carregadas:
+        X[indices] = extrator.extract_batch(carregadas)
+    return X
 
 
-def predict(image_path):
-    x = extract_hog_features(image_path)
-    if rf_model is None or scaler is None or label_encoder is None:
+def extract_hog_features(image_path, bundle=None):
+    """Extrai features com o layout resolvido no carregamento e aplica o scaler.
+
+    `image_path` pode ser um caminho ou um objeto file-like (upload em memória).
+    Retorna um array `(1, n_features)` já transformado.
+    """
+    bundle = bundle or model_registry.atual()
+    return bundle.feature_extractor.transform(extract_raw_features([image_path], bundle))
+
+
+def classify_matrix(X, k=1, bundle=None):
+    """Classifica uma matriz de features já transformadas.
+
+    Retorna `(labels, confiancas)`, ambos `(N, k)` e em ordem decrescente de
+    probabilidade (ver `ModelBundle.classify_matrix`).
+    """
+    return (bundle or model_registry.atual()).classify_matrix(X, k)
+
+
+def _ranking(labels, confiancas):
+    return [(str(label), float(conf)) for label, conf in zip(labels, confiancas)]
+
+
+def classify_raw_batch(vetores, bundle=None):
+    """Aplica o scaler e o forest a uma lista de vetores de features brutas.
+
+    Uma matriz, uma transformação, uma travessia. Retorna, para cada vetor,
+    o ranking `[(label, confianca), ...]` com até `TOP_K` classes.
+    """
+    bundle = bundle or model_registry.atual()
+    X = bundle.feature_extractor.transform(np.vstack(vetores))
+    labels, confiancas = bundle.classify_matrix(X, app.config["TOP_K"])
+    return [_ranking(l, c) for l, c in zip(labels, confiancas)]
+
+
+def classify_raw_items(itens):
+    """Usada pelo micro-batcher: `itens` são pares `(bundle, vetor)`.
+
+    Itens de versões diferentes do modelo (durante uma troca) são
+    classificados cada um pelo seu bundle, preservando a ordem.
+    """
+    resultados = [None] * len(itens)
+    grupos = {}
+    for i, (bundle, _) in enumerate(itens):
+        grupos.setdefault(id(bundle), (bundle, []))[1].append(i)
+    for bundle, indices in grupos.values():
+        rankings = classify_raw_batch([itens[i][1] for i in indices], bundle)
+        for i, ranking in zip(indices, rankings):
+            resultados[i] = ranking
+    return resultados
+
+
+inference_batcher = None
+if app.config["MICROBATCH"]:
+    inference_batcher = MicroBatcher(
+        classify_raw_items,
+        max_batch=app.config["MICROBATCH_MAX"],
+        janela_ms=app.config["MICROBATCH_JANELA_MS"],
+    )
+
+
+def rank(image_path, bundle=None):
+    """Ranking `[(label, confianca), ...]` das classes mais prováveis de uma imagem."""
+    bundle = bundle or model_registry.atual()
+    if inference_batcher is not None and bundle.carregado:
+        # As features são extraídas na thread da requisição; scaler e forest
+        # rodam no micro-lote junto com as requisições concorrentes
+        vetor = extract_raw_features([image_path], bundle)[0]
+        try:
+            return inference_batcher.submit((bundle, vetor)).result(timeout=30)
+        except Exception as e:
+            print(f"Erro durante predição: {e}")
+            metrics.ERROS_INFERENCIA.inc(motivo="excecao")
+            return [("erro_na_predicao", 0.0)]
+
+    x = extract_hog_features(image_path, bundle)
+    if not bundle.carregado:
         print("[WARN] Modelos não carregados - retornando fallback")
-        return "alimento_desconhecido", 0.0
+        metrics.ERROS_INFERENCIA.inc(motivo="sem_modelo")
+        return [("alimento_desconhecido", 0.0)]
 
     try:
-        pred = rf_model.predict(x)[0]
-        proba = max(rf_model.predict_proba(x)[0])
-        label = label_encoder.inverse_transform([pred])[0]
-        return label, float(proba)
+        labels, confiancas = bundle.classify_matrix(x, app.config["TOP_K"])
+        return _ranking(labels[0], confiancas[0])
     except Exception as e:
         print(f"Erro durante predição: {e}")
         traceback.print_exc()
-        return "erro_na_predicao", 0.0
+        metrics.ERROS_INFERENCIA.inc(motivo="excecao")
+        return [("erro_na_predicao", 0.0)]
+
+
+def predict(image_path):
+    """Classe prevista para uma imagem: `(label, confianca)`."""
+    return rank(image_path)[0]
+
+
+def rank_batch(image_paths, bundle=None):
+    """Classifica várias imagens com uma única chamada ao scaler e ao forest.
+
+    Monta uma matriz `(N, n_features)` com as features de todas as imagens,
+    aplica `scaler.transform` uma vez e avalia o forest uma vez.
+    Aceita caminhos ou objetos file-like. Retorna um ranking
+    `[(label, confianca), ...]` por imagem, na mesma ordem da entrada.
+    """
+    bundle = bundle or model_registry.atual()
+    if not image_paths:
+        return []
+    if not bundle.carregado:
+        print("[WARN] Modelos não carregados - retornando fallback")
+        metrics.ERROS_INFERENCIA.inc(len(image_paths), motivo="sem_modelo")
+        return [[("alimento_desconhecido", 0.0)]] * len(image_paths)
+
+    # Uma imagem ilegível recebe erro sozinha; as demais seguem para o forest
+    falhas = []
+    resultados = [[("erro_na_predicao", 0.0)]] * len(image_paths)
+    try:
+        X = extract_raw_features(image_paths, bundle, falhas)
+        if falhas:
+            metrics.ERROS_INFERENCIA.inc(len(falhas), motivo="imagem_invalida")
+        ilegiveis = set(falhas)
+        validos = [i for i in range(len(image_paths)) if i not in ilegiveis]
+        if validos:
+            for i, ranking in zip(validos, classify_raw_batch(X[validos], bundle)):
+                resultados[i] = ranking
+        return resultados
+    except Exception as e:
+        print(f"Erro durante predição em lote: {e}")
+        traceback.print_exc()
+        metrics.ERROS_INFERENCIA.inc(len(image_paths) - len(falhas), motivo="excecao")
+        return [[("erro_na_predicao", 0.0)]] * len(image_paths)
+
+
+def predict_batch(image_paths):
+    """Como `rank_batch`, mas apenas a classe prevista: lista de `(label, confianca)`."""
+    return [ranking[0] for ranking in rank_batch(image_paths)]
+
+
+# Resultados de fallback não são guardados no cache
+_NAO_CACHEAR = {"alimento_desconhecido", "erro_na_predicao"}
+
+
+def _do_cache(chave):
+    em_cache = prediction_cache.get(chave)
+    # Entradas antigas guardavam só `[label, confianca]`: tratadas como ausentes
+    if em_cache is None or not isinstance(em_cache[0], list):
+        return None
+    return [(label, confianca) for label, confianca in em_cache]
+
+
+def _guardar_no_cache(chave, ranking):
+    if ranking[0][0] not in _NAO_CACHEAR:
+        prediction_cache.set(chave, [[label, confianca] for label, confianca in ranking])
+
+
+def rank_cached(data, imagem, bundle):
+    """`rank()` precedido do cache de predições por hash do conteúdo.
+
+    A chave inclui a versão do bundle: uma troca de modelo não reaproveita
+    predições da versão anterior.
+    """
+    chave = PredictionCache.key(data, bundle.versao)
+    ranking = _do_cache(chave)
+    if ranking is None:
+        ranking = rank(imagem, bundle)
+        _guardar_no_cache(chave, ranking)
+    return ranking
+
+
+def rank_batch_cached(itens, bundle):
+    """`rank_batch()` precedido do cache; `itens` é uma lista de `(data, imagem)`.
+
+    Apenas as imagens ausentes do cache passam pela extração e pelo forest.
+    """
+    resultados = [None] * len(itens)
+    chaves = [PredictionCache.key(data, bundle.versao) for data, _ in itens]
+    faltantes = []
+    for i, chave in enumerate(chaves):
+        resultados[i] = _do_cache(chave)
+        if resultados[i] is None:
+            faltantes.append(i)
+
+    rankings = rank_batch([itens[i][1] for i in faltantes], bundle)
+    for i, ranking in zip(faltantes, rankings):
+        resultados[i] = ranking
+        _guardar_no_cache(chaves[i], ranking)
+    return resultados
+
+
+def resposta_predicao(filename, ranking, bundle):
+    """Corpo da resposta de um upload classificado, com os dados nutricionais
+    já resolvidos no carregamento (`nutricao_por_classe` do bundle)."""
+    alimento, confianca = ranking[0]
+    nutricao = bundle.nutricao_por_classe
+    return {
+        "imagem": filename,
+        "miniatura": upload_store.nome_miniatura(filename) if filename else None,
+        "alimento_reconhecido": alimento,
+        "confianca": confianca,
+        "nutricao": nutricao.get(alimento),
+        "top_k": [
+            {"alimento": label, "confianca": conf, "nutricao": nutricao.get(label)}
+            for label, conf in ranking
+        ],
+        "versao_modelo": bundle.versao,
+    }
 
 
 # ============
@@ -165,40 +432,186 @@ def index():
     return render_template("index.html")
 
 
+def contar_requisicao(rota):
+    """Decorador: conta as requisições por status e mede a duração total.
+
+    A função decorada retorna `(corpo, status)`; exceções contam como 500.
+    """
+    def decorador(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            status = 500
+            try:
+                corpo, status = fn(*args, **kwargs)
+                return corpo, status
+            finally:
+                metrics.REQUISICOES.inc(rota=rota, status=status)
+                metrics.DURACAO_REQUISICOES.observe(time.perf_counter() - inicio, rota=rota)
+        return wrapper
+    return decorador
+
+
+@contar_requisicao("/api/upload")
+def processar_upload(nome_original, data):
+    """Valida, classifica e guarda um upload. Retorna `(corpo, status)`.
+
+    Independente do framework: usada pela rota Flask e pelo modo ASGI (`asgi.py`).
+    `nome_original=None` indica que a requisição não trouxe o campo `file`.
+    """
+    if nome_original is None:
+        return {"error": "Nenhum arquivo enviado"}, 400
+
+    if nome_original == "":
+        return {"error": "Arquivo vazio"}, 400
+
+    if not allowed_file(nome_original):
+        return {"error": "Formato não permitido"}, 400
+
+    imagem, filename = guardar_upload(data, nome_original)
+
+    print(f"[INFO] Arquivo recebido: {nome_original} -> {filename or 'não salvo'}")
+    # A requisição inteira usa a mesma versão do modelo, mesmo se houver troca
+    bundle = model_registry.atual()
+    ranking = rank_cached(data, imagem, bundle)
+    print(f"[INFO] Resultado da predição: {ranking[0][0]} (conf: {ranking[0][1]})")
+
+    return resposta_predicao(filename, ranking, bundle), 200
+
+
+@contar_requisicao("/api/upload-batch")
+def processar_lote(arquivos):
+    """Valida, classifica e guarda vários uploads `(nome_original, data)`.
+
+    Retorna `(corpo, status)`.
+    """
+    if not arquivos:
+        return {"error": "Nenhum arquivo enviado"}, 400
+
+    if len(arquivos) > app.config["MAX_BATCH_SIZE"]:
+        return {
+            "error": f"Máximo de {app.config['MAX_BATCH_SIZE']} arquivos por lote"
+        }, 400
+
+    resultados = [None] * len(arquivos)
+    validos = []
+    for i, (nome_original, data) in enumerate(arquivos):
+        if nome_original == "":
+            resultados[i] = {"error": "Arquivo vazio"}
+            continue
+        if not allowed_file(nome_original):
+            resultados[i] = {"arquivo": nome_original, "error": "Formato não permitido"}
+            continue
+
+        imagem, filename = guardar_upload(data, nome_original)
+        validos.append((i, filename, (data, imagem)))
+
+    print(f"[INFO] Lote recebido: {len(arquivos)} arquivos ({len(validos)} válidos)")
+    bundle = model_registry.atual()
+    rankings = rank_batch_cached([item for _, _, item in validos], bundle)
+    for (i, filename, _), ranking in zip(validos, rankings):
+        resultados[i] = resposta_predicao(filename, ranking, bundle)
+
+    return {"resultados": resultados}, 200
+
+
+def localizar_upload(filename):
+    """`(caminho, bytes pendentes, etag)` de um upload do armazenamento por conteúdo.
+
+    Os bytes pendentes são os de um arquivo ainda na fila de gravação em
+    segundo plano. Para nomes fora do armazenamento (uploads antigos, com
+    data e hora no nome), retorna `(None, None, None)`.
+    """
+    nome = secure_filename(filename)
+    etag = upload_store.etag(nome)
+    if etag is None:
+        return None, None, None
+    return upload_store.caminho(nome), upload_store.pendente(nome), etag
+
+
 @app.route("/api/upload", methods=["POST"])
 def upload():
-    if "file" not in request.files:
-        return jsonify({"error": "Nenhum arquivo enviado"}), 400
+    file = request.files.get("file")
+    if file is None:
+        corpo, status = processar_upload(None, b"")
+    else:
+        corpo, status = processar_upload(file.filename, file.read())
+    return jsonify(corpo), status
 
-    file = request.files["file"]
 
-    if file.filename == "":
-        return jsonify({"error": "Arquivo vazio"}), 400
+@app.route("/api/upload-batch", methods=["POST"])
+def upload_batch():
+    files = request.files.getlist("files") or request.files.getlist("file")
+    corpo, status = processar_lote([(file.filename, file.read()) for file in files])
+    return jsonify(corpo), status
 
-    if not allowed_file(file.filename):
-        return jsonify({"error": "Formato não permitido"}), 400
 
-    filename = datetime.now().strftime("%Y%m%d_%H%M%S_") + secure_filename(file.filename)
-    filepath = Path(app.config["UPLOAD_FOLDER"]) / filename
-    file.save(filepath)
+@app.route("/api/cache/stats")
+def cache_stats():
+    stats = prediction_cache.stats()
+    if inference_batcher is not None:
+        stats["microbatch"] = inference_batcher.stats()
+    return jsonify(stats)
 
-    print(f"[INFO] Arquivo recebido: {filename} -> salvando em {filepath}")
-    alimento, confianca = predict(str(filepath))
-    print(f"[INFO] Resultado da predição: {alimento} (conf: {confianca})")
 
-    return jsonify({
-        "imagem": filename,
-        "alimento_reconhecido": alimento,
-        "confianca": confianca
-    })
+@app.route("/api/admin/recarregar-modelo", methods=["POST"])
+def recarregar_modelo():
+    """Carrega e publica a versão atual de `modelos_salvos/` neste processo."""
+    token = app.config["ADMIN_TOKEN"]
+    if not token:
+        return jsonify({"error": "Recarga manual desabilitada (defina ADMIN_TOKEN)"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return jsonify({"error": "Não autorizado"}), 401
+
+    forcar = request.args.get("forcar") == "1"
+    resultado = model_registry.recarregar(forcar=forcar)
+    return jsonify(resultado), 500 if "erro" in resultado else 200
+
+
+@app.route("/api/refeicoes")
+def listar_refeicoes():
+    """Histórico de refeições, paginado por cursor (`?limite=50&cursor=...`)."""
+    if nutrition_db is None:
+        return jsonify({"error": "Banco de dados indisponível"}), 503
+    try:
+        limite = int(request.args.get("limite", 50))
+        pagina = nutrition_db.pagina_refeicoes(limite, request.args.get("cursor") or None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(pagina)
+
+
+@app.route("/api/modelo")
+def modelo_info():
+    return jsonify(model_registry.stats())
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Métricas do processo no formato do Prometheus."""
+    return Response(metrics.expor(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route("/uploads/<filename>")
 def get_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    path, pendente, etag = localizar_upload(filename)
+    if etag is None:
+        # Uploads gravados antes do armazenamento por conteúdo
+        return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+
+    # O arquivo pode ainda estar na fila de gravação em segundo plano
+    if pendente is not None:
+        resposta = send_file(io.BytesIO(pendente), download_name=filename, etag=etag)
+    elif path.is_file():
+        resposta = send_file(path.resolve(), etag=etag)
+    else:
+        return jsonify({"error": "Arquivo não encontrado"}), 404
+    # Conteúdo endereçado pelo hash: o mesmo nome nunca muda
+    resposta.headers["Cache-Control"] = CACHE_IMUTAVEL
+    return resposta
 
 
 if __name__ == "__main__":
     print("Servidor rodando...")
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG", "1") == "1")
 
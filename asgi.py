@@ -0,0 +1,108 @@
+"""
+Modo ASGI da API, para servir muitas conexões lentas com poucos processos.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+O corpo multipart dos uploads é lido no event loop (sem ocupar uma thread por
+conexão enquanto o cliente envia a imagem); apenas a decodificação, a
+extração de features e a inferência, que são CPU, vão para um pool de threads
+de tamanho fixo (`ASGI_THREADS`). As rotas de upload reutilizam
+`processar_upload`/`processar_lote` do `app.py`, com os mesmos caches e o
+mesmo micro-batcher; as demais rotas são atendidas pelo app Flask montado
+via WSGI.
+"""
+
+import asyncio
+import mimetypes
+import os
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.utils import secure_filename
+
+import app as flask_app
+from storage import CACHE_IMUTAVEL, etag_corresponde
+
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi-cpu")
+
+
+async def _em_thread(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, fn, *args)
+
+
+async def upload(request):
+    form = await request.form()
+    try:
+        file = form.get("file")
+        if file is None or isinstance(file, str):
+            nome, data = None, b""
+        else:
+            nome, data = file.filename or "", await file.read()
+    finally:
+        await form.close()
+
+    corpo, status = await _em_thread(flask_app.processar_upload, nome, data)
+    return JSONResponse(corpo, status_code=status)
+
+
+async def upload_batch(request):
+    form = await request.form(max_files=flask_app.app.config["MAX_BATCH_SIZE"] + 1)
+    try:
+        files = form.getlist("files") or form.getlist("file")
+        arquivos = [
+            (file.filename or "", await file.read())
+            for file in files if not isinstance(file, str)
+        ]
+    finally:
+        await form.close()
+
+    corpo, status = await _em_thread(flask_app.processar_lote, arquivos)
+    return JSONResponse(corpo, status_code=status)
+
+
+async def get_file(request):
+    filename = secure_filename(request.path_params["filename"])
+    path, pendente, etag = flask_app.localizar_upload(filename)
+    if etag is None:
+        # Uploads gravados antes do armazenamento por conteúdo
+        path = Path(flask_app.app.config["UPLOAD_FOLDER"]) / filename
+        if not filename or not path.is_file():
+            return JSONResponse({"error": "Arquivo não encontrado"}, status_code=404)
+        return FileResponse(path)
+
+    # Conteúdo endereçado pelo hash: o mesmo nome nunca muda
+    headers = {"ETag": f'"{etag}"', "Cache-Control": CACHE_IMUTAVEL}
+    if etag_corresponde(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    # O arquivo pode ainda estar na fila de gravação em segundo plano
+    if pendente is not None:
+        media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return Response(pendente, media_type=media_type, headers=headers)
+    if not path.is_file():
+        return JSONResponse({"error": "Arquivo não encontrado"}, status_code=404)
+    return FileResponse(path, headers=headers)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    _executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route("/api/upload", upload, methods=["POST"]),
+        Route("/api/upload-batch", upload_batch, methods=["POST"]),
+        Route("/uploads/{filename}", get_file),
+        Mount("/", WSGIMiddleware(flask_app.app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,258 @@
+"""
+Microbenchmarks das etapas de inferência, com comparação entre execuções.
+
+Mede cada etapa de `extract_hog_features()` e `predict()` isoladamente —
+decodificação, resize, `rgb2gray`, HOG (skimage e vetorizado), concatenação,
+scaler e forest (sklearn e compilado) — e o caminho completo, para cada
+tamanho de imagem e tamanho de lote:
+
+    python bench_inferencia.py --saida bench.json
+    python bench_inferencia.py --tamanhos 96 --lotes 1,64 --saida rapido.json
+
+Para comparar duas execuções e falhar (código 1) se alguma etapa ficar mais
+lenta que o limite:
+
+    python bench_inferencia.py --comparar antes.json depois.json --limite 0.15
+
+Sem `--model-dir`, scaler e forest são treinados com dados sintéticos do
+tamanho de cada layout (o forest fica mais raso que um modelo real); com
+`--model-dir`, os artefatos reais são usados no tamanho de imagem que
+corresponder ao layout deles.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from skimage import color
+from skimage.feature import hog
+
+from fast_hog import BatchHOG
+from features import FeatureExtractor, FeatureSpec, resolve_feature_spec
+from forest import CompiledForest
+from model_pack import PackedScaler
+
+SEED = 0
+
+# Tamanho das fotos de entrada (um JPEG típico de celular já reduzido pelo app)
+TAMANHO_FOTO = (1024, 768)
+
+
+def medir(fn, tempo_min: float = 0.2, min_rep: int = 5, max_rep: int = 200):
+    """Chama `fn` (após uma chamada de aquecimento) até `tempo_min` segundos
+    e pelo menos `min_rep` vezes. Retorna os tempos de cada chamada, em segundos."""
+    fn()
+    tempos = []
+    inicio = time.perf_counter()
+    while len(tempos) < max_rep and (len(tempos) < min_rep or time.perf_counter() - inicio < tempo_min):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    return np.array(tempos)
+
+
+def fotos_sinteticas(n: int, seed: int = SEED):
+    """JPEGs sintéticos (gradiente com ruído) de `TAMANHO_FOTO`."""
+    rng = np.random.RandomState(seed)
+    largura, altura = TAMANHO_FOTO
+    base = np.linspace(0, 255, largura, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    fotos = []
+    for _ in range(n):
+        arr = base + rng.normal(0, 40, size=(altura, largura, 3)) + rng.randint(0, 255, size=3)
+        buf = io.BytesIO()
+        Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=85)
+        fotos.append(buf.getvalue())
+    return fotos
+
+
+def modelo_sintetico(n_features: int, n_arvores: int, n_amostras: int = 400):
+    """Scaler e RandomForest treinados em dados aleatórios com `n_features` colunas."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.RandomState(SEED)
+    X = rng.uniform(0, 1, size=(n_amostras, n_features)).astype(np.float32)
+    y = rng.randint(0, 10, size=n_amostras)
+    scaler = StandardScaler().fit(X)
+    rf = RandomForestClassifier(n_estimators=n_arvores, min_samples_leaf=2, max_features="sqrt",
+                                random_state=SEED, n_jobs=1).fit(scaler.transform(X), y)
+    return scaler, rf
+
+
+def modelo_real(model_dir: Path):
+    import joblib
+
+    scaler = joblib.load(model_dir / "scaler.joblib")
+    rf = joblib.load(model_dir / "rf_food_classifier.joblib")
+    return resolve_feature_spec(scaler, model_dir), scaler, rf
+
+
+def etapas(spec: FeatureSpec, fotos, scaler, rf):
+    """Funções sem argumentos de cada etapa para o lote `fotos`, com as entradas já prontas."""
+    extrator = FeatureExtractor(spec, scaler, hog_vetorizado=True, jpeg_draft=True)
+    tamanho = (spec.img_size, spec.img_size)
+    forest = CompiledForest.from_sklearn(rf)
+    packed = PackedScaler.from_sklearn(scaler)
+    batch_hog = BatchHOG(tamanho, orientations=spec.orientations,
+                         pixels_per_cell=spec.pixels_per_cell, cells_per_block=spec.cells_per_block)
+    kwargs_hog = dict(orientations=spec.orientations, pixels_per_cell=spec.pixels_per_cell,
+                      cells_per_block=spec.cells_per_block, visualize=False)
+
+    imgs = [Image.open(io.BytesIO(f)).convert("RGB") for f in fotos]
+    arr = np.stack([np.array(img.resize(tamanho)) for img in imgs]).astype(np.float32) / 255.0
+    cinza = color.rgb2gray(arr)
+    rgb = arr.reshape(len(fotos), -1)
+    hogs = batch_hog(cinza)
+    X_bruto = extrator.extract_batch(imgs)
+    X = scaler.transform(X_bruto)
+
+    def pipeline():
+        lote = [extrator.load(io.BytesIO(f)) for f in fotos]
+        forest.predict_with_proba(extrator.transform(extrator.extract_batch(lote)))
+
+    return {
+        "decodificar": lambda: [Image.open(io.BytesIO(f)).convert("RGB") for f in fotos],
+        "decodificar_draft": lambda: [extrator.load(io.BytesIO(f)) for f in fotos],
+        "redimensionar": lambda: np.stack([np.array(img.resize(tamanho)) for img in imgs]
+                                          ).astype(np.float32) / 255.0,
+        "cinza": lambda: color.rgb2gray(arr),
+        "hog_skimage": lambda: np.stack([hog(g, **kwargs_hog) for g in cinza]),
+        "hog_vetorizado": lambda: batch_hog(cinza),
+        "concatenar": lambda: np.concatenate([rgb, hogs], axis=1),
+        "scaler_sklearn": lambda: scaler.transform(X_bruto),
+        "scaler_pacote": lambda: packed.transform(X_bruto),
+        "forest_sklearn": lambda: rf.predict_proba(X),
+        "forest_compilado": lambda: forest.predict_with_proba(X),
+        "pipeline": pipeline,
+    }
+
+
+def executar(tamanhos, lotes, n_arvores: int, model_dir: Path = None, tempo_min: float = 0.2,
+             filtro=None):
+    """Roda as etapas para cada tamanho e lote e retorna a lista de resultados."""
+    real = modelo_real(model_dir) if model_dir is not None else None
+    fotos = fotos_sinteticas(max(lotes))
+    resultados = []
+    for img_size in tamanhos:
+        spec = FeatureSpec(img_size=img_size)
+        if real is not None:
+            if real[0].img_size != img_size:
+                print(f"[WARN] Modelo em {model_dir} usa {real[0].img_size}px - pulando {img_size}px")
+                continue
+            spec, scaler, rf = real
+        else:
+            print(f"Treinando modelo sintético para {img_size}px ({spec.n_features} features)...")
+            scaler, rf = modelo_sintetico(spec.n_features, n_arvores)
+
+        for lote in lotes:
+            for etapa, fn in etapas(spec, fotos[:lote], scaler, rf).items():
+                if filtro and etapa not in filtro:
+                    continue
+                tempos = medir(fn, tempo_min=tempo_min)
+                mediana = float(np.median(tempos))
+                resultados.append({
+                    "etapa": etapa,
+                    "img_size": img_size,
+                    "lote": lote,
+                    "mediana_ms": mediana * 1e3,
+                    "p90_ms": float(np.percentile(tempos, 90)) * 1e3,
+                    "por_imagem_us": mediana / lote * 1e6,
+                    "repeticoes": len(tempos),
+                })
+                print(f"  {img_size:>4}px lote {lote:>3}  {etapa:<18}{mediana * 1e3:>10.3f} ms"
+                      f"{mediana / lote * 1e6:>12.1f} µs/img")
+    return resultados
+
+
+def _chave(r):
+    return r["etapa"], r["img_size"], r["lote"]
+
+
+def comparar(antes: dict, depois: dict, limite: float, minimo_ms: float):
+    """Compara as medianas das etapas presentes nas duas execuções.
+
+    Uma etapa regrediu se ficou mais de `limite` (fração) mais lenta e a
+    diferença absoluta passa de `minimo_ms` (ruído de etapas muito curtas).
+    Retorna a lista de regressões.
+    """
+    anteriores = {_chave(r): r for r in antes["resultados"]}
+    regressoes = []
+    print(f"{'etapa':<18}{'px':>5}{'lote':>6}{'antes (ms)':>12}{'depois (ms)':>13}{'variação':>10}")
+    for r in depois["resultados"]:
+        a = anteriores.get(_chave(r))
+        if a is None:
+            continue
+        razao = r["mediana_ms"] / a["mediana_ms"] if a["mediana_ms"] else 1.0
+        marca = ""
+        if razao > 1 + limite and r["mediana_ms"] - a["mediana_ms"] > minimo_ms:
+            marca = "  <- REGRESSÃO"
+            regressoes.append((_chave(r), razao))
+        elif razao < 1 - limite:
+            marca = "  (melhora)"
+        print(f"{r['etapa']:<18}{r['img_size']:>5}{r['lote']:>6}{a['mediana_ms']:>12.3f}"
+              f"{r['mediana_ms']:>13.3f}{razao - 1:>+10.1%}{marca}")
+    return regressoes
+
+
+def _lista(valor: str):
+    return [int(v) for v in valor.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", default="64,96,128", help="tamanhos de imagem (padrão: 64,96,128)")
+    parser.add_argument("--lotes", default="1,2,4,8,16,32,64,128,256",
+                        help="tamanhos de lote (padrão: 1,2,4,...,256)")
+    parser.add_argument("--etapas", default=None, help="apenas estas etapas, separadas por vírgula")
+    parser.add_argument("--arvores", type=int, default=100, help="árvores do forest sintético (padrão: 100)")
+    parser.add_argument("--model-dir", type=Path, default=None, help="usa scaler e forest reais desta pasta")
+    parser.add_argument("--tempo-min", type=float, default=0.2,
+                        help="segundos mínimos de medição por etapa (padrão: 0.2)")
+    parser.add_argument("--saida", type=Path, default=None, help="grava os resultados em JSON")
+    parser.add_argument("--comparar", nargs=2, type=Path, metavar=("ANTES", "DEPOIS"),
+                        help="compara dois JSONs em vez de medir")
+    parser.add_argument("--limite", type=float, default=0.10,
+                        help="desaceleração máxima tolerada (padrão: 0.10 = 10%%)")
+    parser.add_argument("--minimo-ms", type=float, default=0.05,
+                        help="diferença absoluta mínima para contar como regressão (padrão: 0.05 ms)")
+    args = parser.parse_args()
+
+    if args.comparar:
+        with open(args.comparar[0], "r", encoding="utf-8") as f:
+            antes = json.load(f)
+        with open(args.comparar[1], "r", encoding="utf-8") as f:
+            depois = json.load(f)
+        regressoes = comparar(antes, depois, args.limite, args.minimo_ms)
+        if regressoes:
+            print(f"\n[ERRO] {len(regressoes)} etapa(s) mais lenta(s) que o limite de {args.limite:.0%}")
+            sys.exit(1)
+        print(f"\n[OK] Nenhuma regressão acima de {args.limite:.0%}")
+        return
+
+    filtro = set(args.etapas.split(",")) if args.etapas else None
+    resultados = executar(_lista(args.tamanhos), _lista(args.lotes), args.arvores,
+                          args.model_dir, args.tempo_min, filtro)
+    if args.saida:
+        saida = {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "maquina": {"cpus": os.cpu_count(), "sistema": platform.platform(),
+                        "python": platform.python_version(), "numpy": np.__version__},
+            "modelo": str(args.model_dir) if args.model_dir else f"sintetico ({args.arvores} árvores)",
+            "resultados": resultados,
+        }
+        args.saida.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(saida, f, indent=2, ensure_ascii=False)
+        print(f"[OK] Resultados salvos em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
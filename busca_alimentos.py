@@ -0,0 +1,163 @@
+"""
+Busca de alimentos por nome (índice FTS5 com trigramas + cache LRU).
+
+A consulta (já normalizada) é resolvida em até três passos, parando no
+primeiro que encontrar algo:
+
+1. nome igual ou que começa com a consulta, pelo índice em `LOWER(nome)`
+   (o igual vence; depois o nome mais curto);
+2. nome que contém a consulta, pela tabela FTS5 `alimentos_busca` (conteúdo
+   externo sobre `alimentos.nome`, mantida por triggers). Com o tokenizer
+   `trigram`, uma frase entre aspas casa com qualquer substring do nome, sem
+   diferenciar maiúsculas: o mesmo resultado do antigo
+   `LOWER(nome) LIKE '%nome%'`, mas pelo índice em vez de uma varredura;
+3. nome que contém todas as palavras ("fries, french fried" para
+   `french_fries`).
+
+Nos passos 2 e 3 vence o nome mais curto (o que tem menos texto além da
+consulta). Sem FTS5 no SQLite, ou com consultas de menos de 3 caracteres, o
+passo 2 usa `LIKE` na tabela inteira.
+"""
+
+import re
+import sqlite3
+from typing import Dict, Optional
+
+from cache import LRUCache
+
+# Separadores de rótulos do classificador ("french_fries", "hot-dog")
+_SEPARADORES = re.compile(r"[\s_\-]+")
+
+# Trigramas exigem pelo menos 3 caracteres por termo
+_MIN_CARACTERES = 3
+
+_AUSENTE = object()
+
+# Maior code point: `consulta <= x < consulta + _FIM` são os textos que começam com `consulta`
+_FIM = "\U0010ffff"
+
+_SQL_PREFIXO = """
+    SELECT a.* FROM alimentos a
+    WHERE LOWER(a.nome) >= :consulta AND LOWER(a.nome) < :limite
+    ORDER BY LOWER(a.nome) = :consulta DESC, LENGTH(a.nome), a.id
+    LIMIT 1
+"""
+
+_SQL_FTS = """
+    SELECT a.* FROM alimentos_busca
+    JOIN alimentos a ON a.id = alimentos_busca.rowid
+    WHERE alimentos_busca MATCH :termos
+    ORDER BY LENGTH(a.nome), a.id
+    LIMIT 1
+"""
+
+_SQL_LIKE = """
+    SELECT a.* FROM alimentos a
+    WHERE LOWER(a.nome) LIKE :contem ESCAPE '\\'
+    ORDER BY LENGTH(a.nome), a.id
+    LIMIT 1
+"""
+
+
+def normalizar_consulta(nome: str) -> str:
+    """Minúsculas, com `_`/`-` virando espaço e espaços repetidos removidos."""
+    return _SEPARADORES.sub(" ", str(nome)).strip().lower()
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _frase(texto: str) -> str:
+    return '"' + texto.replace('"', '""') + '"'
+
+
+def criar_indice(cursor) -> bool:
+    """Cria o índice em `LOWER(nome)`, a tabela FTS5 e os triggers de
+    sincronia (se ainda não existem).
+
+    Na criação, indexa os alimentos já gravados. Retorna False se o SQLite
+    não tem FTS5 (a busca usa `LIKE`).
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alimentos_nome_lower ON alimentos(LOWER(nome))")
+    existe = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'alimentos_busca'").fetchone()
+    if existe:
+        return True
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE alimentos_busca USING fts5(
+                nome, content='alimentos', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"[WARN] FTS5 com trigramas indisponível ({e}) - busca de alimentos por LIKE")
+        return False
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS alimentos_busca_ai AFTER INSERT ON alimentos BEGIN
+            INSERT INTO alimentos_busca(rowid, nome) VALUES (new.id, new.nome);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS alimentos_busca_ad AFTER DELETE ON alimentos BEGIN
+            INSERT INTO alimentos_busca(alimentos_busca, rowid, nome) VALUES ('delete', old.id, old.nome);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS alimentos_busca_au AFTER UPDATE OF nome ON alimentos BEGIN
+            INSERT INTO alimentos_busca(alimentos_busca, rowid, nome) VALUES ('delete', old.id, old.nome);
+            INSERT INTO alimentos_busca(rowid, nome) VALUES (new.id, new.nome);
+        END
+    """)
+    cursor.execute("INSERT INTO alimentos_busca(alimentos_busca) VALUES ('rebuild')")
+    return True
+
+
+class BuscaAlimentos:
+    """Resolve nomes (ou rótulos do classificador) para o melhor alimento.
+
+    Os resultados, inclusive "não encontrado", ficam em um `LRUCache`; as
+    escritas do próprio processo limpam o cache (`limpar_cache`) e o `ttl`
+    limita quanto tempo uma escrita de outro processo fica invisível.
+    """
+
+    def __init__(self, get_connection, max_itens: int = 4096, ttl: Optional[float] = 300.0):
+        self._get_connection = get_connection
+        self.cache = LRUCache(max_itens=max_itens, ttl=ttl)
+        self._fts = None
+
+    def _tem_fts(self, conn) -> bool:
+        if self._fts is None:
+            self._fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'alimentos_busca'").fetchone() is not None
+        return self._fts
+
+    def buscar(self, nome: str) -> Optional[Dict]:
+        """Melhor alimento para `nome`, ou None."""
+        consulta = normalizar_consulta(nome)
+        if not consulta:
+            return None
+        linha = self.cache.get(consulta, _AUSENTE)
+        if linha is _AUSENTE:
+            linha = self._consultar(consulta)
+            self.cache.set(consulta, linha)
+        return dict(linha) if linha is not None else None
+
+    def _consultar(self, consulta: str) -> Optional[Dict]:
+        conn = self._get_connection()
+        row = conn.execute(_SQL_PREFIXO, {"consulta": consulta, "limite": consulta + _FIM}).fetchone()
+
+        if row is None and self._tem_fts(conn) and len(consulta) >= _MIN_CARACTERES:
+            row = conn.execute(_SQL_FTS, {"termos": _frase(consulta)}).fetchone()
+            palavras = [p for p in consulta.split(" ") if len(p) >= _MIN_CARACTERES]
+            if row is None and len(palavras) > 1:
+                termos = " AND ".join(_frase(p) for p in palavras)
+                row = conn.execute(_SQL_FTS, {"termos": termos}).fetchone()
+        elif row is None:
+            contem = "%" + _escapar_like(consulta) + "%"
+            row = conn.execute(_SQL_LIKE, {"contem": contem}).fetchone()
+        return dict(row) if row is not None else None
+
+    def limpar_cache(self):
+        self.cache.clear()
@@ -0,0 +1,226 @@
+"""
+Caches em memória (LRU + TTL) e cache de predições por conteúdo.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+_AUSENTE = object()
+
+
+class LRUCache:
+    """Cache LRU limitado, com expiração opcional por tempo (TTL).
+
+    Seguro para uso entre threads. `ttl=None` desativa a expiração.
+    """
+
+    def __init__(self, max_itens: int = 1024, ttl: Optional[float] = None):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave, default=None):
+        with self._lock:
+            item = self._dados.get(chave, _AUSENTE)
+            if item is not _AUSENTE:
+                expira_em, valor = item
+                if expira_em is None or expira_em > time.monotonic():
+                    self._dados.move_to_end(chave)
+                    self.hits += 1
+                    return valor
+                # Expirado
+                del self._dados[chave]
+                self.evictions += 1
+            self.misses += 1
+            return default
+
+    def set(self, chave, valor):
+        expira_em = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._dados[chave] = (expira_em, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "itens": len(self._dados),
+            "max_itens": self.max_itens,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def hash_bytes(data: bytes) -> str:
+    """Hash de conteúdo usado como chave de cache."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """Cache de predições indexado pelo hash da imagem + versão do modelo.
+
+    Primeiro nível em memória (LRU + TTL) e, opcionalmente, um segundo nível
+    em disco (`disk_dir`) compartilhado entre os workers. No disco cada
+    entrada é um JSON em subpastas por prefixo do hash, gravado de forma
+    atômica; a TTL é verificada pela data de modificação do arquivo.
+
+    A cada `varrer_a_cada` segundos (ou quando as gravações deste processo
+    passam de `disk_max_bytes`), `varrer_disco()` remove as entradas
+    expiradas e, acima de `disk_max_bytes` (0 = sem limite), as gravadas há
+    mais tempo. Com `writer` (um `storage.BackgroundWriter`), a varredura
+    roda na thread de escrita; sem ele, numa thread própria.
+    """
+
+    def __init__(self, max_itens: int = 1024, ttl: Optional[float] = 3600,
+                 disk_dir: Optional[Path] = None, disk_max_bytes: int = 0,
+                 writer=None, varrer_a_cada: float = 600.0):
+        self.memoria = LRUCache(max_itens=max_itens, ttl=ttl)
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self.disk_max_bytes = disk_max_bytes
+        self.writer = writer
+        self.varrer_a_cada = varrer_a_cada
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+        # Bytes no disco na última varredura + gravados por este processo desde então
+        self._bytes_disco = 0
+        self._varrido_em = time.monotonic()
+        self._varredura_agendada = False
+
+    @staticmethod
+    def key(data: bytes, model_version: str) -> str:
+        return f"{hash_bytes(data)}-{model_version}"
+
+    def get(self, chave: str) -> Optional[Any]:
+        valor = self.memoria.get(chave)
+        if valor is not None or self.disk_dir is None:
+            return valor
+
+        valor = self._get_disk(chave)
+        with self._lock:
+            if valor is None:
+                self.disk_misses += 1
+            else:
+                self.disk_hits += 1
+        if valor is not None:
+            self.memoria.set(chave, valor)
+        return valor
+
+    def set(self, chave: str, valor: Any):
+        self.memoria.set(chave, valor)
+        if self.disk_dir is not None:
+            self._set_disk(chave, valor)
+            self._agendar_varredura()
+
+    def stats(self) -> dict:
+        stats = self.memoria.stats()
+        if self.disk_dir is not None:
+            stats["disk_hits"] = self.disk_hits
+            stats["disk_misses"] = self.disk_misses
+        return stats
+
+    def _disk_path(self, chave: str) -> Path:
+        return self.disk_dir / chave[:2] / f"{chave}.json"
+
+    def _get_disk(self, chave: str) -> Optional[Any]:
+        path = self._disk_path(chave)
+        try:
+            if self.ttl is not None and time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _set_disk(self, chave: str, valor: Any):
+        path = self._disk_path(chave)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(valor, f, ensure_ascii=False)
+            tmp.replace(path)
+            with self._lock:
+                self._bytes_disco += path.stat().st_size
+        except OSError as e:
+            print(f"[WARN] Falha ao gravar cache em disco: {e}")
+
+    def _agendar_varredura(self):
+        with self._lock:
+            excesso = self.disk_max_bytes > 0 and self._bytes_disco > self.disk_max_bytes
+            vencida = time.monotonic() - self._varrido_em > self.varrer_a_cada
+            varrer = (excesso or vencida) and not self._varredura_agendada
+            if varrer:
+                self._varredura_agendada = True
+        if not varrer:
+            return
+        if self.writer is not None:
+            self.writer.agendar(self.varrer_disco)
+        else:
+            threading.Thread(target=self.varrer_disco, name="varredura-cache", daemon=True).start()
+
+    def varrer_disco(self) -> dict:
+        """Remove do disco as entradas expiradas, gravações `.tmp` interrompidas
+        e, acima de `disk_max_bytes`, as entradas gravadas há mais tempo."""
+        agora = time.time()
+        entradas = []
+        removidos = 0
+        for pasta, _, arquivos in os.walk(self.disk_dir):
+            for arquivo in arquivos:
+                path = Path(pasta) / arquivo
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                idade = agora - st.st_mtime
+                if arquivo.endswith(".tmp"):
+                    if idade > 3600:
+                        path.unlink(missing_ok=True)
+                elif self.ttl is not None and idade > self.ttl:
+                    path.unlink(missing_ok=True)
+                    removidos += 1
+                else:
+                    entradas.append((st.st_mtime, st.st_size, path))
+
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        if self.disk_max_bytes > 0 and total > self.disk_max_bytes:
+            entradas.sort(key=lambda e: e[0])
+            for _, tamanho, path in entradas:
+                if total <= self.disk_max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= tamanho
+                removidos += 1
+
+        with self._lock:
+            self._bytes_disco = total
+            self._varrido_em = time.monotonic()
+            self._varredura_agendada = False
+        if removidos:
+            print(f"[INFO] Cache em disco: {removidos} entradas removidas, {total / 1e6:.1f} MB restantes")
+        return {"removidos": removidos, "bytes_restantes": total}
@@ -0,0 +1,505 @@
+"""
+Teste de carga da rota `/api/upload`.
+
+Envia uma mistura de imagens reais (`--imagens`, uma pasta de fotos) e
+sintéticas (geradas em memória, em tamanhos variados) e mede vazão,
+latência (p50/p95/p99), taxa de erro e memória do servidor.
+
+Dois modos de carga:
+- `--concorrencia N`: N clientes em laço fechado (cada um envia a próxima
+  imagem assim que recebe a resposta);
+- `--taxa R`: chegadas a R requisições/s (Poisson ou intervalo fixo), sem
+  esperar as respostas. A latência é medida a partir do horário agendado,
+  então a fila do lado do cliente também conta (sem "coordinated omission").
+
+Contra um servidor já em execução:
+
+    python carga_upload.py --url http://localhost:5000 --concorrencia 8 --duracao 30
+
+Ou subindo o servidor para cada combinação de workers x threads (a memória é
+a soma do processo mestre e dos workers):
+
+    python carga_upload.py --servidor gunicorn --workers 1,2,4 --threads 1,4 --taxa 20 \\
+        --salvar resultados_carga/hoje.json --baseline resultados_carga/baseline.json
+
+Com `--baseline`, cada configuração é comparada à de mesmo nome no arquivo,
+e o script sai com código 1 se a vazão cair ou o p99 subir mais que `--limite`.
+Por padrão, alguns bytes aleatórios são anexados a cada imagem (após o fim
+do JPEG/PNG, ignorados na decodificação) para que o cache de predições não
+responda por elas; use `--repetir` para medir com o cache.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+from PIL import Image
+
+EXTENSOES = {".jpg", ".jpeg", ".png"}
+
+# Respostas 200 com o resultado de fallback da API contam como erro
+_FALLBACKS = {"alimento_desconhecido", "erro_na_predicao"}
+
+
+# ============
+# IMAGENS
+# ============
+def carregar_reais(pasta: Path, maximo: int = 200):
+    """Lista de `(nome, bytes)` das imagens da pasta (e subpastas)."""
+    if pasta is None:
+        return []
+    paths = sorted(p for p in Path(pasta).rglob("*") if p.suffix.lower() in EXTENSOES)
+    random.Random(0).shuffle(paths)
+    return [(p.name, p.read_bytes()) for p in paths[:maximo]]
+
+
+def gerar_sinteticas(n: int = 20, seed: int = 0):
+    """Lista de `(nome, bytes)` de JPEGs sintéticos de 320 a 2048 px de lado."""
+    rng = np.random.RandomState(seed)
+    imagens = []
+    for i in range(n):
+        largura, altura = rng.randint(320, 2049, size=2)
+        # Gradiente com ruído: comprime como uma foto, não como uma cor sólida
+        base = np.linspace(0, 255, largura, dtype=np.float32)[np.newaxis, :, np.newaxis]
+        arr = base + rng.normal(0, 40, size=(altura, largura, 3)) + rng.randint(0, 255, size=3)
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        imagens.append((f"sintetica_{i:02d}.jpg", buf.getvalue()))
+    return imagens
+
+
+class Imagens:
+    """Sorteia a imagem de cada requisição, com a fração pedida de sintéticas."""
+
+    def __init__(self, reais, sinteticas, fracao_sinteticas: float, repetir: bool = False):
+        if not reais:
+            fracao_sinteticas = 1.0
+        self.reais = reais
+        self.sinteticas = sinteticas
+        self.fracao_sinteticas = fracao_sinteticas
+        self.repetir = repetir
+        self._local = threading.local()
+
+    def _rng(self):
+        rng = getattr(self._local, "rng", None)
+        if rng is None:
+            rng = self._local.rng = random.Random()
+        return rng
+
+    def sortear(self):
+        rng = self._rng()
+        origem = self.sinteticas if rng.random() < self.fracao_sinteticas else self.reais
+        nome, data = rng.choice(origem)
+        if not self.repetir:
+            data = data + os.urandom(16)
+        return nome, data
+
+
+# ============
+# CLIENTE
+# ============
+def corpo_multipart(nome: str, data: bytes):
+    fronteira = uuid.uuid4().hex
+    tipo = "image/png" if nome.lower().endswith(".png") else "image/jpeg"
+    corpo = (
+        f"--{fronteira}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{nome}"\r\n'
+        f"Content-Type: {tipo}\r\n\r\n"
+    ).encode() + data + f"\r\n--{fronteira}--\r\n".encode()
+    return corpo, f"multipart/form-data; boundary={fronteira}"
+
+
+def enviar(url: str, nome: str, data: bytes, timeout: float) -> str:
+    """Envia um upload e retorna o resultado: "200", outro status, "fallback" ou "erro:<tipo>"."""
+    partes = urlsplit(url)
+    corpo, tipo = corpo_multipart(nome, data)
+    conn = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=timeout)
+    try:
+        conn.request("POST", "/api/upload", body=corpo, headers={"Content-Type": tipo})
+        resposta = conn.getresponse()
+        conteudo = resposta.read()
+        if resposta.status != 200:
+            return str(resposta.status)
+        if json.loads(conteudo).get("alimento_reconhecido") in _FALLBACKS:
+            return "fallback"
+        return "200"
+    except Exception as e:
+        return f"erro:{type(e).__name__}"
+    finally:
+        conn.close()
+
+
+class Coleta:
+    """Resultados `(inicio, latencia, resultado)` das requisições, de várias threads."""
+
+    def __init__(self):
+        self.amostras = []
+        self._lock = threading.Lock()
+
+    def registrar(self, inicio: float, latencia: float, resultado: str):
+        with self._lock:
+            self.amostras.append((inicio, latencia, resultado))
+
+
+def carga_fechada(url, imagens: Imagens, concorrencia: int, duracao: float, timeout: float) -> Coleta:
+    coleta = Coleta()
+    fim = time.perf_counter() + duracao
+
+    def cliente():
+        while time.perf_counter() < fim:
+            nome, data = imagens.sortear()
+            inicio = time.perf_counter()
+            resultado = enviar(url, nome, data, timeout)
+            coleta.registrar(inicio, time.perf_counter() - inicio, resultado)
+
+    threads = [threading.Thread(target=cliente, daemon=True) for _ in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return coleta
+
+
+def carga_aberta(url, imagens: Imagens, taxa: float, duracao: float, timeout: float,
+                 chegadas: str = "poisson", max_em_voo: int = 256) -> Coleta:
+    coleta = Coleta()
+    rng = random.Random(0)
+
+    def tarefa(agendado):
+        nome, data = imagens.sortear()
+        resultado = enviar(url, nome, data, timeout)
+        # Desde o horário agendado: inclui a espera por uma thread livre
+        coleta.registrar(agendado, time.perf_counter() - agendado, resultado)
+
+    with ThreadPoolExecutor(max_workers=max_em_voo) as executor:
+        inicio = time.perf_counter()
+        agendado = inicio
+        while agendado < inicio + duracao:
+            espera = agendado - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            executor.submit(tarefa, agendado)
+            agendado += rng.expovariate(taxa) if chegadas == "poisson" else 1.0 / taxa
+    return coleta
+
+
+def resumir(coleta: Coleta, inicio_medicao: float, fim_medicao: float) -> dict:
+    """Vazão, percentis de latência e erros das requisições iniciadas na janela de medição."""
+    amostras = [a for a in coleta.amostras if inicio_medicao <= a[0] < fim_medicao]
+    n = len(amostras)
+    if n == 0:
+        return {"requisicoes": 0}
+    latencias = np.array([lat for _, lat, _ in amostras]) * 1e3
+    ok = sum(1 for _, _, r in amostras if r == "200")
+    erros = {}
+    for _, _, r in amostras:
+        if r != "200":
+            erros[r] = erros.get(r, 0) + 1
+    # Vazão: respostas 200 pela duração da janela
+    return {
+        "requisicoes": n,
+        "vazao_rps": ok / (fim_medicao - inicio_medicao),
+        "p50_ms": float(np.percentile(latencias, 50)),
+        "p95_ms": float(np.percentile(latencias, 95)),
+        "p99_ms": float(np.percentile(latencias, 99)),
+        "max_ms": float(latencias.max()),
+        "taxa_erro": (n - ok) / n,
+        "erros": erros,
+    }
+
+
+# ============
+# MEMÓRIA DO SERVIDOR
+# ============
+def _filhos(pid: int):
+    """PIDs dos descendentes de `pid` (Linux, via /proc)."""
+    pais = {}
+    for entrada in Path("/proc").iterdir():
+        if entrada.name.isdigit():
+            try:
+                campos = (entrada / "stat").read_text().rsplit(")", 1)[1].split()
+                pais.setdefault(int(campos[1]), []).append(int(entrada.name))
+            except (OSError, IndexError, ValueError):
+                continue
+    pendentes, todos = [pid], []
+    while pendentes:
+        atual = pendentes.pop()
+        todos.append(atual)
+        pendentes.extend(pais.get(atual, []))
+    return todos
+
+
+def memoria_mb(pid: int):
+    """`(rss, pss)` em MB do processo e seus descendentes.
+
+    O RSS conta as páginas compartilhadas (modelo mapeado, preload) uma vez
+    por processo; o PSS divide cada página entre os processos que a usam.
+    """
+    rss = pss = 0
+    for p in _filhos(pid):
+        try:
+            for linha in Path(f"/proc/{p}/smaps_rollup").read_text().splitlines():
+                if linha.startswith("Rss:"):
+                    rss += int(linha.split()[1])
+                elif linha.startswith("Pss:"):
+                    pss += int(linha.split()[1])
+        except OSError:
+            continue
+    return rss / 1024, pss / 1024
+
+
+class MonitorMemoria(threading.Thread):
+    """Amostra a memória do servidor a cada `intervalo` segundos e guarda o pico."""
+
+    def __init__(self, pid, intervalo: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico_rss = self.pico_pss = None
+        self._parar = threading.Event()
+
+    def run(self):
+        if self.pid is None or not Path("/proc").exists():
+            return
+        while not self._parar.is_set():
+            rss, pss = memoria_mb(self.pid)
+            self.pico_rss = max(rss, self.pico_rss or 0)
+            self.pico_pss = max(pss, self.pico_pss or 0)
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+# ============
+# SERVIDOR
+# ============
+def iniciar_servidor(servidor: str, workers: int, threads: int, porta: int, pasta: Path):
+    """Sobe o servidor em `pasta` (onde estão `modelos_salvos/` e `uploads/`)."""
+    raiz = Path(__file__).resolve().parent
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(raiz), env.get("PYTHONPATH")]))
+    if servidor == "gunicorn":
+        env.update(GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads),
+                   GUNICORN_BIND=f"127.0.0.1:{porta}")
+        cmd = [sys.executable, "-m", "gunicorn", "-c", str(raiz / "gunicorn.conf.py"), "app:app"]
+    elif servidor == "uvicorn":
+        env["ASGI_THREADS"] = str(threads)
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+               "--port", str(porta), "--workers", str(workers), "--log-level", "warning"]
+    else:
+        raise ValueError(f"Servidor desconhecido: {servidor}")
+    return subprocess.Popen(cmd, cwd=pasta, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def esperar_servidor(url: str, processo=None, timeout: float = 180.0) -> dict:
+    """Espera `/api/modelo` responder e retorna o seu conteúdo."""
+    partes = urlsplit(url)
+    limite = time.time() + timeout
+    while time.time() < limite:
+        if processo is not None and processo.poll() is not None:
+            raise RuntimeError(f"Servidor encerrou com código {processo.returncode}")
+        try:
+            conn = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=5)
+            conn.request("GET", "/api/modelo")
+            resposta = conn.getresponse()
+            if resposta.status == 200:
+                return json.loads(resposta.read())
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Servidor não respondeu em {timeout:.0f}s")
+
+
+def parar_servidor(processo):
+    try:
+        os.killpg(processo.pid, signal.SIGTERM)
+        processo.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(processo.pid, signal.SIGKILL)
+        processo.wait()
+    except ProcessLookupError:
+        pass
+
+
+# ============
+# EXECUÇÃO E COMPARAÇÃO
+# ============
+def executar(url, imagens: Imagens, args, pid=None) -> dict:
+    """Aquecimento + medição de uma configuração."""
+    monitor = MonitorMemoria(pid)
+    monitor.start()
+    inicio = time.perf_counter()
+    total = args.aquecimento + args.duracao
+    if args.taxa:
+        coleta = carga_aberta(url, imagens, args.taxa, total, args.timeout, args.chegadas, args.max_em_voo)
+    else:
+        coleta = carga_fechada(url, imagens, args.concorrencia, total, args.timeout)
+    monitor.parar()
+    resumo = resumir(coleta, inicio + args.aquecimento, inicio + total)
+    resumo["rss_mb"] = monitor.pico_rss
+    resumo["pss_mb"] = monitor.pico_pss
+    return resumo
+
+
+def comparar(resultados, baseline, limite: float) -> bool:
+    """Imprime a variação de cada configuração em relação à linha de base.
+
+    Retorna `True` se alguma configuração regrediu (vazão caiu ou p99 subiu
+    mais que `limite`, em fração).
+    """
+    anteriores = {r["config"]: r for r in baseline.get("resultados", [])}
+    regrediu = False
+    print(f"{'config':<28}{'vazão':>16}{'p99 (ms)':>22}")
+    for r in resultados:
+        antes = anteriores.get(r["config"])
+        if antes is None or not r.get("requisicoes") or not antes.get("requisicoes"):
+            print(f"{r['config']:<28}{'(sem linha de base)':>38}")
+            continue
+        d_vazao = r["vazao_rps"] / antes["vazao_rps"] - 1 if antes["vazao_rps"] else 0.0
+        d_p99 = r["p99_ms"] / antes["p99_ms"] - 1 if antes["p99_ms"] else 0.0
+        marca = ""
+        if d_vazao < -limite or d_p99 > limite:
+            marca = "  <- REGRESSÃO"
+            regrediu = True
+        print(f"{r['config']:<28}{antes['vazao_rps']:>7.1f} -> {r['vazao_rps']:<6.1f}"
+              f"{antes['p99_ms']:>10.1f} -> {r['p99_ms']:<9.1f}{marca}")
+    return regrediu
+
+
+def imprimir(resultados):
+    print()
+    print(f"{'config':<28}{'reqs':>7}{'req/s':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}"
+          f"{'erro':>8}{'RSS (MB)':>10}{'PSS (MB)':>10}")
+    for r in resultados:
+        if not r.get("requisicoes"):
+            print(f"{r['config']:<28}{'sem requisições na janela de medição':>40}")
+            continue
+        rss = f"{r['rss_mb']:.0f}" if r.get("rss_mb") is not None else "-"
+        pss = f"{r['pss_mb']:.0f}" if r.get("pss_mb") is not None else "-"
+        print(f"{r['config']:<28}{r['requisicoes']:>7}{r['vazao_rps']:>8.1f}{r['p50_ms']:>10.1f}"
+              f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['taxa_erro']:>8.1%}{rss:>10}{pss:>10}")
+        if r["erros"]:
+            print(f"{'':<28}erros: {r['erros']}")
+    print()
+
+
+def _lista(valor: str):
+    return [int(v) for v in valor.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    alvo = parser.add_mutually_exclusive_group(required=True)
+    alvo.add_argument("--url", help="servidor já em execução (ex.: http://localhost:5000)")
+    alvo.add_argument("--servidor", choices=("gunicorn", "uvicorn"),
+                      help="sobe o servidor para cada combinação de --workers e --threads")
+    parser.add_argument("--workers", default="1", help="workers por execução, separados por vírgula")
+    parser.add_argument("--threads", default="1",
+                        help="threads por worker (GUNICORN_THREADS ou ASGI_THREADS), separadas por vírgula")
+    parser.add_argument("--porta", type=int, default=5055, help="porta do servidor iniciado (padrão: 5055)")
+    parser.add_argument("--pasta-servidor", type=Path, default=Path.cwd(),
+                        help="pasta de trabalho do servidor, com modelos_salvos/ (padrão: atual)")
+    parser.add_argument("--pid", type=int, default=None,
+                        help="PID do servidor em --url, para medir a memória")
+
+    carga = parser.add_mutually_exclusive_group()
+    carga.add_argument("--concorrencia", type=int, default=4, help="clientes em laço fechado (padrão: 4)")
+    carga.add_argument("--taxa", type=float, default=None, help="chegadas por segundo (laço aberto)")
+    parser.add_argument("--chegadas", choices=("poisson", "fixas"), default="poisson",
+                        help="intervalo entre chegadas no modo --taxa (padrão: poisson)")
+    parser.add_argument("--max-em-voo", type=int, default=256,
+                        help="requisições simultâneas máximas no modo --taxa (padrão: 256)")
+    parser.add_argument("--duracao", type=float, default=30.0, help="segundos de medição (padrão: 30)")
+    parser.add_argument("--aquecimento", type=float, default=5.0,
+                        help="segundos iniciais descartados (padrão: 5)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout por requisição (padrão: 60)")
+
+    parser.add_argument("--imagens", type=Path, default=None, help="pasta com imagens reais de alimentos")
+    parser.add_argument("--fracao-sinteticas", type=float, default=0.5,
+                        help="fração das requisições com imagens sintéticas (padrão: 0.5)")
+    parser.add_argument("--repetir", action="store_true",
+                        help="reenvia os mesmos bytes (o cache de predições pode responder)")
+
+    parser.add_argument("--salvar", type=Path, default=None, help="grava os resultados em JSON")
+    parser.add_argument("--nota", default="", help="descrição gravada junto dos resultados (modelo, máquina...)")
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--limite", type=float, default=0.10,
+                        help="variação máxima tolerada de vazão e p99 (padrão: 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    reais = carregar_reais(args.imagens)
+    imagens = Imagens(reais, gerar_sinteticas(), args.fracao_sinteticas, args.repetir)
+    print(f"Imagens: {len(reais)} reais, {len(imagens.sinteticas)} sintéticas "
+          f"(fração sintética: {imagens.fracao_sinteticas:.0%})")
+    modo = f"taxa={args.taxa:g}/s" if args.taxa else f"concorrencia={args.concorrencia}"
+
+    resultados = []
+    modelo = None
+    if args.url:
+        modelo = esperar_servidor(args.url, timeout=10)
+        print(f"Medindo {args.url} ({modo})...")
+        resumo = executar(args.url, imagens, args, pid=args.pid)
+        resultados.append({"config": f"externo {modo}", **resumo})
+    else:
+        url = f"http://127.0.0.1:{args.porta}"
+        for workers in _lista(args.workers):
+            for threads in _lista(args.threads):
+                config = f"{args.servidor} {workers}x{threads} {modo}"
+                print(f"Iniciando {args.servidor} com {workers} workers x {threads} threads...")
+                processo = iniciar_servidor(args.servidor, workers, threads, args.porta, args.pasta_servidor)
+                try:
+                    modelo = esperar_servidor(url, processo)
+                    print(f"Medindo {config}...")
+                    resumo = executar(url, imagens, args, pid=processo.pid)
+                finally:
+                    parar_servidor(processo)
+                resultados.append({"config": config, "workers": workers, "threads": threads, **resumo})
+
+    imprimir(resultados)
+
+    if args.salvar:
+        args.salvar.parent.mkdir(parents=True, exist_ok=True)
+        saida = {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "nota": args.nota,
+            "maquina": {"cpus": os.cpu_count(), "sistema": platform.platform(),
+                        "python": platform.python_version()},
+            "modelo": modelo,
+            "carga": {"modo": modo, "duracao": args.duracao, "aquecimento": args.aquecimento,
+                      "imagens_reais": len(reais), "fracao_sinteticas": imagens.fracao_sinteticas,
+                      "repetir": args.repetir},
+            "resultados": resultados,
+        }
+        with open(args.salvar, "w", encoding="utf-8") as f:
+            json.dump(saida, f, indent=2, ensure_ascii=False)
+        print(f"[OK] Resultados salvos em: {args.salvar}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparando com {args.baseline} ({baseline.get('data')}, {baseline.get('nota') or 'sem nota'})")
+        if comparar(resultados, baseline, args.limite):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Compara o Random Forest com e sem redução de dimensionalidade.
+
+Para cada configuração (sem redução, PCA ou projeção aleatória com k
+componentes), treina scaler, redutor e forest sobre as mesmas features e
+mede acurácia de validação, tempo de treino, latência de inferência (da
+feature bruta até a classe, como na API) e memória do modelo servido.
+
+    python comparar_reducao.py --dados features.npz --componentes 64,128,256
+
+`features.npz` tem `X` (features brutas, como as do `FeatureExtractor`) e
+`y` (rótulos); 20% das amostras são separadas para validação. O notebook
+chama `comparar()` direto com as matrizes já extraídas.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from forest import CompiledForest
+from model_pack import PackedScaler
+from reducao import ProjecaoLinear, criar_redutor
+
+SEED = 42
+
+
+def _novo_forest(n_arvores: int) -> RandomForestClassifier:
+    # Mesmos hiperparâmetros do notebook
+    return RandomForestClassifier(
+        n_estimators=n_arvores, max_depth=30, min_samples_split=5, min_samples_leaf=2,
+        max_features="sqrt", class_weight="balanced", random_state=SEED, n_jobs=-1,
+    )
+
+
+def _latencia(entrada, forest: CompiledForest, X_bruto, lote: int, repeticoes: int = 20) -> float:
+    """Mediana (em segundos) de transformação + forest para um lote de `lote` linhas."""
+    bloco = X_bruto[np.arange(lote) % len(X_bruto)]
+    forest.predict_with_proba(entrada.transform(bloco))
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        forest.predict_with_proba(entrada.transform(bloco))
+        tempos.append(time.perf_counter() - inicio)
+    return float(np.median(tempos))
+
+
+def avaliar(metodo, n_componentes, X_treino, y_treino, X_val, y_val, n_arvores: int = 200) -> dict:
+    """Treina e mede uma configuração; `metodo=None` é o modelo sem redução."""
+    inicio = time.perf_counter()
+    scaler = StandardScaler()
+    Z_treino = scaler.fit_transform(X_treino)
+    redutor = None
+    if metodo is not None:
+        redutor = criar_redutor(metodo, n_componentes, seed=SEED)
+        Z_treino = redutor.fit_transform(Z_treino)
+    t_reducao = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    rf = _novo_forest(n_arvores).fit(Z_treino, y_treino)
+    t_forest = time.perf_counter() - inicio
+
+    forest = CompiledForest.from_sklearn(rf)
+    if redutor is not None:
+        entrada = ProjecaoLinear.from_sklearn(redutor, scaler)
+        bytes_entrada = entrada.pesos.nbytes + entrada.vies.nbytes
+    else:
+        entrada = PackedScaler.from_sklearn(scaler)
+        bytes_entrada = entrada.mean_.nbytes + entrada.scale_.nbytes
+
+    return {
+        "reducao": metodo or "nenhuma",
+        "componentes": int(Z_treino.shape[1]),
+        "acuracia": float(np.mean(forest.predict(entrada.transform(X_val)) == y_val)),
+        "treino_reducao_s": t_reducao,
+        "treino_forest_s": t_forest,
+        "latencia_1_ms": _latencia(entrada, forest, X_val, 1) * 1e3,
+        "latencia_64_ms": _latencia(entrada, forest, X_val, 64) * 1e3,
+        "mb": (bytes_entrada + forest.nbytes) / 1e6,
+    }
+
+
+def comparar(X_treino, y_treino, X_val, y_val, configuracoes, n_arvores: int = 200):
+    """Avalia cada `(metodo, n_componentes)` de `configuracoes` e imprime a tabela."""
+    resultados = []
+    for metodo, n_componentes in configuracoes:
+        nome = f"{metodo} ({n_componentes})" if metodo else "sem redução"
+        print(f"Treinando: {nome}...")
+        resultados.append(avaliar(metodo, n_componentes, X_treino, y_treino, X_val, y_val, n_arvores))
+    imprimir(resultados)
+    return resultados
+
+
+def imprimir(resultados):
+    print()
+    print(f"{'redução':<10}{'dims':>7}{'acurácia':>10}{'treino red. (s)':>17}{'treino RF (s)':>15}"
+          f"{'lote 1 (ms)':>13}{'lote 64 (ms)':>14}{'MB':>8}")
+    for r in resultados:
+        print(f"{r['reducao']:<10}{r['componentes']:>7}{r['acuracia']:>10.4f}"
+              f"{r['treino_reducao_s']:>17.2f}{r['treino_forest_s']:>15.2f}"
+              f"{r['latencia_1_ms']:>13.2f}{r['latencia_64_ms']:>14.2f}{r['mb']:>8.1f}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dados", type=Path, required=True,
+                        help="arquivo .npz com X (features brutas) e y (rótulos)")
+    parser.add_argument("--metodos", default="pca,projecao",
+                        help="métodos de redução separados por vírgula (padrão: pca,projecao)")
+    parser.add_argument("--componentes", default="64,128,256",
+                        help="números de componentes separados por vírgula (padrão: 64,128,256)")
+    parser.add_argument("--arvores", type=int, default=200, help="árvores do forest (padrão: 200)")
+    args = parser.parse_args()
+
+    dados = np.load(args.dados, allow_pickle=False)
+    y = LabelEncoder().fit_transform(dados["y"])
+    X_treino, X_val, y_treino, y_val = train_test_split(
+        dados["X"], y, test_size=0.2, random_state=SEED, stratify=y)
+    print(f"Treino: {X_treino.shape}, validação: {X_val.shape}")
+
+    configuracoes = [(None, None)]
+    for metodo in filter(None, args.metodos.split(",")):
+        for k in args.componentes.split(","):
+            configuracoes.append((metodo.strip(), int(k)))
+    comparar(X_treino, y_treino, X_val, y_val, configuracoes, args.arvores)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,232 @@
 """
 Módulo para gerenciar o banco de dados SQLite da aplicação.
+
+Cada thread usa uma conexão persistente por banco (reaproveitada entre as
+chamadas), já configurada com WAL e os pragmas de `PRAGMAS`; as consultas
+repetidas reaproveitam os statements preparados do cache da conexão. Quando a
+thread termina, a conexão volta para um pool de até `MAX_OCIOSAS` conexões
+ociosas, usado pelas próximas threads (o servidor de desenvolvimento cria uma
+thread por requisição). As tabelas são criadas uma vez por arquivo e processo.
 """
 
+import atexit
+import base64
+import binascii
+import os
 import sqlite3
+import threading
+import weakref
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 import json
 
+from busca_alimentos import BuscaAlimentos, criar_indice
+
 DB_PATH = Path("nutrition_app.db")
 
+# Pragmas aplicados em cada conexão nova (journal_mode=WAL fica gravado no arquivo)
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    # Com WAL, NORMAL só sincroniza o disco nos checkpoints e continua seguro contra corrupção
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",      # 8 MB de cache de páginas por conexão
+    "PRAGMA mmap_size = 268435456",   # leituras por mmap (até 256 MB)
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Statements preparados mantidos por conexão
+CACHED_STATEMENTS = 128
+
+# Conexões de threads já encerradas mantidas abertas para reuso
+MAX_OCIOSAS = 4
+
+# Insere um alimento ou atualiza o existente no lugar (mantém o id)
+_UPSERT_ALIMENTO = """
+    INSERT INTO alimentos 
+    (nome, calorias, proteinas, carboidratos, gorduras, fibra, acucar, sodio, dados_completos)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(nome) DO UPDATE SET
+        calorias = excluded.calorias,
+        proteinas = excluded.proteinas,
+        carboidratos = excluded.carboidratos,
+        gorduras = excluded.gorduras,
+        fibra = excluded.fibra,
+        acucar = excluded.acucar,
+        sodio = excluded.sodio,
+        dados_completos = excluded.dados_completos
+"""
+
+
+def _linha_alimento(nome: str, dados_nutricionais: Dict[str, Any]) -> tuple:
+    """Parâmetros de `_UPSERT_ALIMENTO` para um alimento."""
+    return (
+        nome,
+        dados_nutricionais.get("calories"),
+        dados_nutricionais.get("protein"),
+        dados_nutricionais.get("carbohydrate"),
+        dados_nutricionais.get("fat"),
+        dados_nutricionais.get("fiber"),
+        dados_nutricionais.get("sugar"),
+        dados_nutricionais.get("sodium"),
+        json.dumps(dados_nutricionais, ensure_ascii=False),
+    )
+
+# Totais nutricionais materializados em `refeicoes` (coluna -> coluna de `alimentos`)
+COLUNAS_TOTAIS = {
+    "total_calorias": "calorias",
+    "total_proteinas": "proteinas",
+    "total_carboidratos": "carboidratos",
+    "total_gorduras": "gorduras",
+}
+
+# Recalcula totais e número de itens das refeições selecionadas pelo WHERE
+# que for concatenado (`refeicoes.id` identifica a refeição na subconsulta)
+_RECALCULAR_TOTAIS = """
+    UPDATE refeicoes SET ({colunas}, num_itens) = (
+        SELECT {somas}, COUNT(ri.id)
+        FROM refeicao_itens ri
+        LEFT JOIN alimentos a ON a.id = ri.alimento_id
+        WHERE ri.refeicao_id = refeicoes.id
+    )
+""".format(
+    colunas=", ".join(COLUNAS_TOTAIS),
+    somas=", ".join(f"COALESCE(SUM(COALESCE(a.{col}, 0) * COALESCE(ri.quantidade, 1.0)), 0)"
+                    for col in COLUNAS_TOTAIS.values()),
+)
+
+# Tamanho máximo de uma página do histórico de refeições
+MAX_POR_PAGINA = 200
+
+# Bancos com as tabelas já criadas neste processo
+_inicializados = set()
+_inicializados_lock = threading.Lock()
+
+
+def _criar_cursor(criado_em: str, refeicao_id: int) -> str:
+    """Cursor opaco da paginação: posição `(criado_em, id)` da última refeição da página."""
+    dados = json.dumps([criado_em, refeicao_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(dados).decode("ascii").rstrip("=")
+
+
+def _ler_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        dados = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        criado_em, refeicao_id = json.loads(dados)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor!r}") from e
+    if not isinstance(criado_em, str) or not isinstance(refeicao_id, int):
+        raise ValueError(f"Cursor inválido: {cursor!r}")
+    return criado_em, refeicao_id
+
+
+class _Conexao:
+    """Conexão de uma thread; ao ser coletada (fim da thread), a conexão é devolvida."""
+    
+    __slots__ = ("conn", "pid", "__weakref__")
+    
+    def __init__(self, conn: sqlite3.Connection, pid: int):
+        self.conn = conn
+        self.pid = pid
+
+
 class NutritionDB:
     """Classe para gerenciar o banco de dados de nutrição."""
     
     def __init__(self, db_path: Path = DB_PATH):
         self.db_path = db_path
-        self.init_db()
+        self._local = threading.local()
+        # Conexões abertas por este objeto (em uso por alguma thread ou ociosas)
+        self._abertas = set()
+        self._ociosas = []
+        self._conexoes_lock = threading.Lock()
+        self.busca = BuscaAlimentos(self.get_connection)
+        atexit.register(self.close)
+        
+        chave = (os.getpid(), str(Path(db_path).resolve()))
+        with _inicializados_lock:
+            if chave not in _inicializados:
+                self.init_db()
+                _inicializados.add(chave)
     
     def get_connection(self):
-        """Retorna conexão com o banco de dados."""
-        conn = sqlite3.connect(self.db_path)
+        """Retorna a conexão persistente da thread atual.
+        
+        Não feche a conexão retornada: ela é reaproveitada pelas próximas
+        chamadas da mesma thread e, quando a thread termina, por outras. Uma
+        conexão herdada de outro processo (fork dos workers) nunca é
+        reutilizada.
+        """
+        atual = getattr(self._local, "conexao", None)
+        if atual is not None and atual.pid == os.getpid():
+            return atual.conn
+        
+        with self._conexoes_lock:
+            conn = self._ociosas.pop() if self._ociosas else None
+        if conn is None:
+            conn = self._abrir()
+        atual = _Conexao(conn, os.getpid())
+        weakref.finalize(atual, self._devolver, conn, atual.pid).atexit = False
+        self._local.conexao = atual
+        return conn
+    
+    def _abrir(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, cached_statements=CACHED_STATEMENTS,
+                               check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with self._conexoes_lock:
+            self._abertas.add(conn)
         return conn
     
+    def _devolver(self, conn: sqlite3.Connection, pid: int):
+        """Chamado quando a thread dona da conexão termina (ou troca de conexão)."""
+        # Conexões herdadas pelo fork pertencem ao processo pai e ficam como estão
+        if pid != os.getpid():
+            return
+        with self._conexoes_lock:
+            if conn not in self._abertas:
+                return  # já fechada por `close()`
+            if len(self._ociosas) < MAX_OCIOSAS:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._ociosas.append(conn)
+                return
+            self._abertas.discard(conn)
+        conn.close()
+    
+    def conexoes_abertas(self) -> int:
+        """Número de conexões abertas (em uso ou ociosas) neste processo."""
+        with self._conexoes_lock:
+            return len(self._abertas)
+    
+    def close(self):
+        """Fecha as conexões abertas por este processo."""
+        with self._conexoes_lock:
+            fechar, self._abertas, self._ociosas = self._abertas, set(), []
+        for conn in fechar:
+            conn.close()
+        self._local = threading.local()
+    
+    def init_app(self, app):
+        """Registra o banco no app Flask.
+        
+        Ao fim de cada requisição, uma transação deixada aberta (por uma
+        exceção no meio de uma escrita) é desfeita, para não vazar para a
+        próxima requisição que usar a conexão. As conexões são fechadas na
+        saída do processo.
+        """
+        app.extensions["nutrition_db"] = self
+        
+        @app.teardown_appcontext
+        def _desfazer_transacao_aberta(_exc):
+            atual = getattr(self._local, "conexao", None)
+            if atual is not None and atual.pid == os.getpid() and atual.conn.in_transaction:
+                atual.conn.rollback()
+    
     def init_db(self):
         """Inicializa as tabelas do banco de dados."""
         conn = self.get_connection()
@@ -70,6 +274,15 @@ class NutritionDB:
             )
         """)
         
+        # Índice de busca por nome (FTS5), sincronizado por triggers
+        criar_indice(cursor)
+        
+        # Totais de cada refeição, mantidos por triggers
+        self._criar_totais(cursor)
+        
+        # Histórico de refeições: ordem da paginação e contagem sem varredura
+        self._criar_indices_historico(cursor)
+        
         # Tabela de alimentos adicionados manualmente
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS alimentos_manuais (
@@ -84,53 +297,137 @@ class NutritionDB:
         """)
         
         conn.commit()
-        conn.close()
     
-    def adicionar_alimento(self, nome: str, dados_nutricionais: Dict[str, Any]) -> int:
-        """Adiciona ou atualiza um alimento no banco."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _criar_totais(self, cursor):
+        """Colunas de totais em `refeicoes` e os triggers que as mantêm.
         
-        dados_json = json.dumps(dados_nutricionais, ensure_ascii=False)
+        Cada mudança em `refeicao_itens` recalcula a refeição afetada inteira
+        (não um incremento): um `INSERT OR REPLACE` apaga a linha antiga sem
+        disparar o trigger de DELETE, e o recálculo no INSERT cobre isso. Uma
+        mudança nos nutrientes de um alimento recalcula as refeições que o
+        usam. Bancos antigos ganham as colunas e têm os totais preenchidos.
+        """
+        existentes = {row[1] for row in cursor.execute("PRAGMA table_info(refeicoes)")}
+        novas = [col for col in (*COLUNAS_TOTAIS, "num_itens") if col not in existentes]
+        for col in novas:
+            tipo = "INTEGER" if col == "num_itens" else "REAL"
+            cursor.execute(f"ALTER TABLE refeicoes ADD COLUMN {col} {tipo} NOT NULL DEFAULT 0")
         
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS refeicao_itens_totais_ai AFTER INSERT ON refeicao_itens BEGIN
+                {_RECALCULAR_TOTAIS} WHERE id = new.refeicao_id;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS refeicao_itens_totais_ad AFTER DELETE ON refeicao_itens BEGIN
+                {_RECALCULAR_TOTAIS} WHERE id = old.refeicao_id;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS refeicao_itens_totais_au AFTER UPDATE ON refeicao_itens BEGIN
+                {_RECALCULAR_TOTAIS} WHERE id IN (old.refeicao_id, new.refeicao_id);
+            END
+        """)
+        # Refeições que usam um alimento (o índice UNIQUE começa por refeicao_id)
         cursor.execute("""
-            INSERT OR REPLACE INTO alimentos 
-            (nome, calorias, proteinas, carboidratos, gorduras, fibra, acucar, sodio, dados_completos)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            nome,
-            dados_nutricionais.get("calories"),
-            dados_nutricionais.get("protein"),
-            dados_nutricionais.get("carbohydrate"),
-            dados_nutricionais.get("fat"),
-            dados_nutricionais.get("fiber"),
-            dados_nutricionais.get("sugar"),
-            dados_nutricionais.get("sodium"),
-            dados_json
-        ))
+            CREATE INDEX IF NOT EXISTS idx_refeicao_itens_alimento ON refeicao_itens(alimento_id)
+        """)
+        # Recriado para bancos com a versão sem WHEN; só recalcula se um nutriente mudou
+        # (recarregar o catálogo sem mudanças não toca nas refeições)
+        mudou = " OR ".join(f"old.{col} IS NOT new.{col}" for col in COLUNAS_TOTAIS.values())
+        cursor.execute("DROP TRIGGER IF EXISTS alimentos_totais_au")
+        cursor.execute(f"""
+            CREATE TRIGGER alimentos_totais_au
+            AFTER UPDATE OF {", ".join(COLUNAS_TOTAIS.values())} ON alimentos
+            WHEN {mudou}
+            BEGIN
+                {_RECALCULAR_TOTAIS}
+                WHERE id IN (SELECT refeicao_id FROM refeicao_itens WHERE alimento_id = new.id);
+            END
+        """)
         
-        alimento_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return alimento_id
+        if novas:
+            cursor.execute(_RECALCULAR_TOTAIS)
     
-    def buscar_alimento(self, nome: str) -> Optional[Dict]:
-        """Busca um alimento por nome (case-insensitive)."""
+    def _criar_indices_historico(self, cursor):
+        """Índice na ordem do histórico e contador de refeições.
+        
+        `refeicao_itens(refeicao_id)` já é coberto pelo índice da restrição
+        UNIQUE(refeicao_id, alimento_id). O total de refeições fica em
+        `contadores`, mantido por triggers, para não contar a tabela a cada
+        página.
+        """
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_refeicoes_criado_em
+            ON refeicoes(criado_em DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS contadores (
+                nome TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO contadores (nome, valor)
+            SELECT 'refeicoes', COUNT(*) FROM refeicoes
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS refeicoes_contador_ai AFTER INSERT ON refeicoes BEGIN
+                UPDATE contadores SET valor = valor + 1 WHERE nome = 'refeicoes';
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS refeicoes_contador_ad AFTER DELETE ON refeicoes BEGIN
+                UPDATE contadores SET valor = valor - 1 WHERE nome = 'refeicoes';
+            END
+        """)
+    
+    def adicionar_alimento(self, nome: str, dados_nutricionais: Dict[str, Any]) -> int:
+        """Adiciona ou atualiza um alimento no banco.
+        
+        Um alimento existente é atualizado no lugar e mantém o `id` (os itens
+        de refeição que apontam para ele continuam válidos).
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT * FROM alimentos 
-            WHERE LOWER(nome) LIKE LOWER(?)
-            LIMIT 1
-        """, (f"%{nome}%",))
+        cursor.execute(_UPSERT_ALIMENTO, _linha_alimento(nome, dados_nutricionais))
+        cursor.execute("SELECT id FROM alimentos WHERE nome = ?", (nome,))
+        alimento_id = cursor.fetchone()[0]
+        conn.commit()
+        self.busca.limpar_cache()
+        return alimento_id
+    
+    def adicionar_alimentos_em_lote(self, alimentos: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Adiciona ou atualiza vários alimentos `(nome, dados_nutricionais)`.
         
-        row = cursor.fetchone()
-        conn.close()
+        Mesmo efeito de chamar `adicionar_alimento` para cada um, mas em uma
+        única transação (um commit, um fsync) com `executemany`. Se um nome
+        se repetir, o último vence. Retorna quantos alimentos foram gravados.
+        """
+        linhas = [_linha_alimento(nome, dados) for nome, dados in alimentos]
+        conn = self.get_connection()
+        with conn:
+            conn.executemany(_UPSERT_ALIMENTO, linhas)
+        self.busca.limpar_cache()
+        return len(linhas)
+    
+    def buscar_alimento(self, nome: str) -> Optional[Dict]:
+        """Busca o alimento que melhor corresponde a `nome` (sem diferenciar
+        maiúsculas; `_` e `-` valem como espaço).
         
-        if row:
-            return dict(row)
-        return None
+        Prefere o nome igual, depois o que começa com `nome`, depois o mais
+        relevante que o contém (ver `busca_alimentos`).
+        """
+        return self.busca.buscar(nome)
+    
+    def mapear_alimentos(self, nomes: List[str]) -> Dict[str, Optional[Dict]]:
+        """Resolve vários nomes de uma vez (mesma busca de `buscar_alimento`).
+
+        Usado no carregamento do modelo para associar cada classe ao seu
+        registro nutricional, sem consultas durante as requisições.
+        """
+        return {nome: self.busca.buscar(nome) for nome in nomes}
     
     def listar_alimentos(self, limite: int = 100) -> List[Dict]:
         """Lista todos os alimentos."""
@@ -139,7 +436,6 @@ class NutritionDB:
         
         cursor.execute("SELECT * FROM alimentos ORDER BY nome LIMIT ?", (limite,))
         rows = cursor.fetchall()
-        conn.close()
         
         return [dict(row) for row in rows]
     
@@ -161,7 +457,6 @@ class NutritionDB:
         
         refeicao_id = cursor.lastrowid
         conn.commit()
-        conn.close()
         return refeicao_id
     
     def adicionar_item_refeicao(self, refeicao_id: int, alimento_id: int, quantidade: float = 1.0):
@@ -175,7 +470,6 @@ class NutritionDB:
         """, (refeicao_id, alimento_id, quantidade))
         
         conn.commit()
-        conn.close()
     
     def obter_refeicao(self, refeicao_id: int) -> Optional[Dict]:
         """Obtém uma refeição com seus itens."""
@@ -186,7 +480,6 @@ class NutritionDB:
         refeicao = cursor.fetchone()
         
         if not refeicao:
-            conn.close()
             return None
         
         refeicao_dict = dict(refeicao)
@@ -199,39 +492,58 @@ class NutritionDB:
             WHERE ri.refeicao_id = ?
         """, (refeicao_id,))
         
-        itens = [dict(row) for row in cursor.fetchall()]
-        refeicao_dict["itens"] = itens
+        refeicao_dict["itens"] = [dict(row) for row in cursor.fetchall()]
         
-        # Calcular totais nutricionais
-        totais = {
-            "calorias": sum(item.get("calorias", 0) * item.get("quantidade", 1.0) for item in itens),
-            "proteinas": sum(item.get("proteinas", 0) * item.get("quantidade", 1.0) for item in itens),
-            "carboidratos": sum(item.get("carboidratos", 0) * item.get("quantidade", 1.0) for item in itens),
-            "gorduras": sum(item.get("gorduras", 0) * item.get("quantidade", 1.0) for item in itens),
+        # Totais nutricionais (materializados em `refeicoes`)
+        refeicao_dict["totais"] = {
+            col.replace("total_", ""): refeicao_dict[col] for col in COLUNAS_TOTAIS
         }
-        refeicao_dict["totais"] = totais
         
-        conn.close()
         return refeicao_dict
     
     def listar_refeicoes(self, limite: int = 50) -> List[Dict]:
-        """Lista todas as refeições."""
+        """Lista as refeições mais recentes (primeira página de `pagina_refeicoes`)."""
+        return self.pagina_refeicoes(limite)["refeicoes"]
+    
+    def pagina_refeicoes(self, limite: int = 50, cursor: Optional[str] = None) -> Dict:
+        """Uma página do histórico, da refeição mais recente para a mais antiga.
+        
+        Paginação por chave (keyset): `cursor` é o `proximo` da página anterior
+        e a consulta continua do ponto onde ela parou pelo índice
+        `(criado_em, id)`, sem pular linhas com OFFSET, então o custo de uma
+        página não cresce com o histórico. Refeições criadas entre uma página
+        e outra não deslocam as seguintes.
+        
+        Retorna `{"refeicoes": [...], "proximo": cursor ou None, "total": n}`.
+        Levanta ValueError se o cursor for inválido.
+        """
+        limite = max(1, min(int(limite), MAX_POR_PAGINA))
         conn = self.get_connection()
-        cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT r.*, COUNT(ri.id) as num_itens
-            FROM refeicoes r
-            LEFT JOIN refeicao_itens ri ON r.id = ri.refeicao_id
-            GROUP BY r.id
-            ORDER BY r.criado_em DESC
-            LIMIT ?
-        """, (limite,))
+        # Número de itens e totais vêm das colunas materializadas (sem JOIN)
+        if cursor is None:
+            rows = conn.execute("""
+                SELECT * FROM refeicoes
+                ORDER BY criado_em DESC, id DESC
+                LIMIT ?
+            """, (limite + 1,)).fetchall()
+        else:
+            criado_em, refeicao_id = _ler_cursor(cursor)
+            rows = conn.execute("""
+                SELECT * FROM refeicoes
+                WHERE (criado_em, id) < (?, ?)
+                ORDER BY criado_em DESC, id DESC
+                LIMIT ?
+            """, (criado_em, refeicao_id, limite + 1)).fetchall()
         
-        rows = cursor.fetchall()
-        conn.close()
+        refeicoes = [dict(row) for row in rows[:limite]]
+        proximo = None
+        if len(rows) > limite:
+            ultima = refeicoes[-1]
+            proximo = _criar_cursor(ultima["criado_em"], ultima["id"])
         
-        return [dict(row) for row in rows]
+        total = conn.execute("SELECT valor FROM contadores WHERE nome = 'refeicoes'").fetchone()
+        return {"refeicoes": refeicoes, "proximo": proximo, "total": total[0] if total else 0}
     
     def adicionar_alimento_manual(
         self, 
@@ -261,6 +573,5 @@ class NutritionDB:
         })
         
         conn.commit()
-        conn.close()
         return alimento_id
 
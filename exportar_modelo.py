@@ -0,0 +1,233 @@
+"""
+Script para gerar o pacote de modelo usado pela API (`modelos_salvos/pacote/`).
+Execute após treinar e salvar os modelos com o notebook.
+
+Com `--compacto`, o forest é gravado em formato reduzido (índices int16/int32,
+thresholds float32 e distribuições quantizadas apenas nas folhas). Com
+`--validacao`, as árvores podem ser reduzidas mantendo a acurácia de
+validação, e o relatório mostra o compromisso entre memória, latência e
+acurácia de cada variante. Se houver `reducer.joblib`, scaler e redutor são
+gravados já combinados em uma única projeção.
+"""
+
+import argparse
+import os
+import shutil
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from forest import CompiledForest
+from model_pack import PACK_DIRNAME, save_pack
+from reducao import ProjecaoLinear, carregar_redutor
+
+MODEL_DIR = Path.cwd() / "modelos_salvos"
+
+
+def carregar_validacao(path: Path, scaler, label_encoder):
+    """Lê um `.npz` com `X` (features brutas, antes do scaler) e `y` (rótulos).
+
+    `y` pode conter os nomes das classes ou os índices do label encoder.
+    Retorna `(X, y_codificado)`, com `X` transformado por `scaler` (se houver).
+    """
+    dados = np.load(path, allow_pickle=False)
+    X, y = dados["X"], dados["y"]
+    if y.dtype.kind in "USO":
+        y = label_encoder.transform(y)
+    if scaler is not None:
+        X = scaler.transform(X)
+    return X, np.asarray(y)
+
+
+def acuracia(forest: CompiledForest, X, y) -> float:
+    return float(np.mean(forest.predict(X) == y))
+
+
+def ordenar_arvores(forest: CompiledForest, X, y) -> np.ndarray:
+    """Índices das árvores em ordem decrescente de acurácia individual na validação."""
+    folhas = forest.apply(X)
+    acertos = np.array([
+        np.mean(forest.classes_.take(forest.value[folhas[:, t]].argmax(axis=1)) == y)
+        for t in range(forest.n_estimators)
+    ])
+    return np.argsort(-acertos, kind="stable")
+
+
+def curva_de_arvores(forest: CompiledForest, ordem, X, y) -> np.ndarray:
+    """Acurácia de validação usando as `n` primeiras árvores de `ordem`, para cada `n`."""
+    folhas = forest.apply(X)
+    soma = np.zeros((X.shape[0], forest.value.shape[1]))
+    curva = np.empty(len(ordem))
+    for n, t in enumerate(ordem):
+        soma += forest.value[folhas[:, t]]
+        curva[n] = np.mean(forest.classes_.take(soma.argmax(axis=1)) == y)
+    return curva
+
+
+def escolher_n_arvores(curva: np.ndarray, tolerancia: float) -> int:
+    """Menor número de árvores com acurácia de no mínimo `acurácia total - tolerancia`."""
+    alvo = curva[-1] - tolerancia
+    return int(np.flatnonzero(curva >= alvo)[0]) + 1
+
+
+def medir_latencia(forest: CompiledForest, X, lote: int, repeticoes: int = 20) -> float:
+    """Mediana (em segundos) de `predict_with_proba` para um lote de `lote` linhas."""
+    bloco = X[np.arange(lote) % len(X)]
+    forest.predict_with_proba(bloco)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        forest.predict_with_proba(bloco)
+        tempos.append(time.perf_counter() - inicio)
+    return float(np.median(tempos))
+
+
+def latencia_scaler(scaler, X, lote: int = 64, repeticoes: int = 20) -> float:
+    """Mediana (em segundos) de `scaler.transform` para um lote de `lote` linhas."""
+    bloco = X[np.arange(lote) % len(X)]
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        scaler.transform(bloco)
+        tempos.append(time.perf_counter() - inicio)
+    return float(np.median(tempos))
+
+
+def relatorio(variantes, X, y=None):
+    """Imprime memória, latência e acurácia de cada variante `(nome, forest)`."""
+    print()
+    print(f"{'variante':<24}{'árvores':>8}{'MB':>9}{'lote 1 (ms)':>13}{'lote 64 (ms)':>14}{'acurácia':>10}")
+    for nome, forest in variantes:
+        acc = f"{acuracia(forest, X, y):.4f}" if y is not None else "-"
+        print(f"{nome:<24}{forest.n_estimators:>8}{forest.nbytes / 1e6:>9.1f}"
+              f"{medir_latencia(forest, X, 1) * 1e3:>13.2f}"
+              f"{medir_latencia(forest, X, 64) * 1e3:>14.2f}{acc:>10}")
+    if y is None:
+        print("(latência medida com dados sintéticos; passe --validacao para medir a acurácia)")
+    print()
+
+
+def exportar(model_dir: Path, pack_dir: Path, compacto: bool = False, bits_folha: int = 16,
+             validacao: Path = None, tolerancia: float = None, n_arvores: int = None,
+             incorporar_scaler: bool = False):
+    """Converte os artefatos `.joblib` em um pacote mapeável em memória."""
+    print(f"Carregando modelos de: {model_dir}")
+    rf_path = model_dir / "rf_food_classifier.joblib"
+    rf_model = joblib.load(rf_path)
+    scaler = joblib.load(model_dir / "scaler.joblib")
+    label_encoder = joblib.load(model_dir / "label_encoder.joblib")
+    redutor = carregar_redutor(model_dir)
+    print(f"   Arquivo joblib do forest: {rf_path.stat().st_size / 1e6:.1f} MB")
+
+    # Transformação aplicada pela API antes do forest
+    entrada = scaler
+    if redutor is not None:
+        if incorporar_scaler:
+            raise SystemExit("--incorporar-scaler não se aplica a modelos com redutor: "
+                             "o scaler já é incorporado à projeção")
+        entrada = ProjecaoLinear.from_sklearn(redutor, scaler)
+        print(f"   Redutor: {type(redutor).__name__}, {entrada}")
+
+    # Com o scaler incorporado, o forest (e a validação) ficam no espaço das features brutas
+    completo = CompiledForest.from_sklearn(rf_model, scaler=scaler if incorporar_scaler else None)
+    forest = completo
+    variantes = [("completo" + (" (sem scaler)" if incorporar_scaler else ""), completo)]
+
+    X, y = None, None
+    if validacao is not None:
+        X_bruto, y = carregar_validacao(validacao, None, label_encoder)
+        X = X_bruto if incorporar_scaler else entrada.transform(X_bruto)
+        print(f"   Validação: {len(y)} amostras")
+    else:
+        X_bruto = np.random.RandomState(0).normal(size=(64, int(scaler.n_features_in_)))
+        X = X_bruto if incorporar_scaler else entrada.transform(X_bruto)
+    t_scaler = latencia_scaler(entrada, X_bruto)
+    if redutor is not None:
+        print(f"   Projeção (scaler + redutor): {t_scaler * 1e3:.2f} ms por lote de 64")
+    elif incorporar_scaler:
+        print(f"   scaler.transform evitado: {t_scaler * 1e3:.2f} ms por lote de 64")
+    else:
+        print(f"   scaler.transform: {t_scaler * 1e3:.2f} ms por lote de 64 "
+              "(evitável com --incorporar-scaler)")
+
+    if tolerancia is not None or n_arvores is not None:
+        if y is not None:
+            ordem = ordenar_arvores(completo, X, y)
+            curva = curva_de_arvores(completo, ordem, X, y)
+            if n_arvores is None:
+                n_arvores = escolher_n_arvores(curva, tolerancia)
+            print(f"   Acurácia com {n_arvores}/{completo.n_estimators} árvores: "
+                  f"{curva[n_arvores - 1]:.4f} (todas: {curva[-1]:.4f})")
+        elif n_arvores is not None:
+            # Sem validação, as árvores de um RandomForest são equivalentes: usa as primeiras
+            ordem = np.arange(completo.n_estimators)
+        else:
+            raise SystemExit("--tolerancia requer --validacao")
+        forest = completo.selecionar_arvores(ordem[:n_arvores])
+        variantes.append((f"reduzido ({n_arvores})", forest))
+
+    if compacto:
+        forest = forest.compactar(bits_folha)
+        variantes.append((f"compacto ({bits_folha} bits)", forest))
+
+    relatorio(variantes, X, y)
+
+    # Grava ao lado e troca a pasta inteira: os arquivos mapeados por um
+    # servidor em execução nunca são truncados ou reescritos no lugar
+    pack_dir = Path(pack_dir)
+    tmp_dir = pack_dir.with_name(f"{pack_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    save_pack(tmp_dir, rf_model, scaler, label_encoder, forest=forest, redutor=redutor)
+    publicar(tmp_dir, pack_dir)
+    print(f"[OK] Pacote salvo em: {pack_dir}")
+    print(f"   Árvores: {forest.n_estimators}")
+    print(f"   Nós: {forest.n_nodes}")
+    print(f"   Tamanho do forest: {forest.nbytes / 1e6:.1f} MB")
+    return forest
+
+
+def publicar(tmp_dir: Path, pack_dir: Path):
+    """Substitui `pack_dir` por `tmp_dir` com renomeações de pasta.
+
+    No Linux, um bundle antigo que ainda mapeia os arquivos removidos continua
+    lendo o conteúdo original até ser descartado.
+    """
+    antigo = pack_dir.with_name(f"{pack_dir.name}.old-{os.getpid()}")
+    if pack_dir.exists():
+        os.replace(pack_dir, antigo)
+    os.replace(tmp_dir, pack_dir)
+    shutil.rmtree(antigo, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", type=Path, default=MODEL_DIR,
+                        help="pasta com os arquivos .joblib (padrão: modelos_salvos)")
+    parser.add_argument("--saida", type=Path, default=None,
+                        help=f"pasta do pacote (padrão: <model-dir>/{PACK_DIRNAME})")
+    parser.add_argument("--compacto", action="store_true",
+                        help="grava o forest compacto (índices estreitos, folhas quantizadas)")
+    parser.add_argument("--bits-folha", type=int, choices=(8, 16, 32), default=16,
+                        help="bits por probabilidade nas folhas do forest compacto (32 = float32)")
+    parser.add_argument("--validacao", type=Path, default=None,
+                        help="arquivo .npz com X (features brutas) e y (rótulos) de validação "
+                             "(o notebook grava <model-dir>/validacao.npz)")
+    parser.add_argument("--tolerancia", type=float, default=None,
+                        help="perda máxima de acurácia de validação ao reduzir o número de árvores")
+    parser.add_argument("--arvores", type=int, default=None,
+                        help="número fixo de árvores (as melhores na validação, se houver)")
+    parser.add_argument("--incorporar-scaler", action="store_true",
+                        help="reescreve os thresholds no espaço das features brutas; "
+                             "a API deixa de aplicar o scaler")
+    args = parser.parse_args()
+
+    exportar(args.model_dir, args.saida or args.model_dir / PACK_DIRNAME,
+             compacto=args.compacto, bits_folha=args.bits_folha, validacao=args.validacao,
+             tolerancia=args.tolerancia, n_arvores=args.arvores,
+             incorporar_scaler=args.incorporar_scaler)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Extração de features em um pool de processos, fora do GIL do servidor.
+
+Cada processo do pool mantém seu próprio `FeatureExtractor` (criado uma vez,
+no `initializer`) e escreve o vetor de features direto em um bloco de
+memória compartilhada (`multiprocessing.shared_memory`), dividido em slots de
+`n_features` floats. Pelo pipe trafegam apenas os bytes comprimidos da imagem
+e o número do slot; os vetores nunca são serializados.
+"""
+
+import atexit
+import io
+import multiprocessing as mp
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+import numpy as np
+
+from features import FeatureExtractor, FeatureSpec
+
+_DTYPE = np.float64
+
+# Estado de cada processo do pool
+_extrator: Optional[FeatureExtractor] = None
+_shm: Optional[shared_memory.SharedMemory] = None
+_slots: Optional[np.ndarray] = None
+_barreira = None
+
+# Espera máxima (s) para todos os processos do pool ficarem prontos no aquecimento
+TIMEOUT_AQUECIMENTO = 120
+
+
+def _init_worker(spec_dict: dict, opcoes: dict, shm_name: str, n_slots: int, n_features: int,
+                 barreira):
+    global _extrator, _shm, _slots, _barreira
+    _barreira = barreira
+    _extrator = FeatureExtractor(FeatureSpec.from_dict(spec_dict), **opcoes)
+    # O bloco pertence ao processo principal, que o remove em `close()`
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _slots = np.ndarray((n_slots, n_features), dtype=_DTYPE, buffer=_shm.buf)
+
+
+def _aquecer() -> int:
+    # Segura este processo até todos os outros também estarem rodando uma
+    # tarefa de aquecimento: cada tarefa fica, assim, em um processo diferente
+    try:
+        _barreira.wait(TIMEOUT_AQUECIMENTO)
+    except threading.BrokenBarrierError:
+        pass
+    return os.getpid()
+
+
+def _extrair_no_slot(data: bytes, slot: int) -> int:
+    _slots[slot] = _extrator.extract(_extrator.load(io.BytesIO(data)))
+    return slot
+
+
+class FeaturePool:
+    """Pool de processos para extração de features com retorno por memória compartilhada."""
+
+    def __init__(self, spec: FeatureSpec, n_processos: Optional[int] = None, n_slots: int = 64,
+                 opcoes: Optional[dict] = None):
+        self.spec = spec
+        # Argumentos extras do FeatureExtractor de cada processo (ex.: jpeg_draft)
+        self.opcoes = dict(opcoes or {})
+        self._pid = os.getpid()
+        self.n_processos = n_processos or os.cpu_count() or 1
+        self.n_slots = n_slots
+        self.n_features = spec.n_features
+
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=n_slots * self.n_features * np.dtype(_DTYPE).itemsize
+        )
+        self._slots = np.ndarray((n_slots, self.n_features), dtype=_DTYPE, buffer=self._shm.buf)
+        # Slots livres e chamadas em andamento, protegidos pela mesma condição
+        self._livres = list(range(n_slots))
+        self._em_andamento = 0
+        self._fechado = False
+        self._condicao = threading.Condition()
+
+        # "spawn" evita fork de um servidor com várias threads e funciona no Windows
+        contexto = mp.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_processos,
+            mp_context=contexto,
+            initializer=_init_worker,
+            initargs=(spec.to_dict(), self.opcoes, self._shm.name, n_slots, self.n_features,
+                      contexto.Barrier(self.n_processos)),
+        )
+        self._aquecer()
+        atexit.register(self.close)
+
+    def _aquecer(self):
+        """Inicia todos os processos agora, e não na primeira requisição.
+
+        Cada tarefa de aquecimento espera na barreira até haver uma em cada
+        processo, então o executor precisa criar todos eles.
+        """
+        futures = [self._executor.submit(_aquecer) for _ in range(self.n_processos)]
+        pids = {f.result() for f in futures}
+        if len(pids) == self.n_processos:
+            print(f"[OK] Pool de features com {len(pids)} processos")
+        else:
+            print(f"[WARN] Pool de features com {len(pids)} de {self.n_processos} processos "
+                  f"prontos no aquecimento")
+
+    def _reservar(self, n: int) -> List[int]:
+        """Toma `n` slots de uma vez, esperando até haver `n` livres.
+
+        Reservar todos juntos (e não um a um) evita que duas chamadas
+        concorrentes fiquem cada uma com parte dos slots, esperando a outra.
+        """
+        with self._condicao:
+            self._condicao.wait_for(lambda: len(self._livres) >= n)
+            slots, self._livres = self._livres[:n], self._livres[n:]
+            return slots
+
+    def _devolver(self, slots: List[int]):
+        with self._condicao:
+            self._livres.extend(slots)
+            self._condicao.notify_all()
+
+    def extract_batch(self, datas: List[bytes], falhas: Optional[list] = None) -> np.ndarray:
+        """Extrai as features de várias imagens (bytes) em paralelo.
+
+        Retorna uma matriz `(N, n_features)` montada direto dos slots
+        compartilhados. Lotes maiores que o número de slots são processados
+        em partes. Com uma lista em `falhas`, uma imagem que falhar não
+        interrompe o lote: seu índice vai para `falhas` e sua linha fica
+        indefinida.
+        """
+        with self._condicao:
+            if self._fechado:
+                raise RuntimeError("Pool de features encerrado")
+            self._em_andamento += 1
+        try:
+            X = np.empty((len(datas), self.n_features), dtype=_DTYPE)
+            for inicio in range(0, len(datas), self.n_slots):
+                parte = datas[inicio:inicio + self.n_slots]
+                slots = self._reservar(len(parte))
+                futures = []
+                try:
+                    for data, slot in zip(parte, slots):
+                        futures.append(self._executor.submit(_extrair_no_slot, data, slot))
+                    for j, future in enumerate(futures):
+                        try:
+                            future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            if falhas is None:
+                                raise
+                            print(f"[WARN] Imagem {inicio + j} do lote ilegível: {e}")
+                            falhas.append(inicio + j)
+                    X[inicio:inicio + len(parte)] = self._slots[slots]
+                finally:
+                    # Após um erro, as outras tarefas ainda podem estar gravando nos slots:
+                    # só os devolve quando todas terminarem (ou forem canceladas)
+                    for future in futures:
+                        future.cancel()
+                    wait(futures)
+                    self._devolver(slots)
+            return X
+        finally:
+            with self._condicao:
+                self._em_andamento -= 1
+                self._condicao.notify_all()
+
+    def close(self):
+        """Encerra o pool depois que as chamadas em andamento terminarem.
+
+        Novas chamadas a `extract_batch` passam a falhar; as que já começaram
+        (ex.: requisições da versão anterior do modelo) vão até o fim.
+        """
+        # Apenas o processo que criou o pool pode encerrá-lo e remover o bloco
+        if self._pid != os.getpid():
+            return
+        with self._condicao:
+            if self._fechado:
+                return
+            self._fechado = True
+            self._condicao.wait_for(lambda: self._em_andamento == 0)
+        self._executor.shutdown(wait=True)
+        self._slots = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+# Pools por processo; o anterior é mantido enquanto houver requisições da versão
+# antiga do modelo (troca de layout durante uma recarga)
+_MAX_POOLS = 2
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(spec: FeatureSpec, n_processos: int, opcoes: Optional[dict] = None) -> FeaturePool:
+    """Retorna o pool do processo atual para `spec`, criando-o no primeiro uso.
+
+    Os pools são indexados por PID: um pool criado antes do fork (ex.: Gunicorn
+    com `preload_app`) não é reaproveitado pelos workers. Cada layout de
+    features e conjunto de opções tem seu pool; apenas os `_MAX_POOLS` usados
+    mais recentemente são mantidos e os demais são encerrados.
+    """
+    pid = os.getpid()
+    chave = (spec, tuple(sorted(dict(opcoes or {}).items())))
+    with _pools_lock:
+        pools = _pools.setdefault(pid, OrderedDict())
+        pool = pools.get(chave)
+        if pool is None:
+            pool = FeaturePool(spec, n_processos=n_processos, opcoes=opcoes)
+            pools[chave] = pool
+        pools.move_to_end(chave)
+        while len(pools) > _MAX_POOLS:
+            _, antigo = pools.popitem(last=False)
+            # Em segundo plano: o pool antigo espera as requisições que ainda o usam
+            threading.Thread(target=antigo.close, name="feature-pool-close", daemon=True).start()
+        return pool
@@ -0,0 +1,252 @@
+"""
+Extração de features (RGB + HOG) com layout resolvido uma única vez.
+
+O layout das features (tamanho da imagem, método e parâmetros do HOG) é
+resolvido no carregamento do modelo, a partir do arquivo `feature_spec.json`
+salvo ao lado do `scaler.joblib` ou, na falta dele, deduzido de
+`scaler.n_features_in_`. O resultado é um `FeatureExtractor` fixo, que calcula
+apenas o que o modelo precisa em cada requisição.
+"""
+
+import json
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from skimage.feature import hog
+from skimage import color
+
+from fast_hog import BatchHOG
+from metrics import medir
+
+FEATURE_SPEC_FILENAME = "feature_spec.json"
+
+# Métodos suportados: RGB + HOG, apenas RGB ou apenas HOG
+METODOS = ("combined", "rgb", "hog")
+
+# Ordem de prioridade usada para deduzir o layout a partir do scaler
+IMG_SIZES_CONHECIDOS = (96, 64, 128)
+
+# No modo draft, o JPEG é decodificado com pelo menos MARGEM_DRAFT vezes o
+# tamanho final, para que o resize ainda tenha pixels para filtrar
+MARGEM_DRAFT = 2
+
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    """Descrição do layout do vetor de features esperado pelo modelo."""
+
+    img_size: int = 96
+    metodo: str = "combined"
+    orientations: int = 9
+    pixels_per_cell: Tuple[int, int] = (8, 8)
+    cells_per_block: Tuple[int, int] = (2, 2)
+
+    @property
+    def n_rgb(self) -> int:
+        return self.img_size * self.img_size * 3
+
+    @property
+    def n_hog(self) -> int:
+        cells_row = self.img_size // self.pixels_per_cell[0]
+        cells_col = self.img_size // self.pixels_per_cell[1]
+        blocks_row = cells_row - self.cells_per_block[0] + 1
+        blocks_col = cells_col - self.cells_per_block[1] + 1
+        return (blocks_row * blocks_col * self.cells_per_block[0]
+                * self.cells_per_block[1] * self.orientations)
+
+    @property
+    def n_features(self) -> int:
+        if self.metodo == "rgb":
+            return self.n_rgb
+        if self.metodo == "hog":
+            return self.n_hog
+        return self.n_rgb + self.n_hog
+
+    def to_dict(self) -> dict:
+        dados = asdict(self)
+        dados["pixels_per_cell"] = list(self.pixels_per_cell)
+        dados["cells_per_block"] = list(self.cells_per_block)
+        return dados
+
+    @classmethod
+    def from_dict(cls, dados: dict) -> "FeatureSpec":
+        metodo = dados.get("metodo", "combined")
+        if metodo == "simple":
+            # Nome usado no notebook para "apenas RGB"
+            metodo = "rgb"
+        if metodo not in METODOS:
+            raise ValueError(f"Método de features desconhecido: {metodo}")
+        return cls(
+            img_size=int(dados.get("img_size", 96)),
+            metodo=metodo,
+            orientations=int(dados.get("orientations", 9)),
+            pixels_per_cell=tuple(dados.get("pixels_per_cell", (8, 8))),
+            cells_per_block=tuple(dados.get("cells_per_block", (2, 2))),
+        )
+
+
+def save_feature_spec(spec: FeatureSpec, model_dir: Path) -> Path:
+    """Salva o layout das features ao lado dos artefatos do modelo."""
+    path = Path(model_dir) / FEATURE_SPEC_FILENAME
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(spec.to_dict(), f, indent=2)
+    return path
+
+
+def load_feature_spec(model_dir: Path) -> Optional[FeatureSpec]:
+    """Lê o `feature_spec.json`, se existir."""
+    path = Path(model_dir) / FEATURE_SPEC_FILENAME
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return FeatureSpec.from_dict(json.load(f))
+
+
+def infer_feature_spec(n_features: int) -> Optional[FeatureSpec]:
+    """Deduz o layout a partir do número de features esperado pelo scaler.
+
+    Segue a mesma ordem de prioridade da antiga sondagem por requisição
+    (96, 64, 128; combinado, RGB, HOG), mas apenas com aritmética sobre os
+    tamanhos, sem processar nenhuma imagem.
+    """
+    for img_size in IMG_SIZES_CONHECIDOS:
+        for metodo in METODOS:
+            spec = FeatureSpec(img_size=img_size, metodo=metodo)
+            if spec.n_features == n_features:
+                return spec
+    return None
+
+
+def resolve_feature_spec(scaler, model_dir: Path) -> FeatureSpec:
+    """Resolve o layout das features uma única vez, no carregamento do modelo.
+
+    Prioridade: sidecar `feature_spec.json` > dedução por
+    `scaler.n_features_in_` > padrão (combinado em 96x96).
+    """
+    return resolve_feature_spec_com_origem(scaler, model_dir)[0]
+
+
+def resolve_feature_spec_com_origem(scaler, model_dir: Path) -> Tuple[FeatureSpec, str]:
+    """Como `resolve_feature_spec`, mas retorna também de onde veio o layout:
+    `"arquivo"`, `"scaler"` ou `"padrao"`."""
+    spec = load_feature_spec(model_dir)
+    expected = getattr(scaler, "n_features_in_", None)
+    if spec is not None:
+        if expected is not None and spec.n_features != expected:
+            print(f"[WARN] {FEATURE_SPEC_FILENAME} descreve {spec.n_features} features, "
+                  f"mas o scaler espera {expected}")
+        return spec, "arquivo"
+
+    if expected is not None:
+        spec = infer_feature_spec(int(expected))
+        if spec is not None:
+            return spec, "scaler"
+        print(f"[WARN] Nenhum layout conhecido produz {expected} features - "
+              "usando combinado 96x96")
+    return FeatureSpec(), "padrao"
+
+
+class FeatureExtractor:
+    """Extrator de features com layout fixo.
+
+    `extract()` devolve o vetor bruto (antes do scaler) de uma imagem PIL,
+    `extract_batch()` a matriz `(N, n_features)` de várias imagens e
+    `transform()` aplica o scaler. Com `hog_vetorizado=True` o HOG é calculado
+    por `fast_hog.BatchHOG` (o lote inteiro de uma vez); caso contrário, por
+    `skimage.feature.hog` imagem a imagem. Com `jpeg_draft=True`, `load()`
+    decodifica JPEGs já reduzidos (escala DCT de 1/2, 1/4 ou 1/8).
+    """
+
+    def __init__(self, spec: FeatureSpec, scaler=None, hog_vetorizado: bool = True,
+                 jpeg_draft: bool = False):
+        self.spec = spec
+        self.scaler = scaler
+        self.jpeg_draft = jpeg_draft
+        self._size = (spec.img_size, spec.img_size)
+        self._draft_size = (spec.img_size * MARGEM_DRAFT, spec.img_size * MARGEM_DRAFT)
+        self._usa_rgb = spec.metodo in ("combined", "rgb")
+        self._usa_hog = spec.metodo in ("combined", "hog")
+        self._hog_kwargs = dict(
+            orientations=spec.orientations,
+            pixels_per_cell=spec.pixels_per_cell,
+            cells_per_block=spec.cells_per_block,
+            visualize=False,
+        )
+        self._batch_hog = None
+        if self._usa_hog and hog_vetorizado:
+            self._batch_hog = BatchHOG(
+                self._size,
+                orientations=spec.orientations,
+                pixels_per_cell=spec.pixels_per_cell,
+                cells_per_block=spec.cells_per_block,
+            )
+
+    @property
+    def n_features(self) -> int:
+        return self.spec.n_features
+
+    def load(self, source) -> Image.Image:
+        """Abre uma imagem (caminho ou file-like) em RGB, pronta para `extract()`.
+
+        Para JPEGs, o `draft` do PIL escolhe a maior redução por potência de 2
+        que ainda mantém a imagem com pelo menos `MARGEM_DRAFT` vezes o tamanho
+        final; a decodificação em resolução cheia de fotos de 12+ MP é evitada.
+        """
+        with medir("decodificar"):
+            img = Image.open(source)
+            if self.jpeg_draft and img.format == "JPEG":
+                img.draft("RGB", self._draft_size)
+            return img.convert("RGB")
+
+    def extract(self, img: Image.Image) -> np.ndarray:
+        """Calcula o vetor de features bruto de uma imagem RGB."""
+        return self.extract_batch([img])[0]
+
+    def extract_batch(self, imgs) -> np.ndarray:
+        """Calcula a matriz de features brutas `(N, n_features)` de imagens RGB."""
+        with medir("redimensionar"):
+            arr_rgb = np.stack([
+                np.array(img.resize(self._size)) for img in imgs
+            ]).astype(np.float32) / 255.0
+        n = arr_rgb.shape[0]
+
+        partes = []
+        if self._usa_rgb:
+            partes.append(arr_rgb.reshape(n, -1))
+        if self._usa_hog:
+            with medir("cinza"):
+                img_gray = color.rgb2gray(arr_rgb)
+            with medir("hog"):
+                if self._batch_hog is not None:
+                    partes.append(self._batch_hog(img_gray))
+                else:
+                    partes.append(np.stack([hog(g, **self._hog_kwargs) for g in img_gray]))
+
+        if len(partes) == 1:
+            return partes[0]
+        return np.concatenate(partes, axis=1)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Aplica o scaler a uma matriz de features brutas."""
+        if self.scaler is None:
+            return X
+        with medir("scaler"):
+            return self.scaler.transform(X)
+
+    def __call__(self, img: Image.Image) -> np.ndarray:
+        """Atalho: features já transformadas, no formato `(1, n_features)`."""
+        return self.transform(self.extract(img)[np.newaxis, :])
+
+    @property
+    def implementacao_hog(self) -> str:
+        """Implementação do HOG em uso: "vetorizado", "skimage" ou "nenhum"."""
+        if not self._usa_hog:
+            return "nenhum"
+        return "vetorizado" if self._batch_hog is not None else "skimage"
+
+    def __repr__(self) -> str:
+        return (f"FeatureExtractor(img_size={self.spec.img_size}, "
+                f"metodo={self.spec.metodo!r}, n_features={self.n_features})")
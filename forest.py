@@ -0,0 +1,330 @@
+"""
+Motor de inferência para o RandomForest baseado em arrays NumPy contíguos.
+
+As árvores do `RandomForestClassifier` treinado são achatadas em arrays
+únicos (feature, threshold, filhos e distribuição de classes das folhas),
+com um deslocamento por árvore. A travessia avança todas as árvores para
+todas as amostras do lote ao mesmo tempo, um nível por iteração, e devolve
+em uma única passada o índice da classe vencedora e sua probabilidade.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+# Marcador de folha usado pelo sklearn em `tree_.children_left`
+TREE_LEAF = -1
+
+# Arrays gravados por `CompiledForest.save()` (um .npy por array)
+_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "classes_")
+
+# Array opcional da versão compacta (`compactar()`): nó -> linha de `value`
+_ARRAYS_OPCIONAIS = ("leaf_index",)
+
+# Tamanho máximo (em elementos) do array temporário usado para agregar as folhas
+_MAX_ELEMENTOS_TEMP = 4_000_000
+
+# Tipos inteiros sem sinal para as distribuições quantizadas das folhas
+_QUANTIZACAO = {8: np.uint8, 16: np.uint16}
+
+
+def _menor_int(maximo: int):
+    """Menor tipo inteiro com sinal (int16 ou int32) que representa `maximo`."""
+    return np.int16 if maximo <= np.iinfo(np.int16).max else np.int32
+
+
+def _threshold_float32(thresholds: np.ndarray) -> np.ndarray:
+    """Converte thresholds float64 em float32 sem alterar nenhuma decisão.
+
+    O sklearn converte as amostras para float32 e compara `x <= threshold`.
+    Para um `x` float32, isso equivale a comparar com o maior float32 que não
+    ultrapassa o threshold, então arredondamos sempre para baixo.
+    """
+    t32 = thresholds.astype(np.float32)
+    acima = t32.astype(np.float64) > thresholds
+    t32[acima] = np.nextafter(t32[acima], np.float32(-np.inf))
+    return t32
+
+
+def _parametros_scaler(scaler):
+    """`(mean, scale)` de um scaler afim por feature (`StandardScaler` ou `PackedScaler`)."""
+    if not (hasattr(scaler, "mean_") and hasattr(scaler, "scale_")):
+        raise ValueError(f"Só é possível incorporar scalers afins por feature, não {type(scaler).__name__}")
+    mean = scaler.mean_ if getattr(scaler, "with_mean", True) else None
+    scale = scaler.scale_ if getattr(scaler, "with_std", True) else None
+    return mean, scale
+
+
+class CompiledForest:
+    """Floresta compilada em arrays contíguos.
+
+    Atributos principais (um elemento por nó, todas as árvores concatenadas):
+    - `feature`: índice da feature testada no nó (0 nas folhas)
+    - `threshold`: limiar float32 do teste `x <= threshold`
+    - `left` / `right`: índice global dos filhos (o próprio nó nas folhas)
+    - `value`: distribuição de classes normalizada de cada nó `(n_nodes, n_classes)`
+    - `roots`: índice global da raiz de cada árvore
+    - `classes_`: rótulos do forest original (`rf_model.classes_`)
+
+    Na versão compacta (`compactar()`), `value` guarda apenas as folhas,
+    quantizadas em inteiros: `leaf_index` leva cada nó à sua linha em `value`
+    e `value_scale` converte as somas de volta em probabilidades.
+
+    Com `scaler_incorporado`, os thresholds estão no espaço das features
+    brutas: o forest recebe as features sem `scaler.transform`.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth,
+                 leaf_index=None, value_scale=1.0, scaler_incorporado=False):
+        self.feature = np.ascontiguousarray(feature)
+        self.threshold = np.ascontiguousarray(threshold)
+        self.left = np.ascontiguousarray(left)
+        self.right = np.ascontiguousarray(right)
+        self.value = np.ascontiguousarray(value)
+        self.roots = np.ascontiguousarray(roots)
+        self.classes_ = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self.leaf_index = None if leaf_index is None else np.ascontiguousarray(leaf_index)
+        self.value_scale = float(value_scale)
+        self.scaler_incorporado = bool(scaler_incorporado)
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.feature, self.threshold, self.left, self.right, self.value, self.roots]
+        if self.leaf_index is not None:
+            arrays.append(self.leaf_index)
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def compacto(self) -> bool:
+        return self.leaf_index is not None
+
+    @classmethod
+    def from_sklearn(cls, rf_model, scaler=None) -> "CompiledForest":
+        """Achata um `RandomForestClassifier` (ou `ExtraTreesClassifier`) treinado.
+
+        Com `scaler` (um `StandardScaler` usado antes do forest), o scaler é
+        incorporado aos thresholds: como cada nó testa uma única feature,
+        `(x - mean) / scale <= t` equivale a `x <= t * scale + mean`
+        (`scale > 0`). As decisões só podem diferir do pipeline original para
+        features a menos de um passo de float32 do threshold.
+        """
+        mean, scale = _parametros_scaler(scaler) if scaler is not None else (None, None)
+        estimators = rf_model.estimators_
+        n_classes = int(rf_model.n_classes_)
+
+        tamanhos = [est.tree_.node_count for est in estimators]
+        roots = np.concatenate([[0], np.cumsum(tamanhos)[:-1]]).astype(np.int64)
+        n_nodes = int(sum(tamanhos))
+
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.zeros(n_nodes, dtype=np.float32)
+        left = np.zeros(n_nodes, dtype=np.int64)
+        right = np.zeros(n_nodes, dtype=np.int64)
+        value = np.zeros((n_nodes, n_classes), dtype=np.float64)
+
+        max_depth = 0
+        for est, inicio, tamanho in zip(estimators, roots, tamanhos):
+            tree = est.tree_
+            fim = inicio + tamanho
+            folha = tree.children_left == TREE_LEAF
+            locais = np.arange(tamanho)
+
+            feature[inicio:fim] = np.where(folha, 0, tree.feature)
+            t = np.where(folha, 0.0, tree.threshold)
+            if scale is not None:
+                t = t * scale[feature[inicio:fim]]
+            if mean is not None:
+                t = t + mean[feature[inicio:fim]]
+            threshold[inicio:fim] = _threshold_float32(np.where(folha, 0.0, t))
+            # Nas folhas os filhos apontam para o próprio nó, então a travessia
+            # pode continuar iterando sem sair do lugar
+            left[inicio:fim] = inicio + np.where(folha, locais, tree.children_left)
+            right[inicio:fim] = inicio + np.where(folha, locais, tree.children_right)
+
+            # Mesmo cálculo do `predict_proba` de cada árvore: contagens
+            # (ou frações) normalizadas por nó
+            v = tree.value[:, 0, :].astype(np.float64)
+            soma = v.sum(axis=1, keepdims=True)
+            soma[soma == 0.0] = 1.0
+            value[inicio:fim] = v / soma
+
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(feature, threshold, left, right, value, roots, rf_model.classes_, max_depth,
+                   scaler_incorporado=scaler is not None)
+
+    def selecionar_arvores(self, indices) -> "CompiledForest":
+        """Novo forest apenas com as árvores `indices` (na ordem dada).
+
+        Só se aplica ao forest completo (antes de `compactar()`).
+        """
+        if self.compacto:
+            raise ValueError("Selecione as árvores antes de compactar o forest")
+        fins = np.append(self.roots[1:], self.n_nodes)
+        partes = {nome: [] for nome in ("feature", "threshold", "left", "right", "value")}
+        roots = []
+        inicio_novo = 0
+        for t in indices:
+            inicio, fim = int(self.roots[t]), int(fins[t])
+            deslocamento = inicio_novo - inicio
+            partes["feature"].append(self.feature[inicio:fim])
+            partes["threshold"].append(self.threshold[inicio:fim])
+            partes["left"].append(self.left[inicio:fim] + deslocamento)
+            partes["right"].append(self.right[inicio:fim] + deslocamento)
+            partes["value"].append(self.value[inicio:fim])
+            roots.append(inicio_novo)
+            inicio_novo += fim - inicio
+        arrays = {nome: np.concatenate(p) for nome, p in partes.items()}
+        return CompiledForest(
+            arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+            arrays["value"], np.asarray(roots, dtype=np.int64), self.classes_, self.max_depth,
+            scaler_incorporado=self.scaler_incorporado,
+        )
+
+    def compactar(self, bits_folha: int = 16) -> "CompiledForest":
+        """Versão compacta para servir, com as mesmas decisões em cada nó.
+
+        - índices de feature e de filhos em int16 quando couberem (senão int32);
+        - thresholds em float32 (já arredondados em `from_sklearn`);
+        - distribuições de classe apenas nas folhas, quantizadas em inteiros
+          de `bits_folha` bits (8 ou 16), ou float32 com `bits_folha=32`.
+
+        Só a quantização altera as probabilidades (erro máximo de
+        `0.5 / (2**bits_folha - 1)` por folha); compare a acurácia antes de usar.
+        """
+        if self.compacto:
+            raise ValueError("O forest já está compactado")
+        nos = np.arange(self.n_nodes)
+        folhas = np.flatnonzero(self.left == nos)
+
+        tipo_no = _menor_int(self.n_nodes - 1)
+        leaf_index = np.zeros(self.n_nodes, dtype=_menor_int(len(folhas) - 1))
+        leaf_index[folhas] = np.arange(len(folhas))
+
+        distribuicoes = self.value[folhas]
+        if bits_folha == 32:
+            value, escala = distribuicoes.astype(np.float32), 1.0
+        elif bits_folha in _QUANTIZACAO:
+            tipo = _QUANTIZACAO[bits_folha]
+            maximo = np.iinfo(tipo).max
+            value, escala = np.rint(distribuicoes * maximo).astype(tipo), 1.0 / maximo
+        else:
+            raise ValueError(f"bits_folha deve ser 8, 16 ou 32 (recebido {bits_folha})")
+
+        return CompiledForest(
+            self.feature.astype(_menor_int(int(self.feature.max(initial=0)))),
+            self.threshold.astype(np.float32),
+            self.left.astype(tipo_no), self.right.astype(tipo_no),
+            value, self.roots.astype(tipo_no), self.classes_, self.max_depth,
+            leaf_index=leaf_index, value_scale=escala, scaler_incorporado=self.scaler_incorporado,
+        )
+
+    def save(self, pack_dir: Path):
+        """Grava os arrays como `.npy` não comprimidos, prontos para `mmap`."""
+        pack_dir = Path(pack_dir)
+        pack_dir.mkdir(parents=True, exist_ok=True)
+        for nome in _ARRAYS:
+            np.save(pack_dir / f"forest_{nome}.npy", getattr(self, nome), allow_pickle=False)
+        if self.leaf_index is not None:
+            np.save(pack_dir / "forest_leaf_index.npy", self.leaf_index, allow_pickle=False)
+        with open(pack_dir / "forest.json", "w", encoding="utf-8") as f:
+            json.dump({"max_depth": self.max_depth, "value_scale": self.value_scale,
+                       "scaler_incorporado": self.scaler_incorporado}, f, indent=2)
+
+    @classmethod
+    def load(cls, pack_dir: Path, mmap: bool = True) -> "CompiledForest":
+        """Carrega um forest gravado com `save()`.
+
+        Com `mmap=True` os arrays são mapeados somente-leitura: todos os
+        processos que abrem o mesmo pacote compartilham as mesmas páginas
+        físicas (page cache) em vez de manter uma cópia cada.
+        """
+        pack_dir = Path(pack_dir)
+        modo = "r" if mmap else None
+        arrays = {
+            nome: np.load(pack_dir / f"forest_{nome}.npy", mmap_mode=modo, allow_pickle=False)
+            for nome in _ARRAYS
+        }
+        for nome in _ARRAYS_OPCIONAIS:
+            path = pack_dir / f"forest_{nome}.npy"
+            arrays[nome] = np.load(path, mmap_mode=modo, allow_pickle=False) if path.exists() else None
+        with open(pack_dir / "forest.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+            arrays["value"], arrays["roots"], arrays["classes_"], meta["max_depth"],
+            leaf_index=arrays["leaf_index"], value_scale=meta.get("value_scale", 1.0),
+            scaler_incorporado=meta.get("scaler_incorporado", False),
+        )
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Índice global da folha alcançada em cada árvore, formato `(N, n_estimators)`."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = X.shape[0]
+        # Índices planos em X (linha * n_features + feature): um único gather por nível
+        X_plano = X.ravel()
+        base = (np.arange(n, dtype=np.intp) * X.shape[1])[:, np.newaxis]
+        nos = np.broadcast_to(self.roots.astype(np.intp), (n, self.n_estimators)).copy()
+
+        for _ in range(self.max_depth):
+            vai_esquerda = X_plano[base + self.feature[nos]] <= self.threshold[nos]
+            # Volta para intp: indexar com int16/int32 (forest compacto) exige conversão a cada gather
+            nos = np.where(vai_esquerda, self.left[nos], self.right[nos]).astype(np.intp, copy=False)
+        return nos
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Média das distribuições das folhas, formato `(N, n_classes)`."""
+        folhas = self.apply(X)
+        if self.leaf_index is not None:
+            folhas = self.leaf_index[folhas]
+        n, n_classes = folhas.shape[0], self.value.shape[1]
+        proba = np.empty((n, n_classes), dtype=np.float64)
+        # Agrega em blocos de linhas para limitar o array temporário (linhas x árvores x classes)
+        passo = max(1, _MAX_ELEMENTOS_TEMP // (self.n_estimators * n_classes))
+        for inicio in range(0, n, passo):
+            bloco = folhas[inicio:inicio + passo]
+            proba[inicio:inicio + passo] = self.value[bloco].sum(axis=1, dtype=np.float64)
+        if self.value_scale != 1.0:
+            proba *= self.value_scale
+        proba /= self.n_estimators
+        return proba
+
+    def predict_with_proba(self, X: np.ndarray):
+        """Retorna `(classes, confiancas)` em uma única travessia.
+
+        `classes` contém os rótulos de `classes_` (equivalente a
+        `rf_model.predict`) e `confiancas` a probabilidade da classe vencedora
+        (equivalente a `max(rf_model.predict_proba(X)[i])`).
+        """
+        proba = self.predict_proba(X)
+        idx = proba.argmax(axis=1)
+        return self.classes_.take(idx), proba[np.arange(len(idx)), idx]
+
+    def predict_top_k(self, X: np.ndarray, k: int):
+        """Retorna `(classes, probas)`, ambos `(N, k)`, em ordem decrescente de probabilidade.
+
+        A primeira coluna coincide com `predict_with_proba` (empates resolvidos
+        pela classe de menor índice, como o `argmax`).
+        """
+        idx, probas = top_k(self.predict_proba(X), k)
+        return self.classes_.take(idx), probas
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+
+def top_k(proba: np.ndarray, k: int):
+    """Índices e probabilidades das `k` classes mais prováveis de cada linha."""
+    k = min(k, proba.shape[1])
+    idx = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+    return idx, np.take_along_axis(proba, idx, axis=1)
@@ -0,0 +1,19 @@
+"""
+Configuração do Gunicorn para servir a API em produção.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Com `preload_app = True` os modelos são carregados uma vez no processo mestre,
+antes do fork, e os workers herdam as mesmas páginas de memória. Se existir
+`modelos_salvos/pacote/` (gerado por `exportar_modelo.py`), os arrays do forest
+e do scaler são mapeados somente-leitura e também são compartilhados entre
+workers iniciados sem preload.
+"""
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+threads = int(os.environ.get("GUNICORN_THREADS", "2"))
+preload_app = True
+timeout = 60
@@ -0,0 +1,208 @@
+"""
+Métricas da API no formato de exposição de texto do Prometheus.
+
+Contadores e histogramas simples, sem dependências externas, registrados em
+um registro global por processo e expostos em `/metrics`. Com vários workers
+(Gunicorn/Uvicorn), cada processo mantém e expõe os seus próprios valores.
+
+    with medir("hog"):
+        ...
+
+registra a duração do bloco no histograma `inferencia_etapa_segundos`.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites padrão (segundos): de 100 µs a 10 s
+BUCKETS_PADRAO = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                  0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _formatar_valor(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor))
+
+
+def _formatar_labels(nomes: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, labels: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _chave(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.nome}: labels esperados {self.labels}, recebidos {tuple(labels)}")
+        return tuple(str(labels[nome]) for nome in self.labels)
+
+    def _cabecalho(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Counter(_Metrica):
+    """Contador monotônico, opcionalmente com labels."""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, labels: Sequence[str] = ()):
+        super().__init__(nome, ajuda, labels)
+        self._valores = {}
+
+    def inc(self, valor: float = 1.0, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def valor(self, **labels) -> float:
+        return self._valores.get(self._chave(labels), 0.0)
+
+    def expor(self) -> List[str]:
+        linhas = self._cabecalho()
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            linhas.append(f"{self.nome}{_formatar_labels(self.labels, chave)} {_formatar_valor(valor)}")
+        return linhas
+
+
+class Gauge(Counter):
+    """Valor instantâneo (pode subir ou descer)."""
+
+    tipo = "gauge"
+
+    def set(self, valor: float, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            self._valores[chave] = float(valor)
+
+    def clear(self):
+        with self._lock:
+            self._valores.clear()
+
+
+class Histogram(_Metrica):
+    """Histograma cumulativo com limites fixos, opcionalmente com labels."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_PADRAO):
+        super().__init__(nome, ajuda, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Por combinação de labels: [contagens por bucket (+Inf no fim), soma]
+        self._series = {}
+
+    def observe(self, valor: float, **labels):
+        chave = self._chave(labels)
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def contagem(self, **labels) -> int:
+        serie = self._series.get(self._chave(labels))
+        return sum(serie[0]) if serie else 0
+
+    def expor(self) -> List[str]:
+        linhas = self._cabecalho()
+        with self._lock:
+            series = sorted((chave, list(contagens), soma)
+                            for chave, (contagens, soma) in self._series.items())
+        for chave, contagens, soma in series:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += n
+                le = f'le="{_formatar_valor(limite)}"'
+                linhas.append(f"{self.nome}_bucket{_formatar_labels(self.labels, chave, le)} {acumulado}")
+            rotulos = _formatar_labels(self.labels, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_formatar_valor(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+
+class Registry:
+    """Conjunto de métricas expostas juntas."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            if metrica.nome in self._metricas:
+                raise ValueError(f"Métrica já registrada: {metrica.nome}")
+            self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def expor(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.expor())
+        return "\n".join(linhas) + "\n"
+
+
+REGISTRY = Registry()
+
+ETAPAS = REGISTRY.registrar(Histogram(
+    "inferencia_etapa_segundos",
+    "Duração de cada etapa do caminho de inferência (uma observação por chamada, que pode ser um lote).",
+    labels=("etapa",),
+))
+REQUISICOES = REGISTRY.registrar(Counter(
+    "api_requisicoes_total", "Requisições atendidas, por rota e status HTTP.", labels=("rota", "status"),
+))
+DURACAO_REQUISICOES = REGISTRY.registrar(Histogram(
+    "api_requisicao_segundos", "Duração total das requisições, por rota.", labels=("rota",),
+))
+ERROS_INFERENCIA = REGISTRY.registrar(Counter(
+    "inferencia_erros_total", "Predições que retornaram o resultado de fallback.", labels=("motivo",),
+))
+CAMINHO_FEATURES = REGISTRY.registrar(Counter(
+    "features_extracoes_total",
+    "Imagens com features extraídas, por onde rodou a extração e implementação do HOG.",
+    labels=("execucao", "hog"),
+))
+MODELO_INFO = REGISTRY.registrar(Gauge(
+    "modelo_info", "Modelo e layout de features em uso (valor sempre 1).",
+    labels=("versao", "img_size", "metodo", "origem_layout"),
+))
+
+
+@contextmanager
+def medir(etapa: str):
+    """Registra a duração do bloco em `inferencia_etapa_segundos{etapa=...}`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        ETAPAS.observe(time.perf_counter() - inicio, etapa=etapa)
+
+
+def expor() -> str:
+    """Texto de todas as métricas do processo, no formato do Prometheus."""
+    return REGISTRY.expor()
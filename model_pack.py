@@ -0,0 +1,126 @@
+"""
+Pacote de modelo para servir: artefatos em `.npy` mapeáveis em memória.
+
+O `joblib.load` de cada worker cria uma cópia privada do forest, do scaler e
+do label encoder. O pacote (`modelos_salvos/pacote/`) guarda os mesmos dados
+como arrays `.npy` não comprimidos, abertos com `mmap_mode="r"`: N workers
+lendo o mesmo pacote compartilham uma única cópia física no page cache.
+Gere o pacote com `python exportar_modelo.py`.
+
+Quando o modelo tem um redutor de dimensionalidade (`reducer.joblib`), o
+pacote guarda scaler e redutor já combinados (`redutor_*.npy`), e
+`load_pack` devolve essa projeção no lugar do scaler.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from forest import CompiledForest
+from reducao import ProjecaoLinear
+
+PACK_DIRNAME = "pacote"
+
+
+class PackedScaler:
+    """Equivalente ao `StandardScaler.transform` a partir de `mean_` e `scale_`."""
+
+    def __init__(self, mean: Optional[np.ndarray], scale: Optional[np.ndarray], n_features_in: int):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = n_features_in
+
+    @classmethod
+    def from_sklearn(cls, scaler) -> "PackedScaler":
+        return cls(
+            getattr(scaler, "mean_", None) if scaler.with_mean else None,
+            getattr(scaler, "scale_", None) if scaler.with_std else None,
+            int(scaler.n_features_in_),
+        )
+
+    @classmethod
+    def identidade(cls, n_features_in: int) -> "PackedScaler":
+        """Scaler que não altera as features (forest com o scaler incorporado)."""
+        return cls(None, None, n_features_in)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        if self.mean_ is None and self.scale_ is None:
+            return np.asarray(X)
+        X = np.array(X, dtype=np.float64)
+        if self.mean_ is not None:
+            X -= self.mean_
+        if self.scale_ is not None:
+            X /= self.scale_
+        return X
+
+
+class PackedLabelEncoder:
+    """Equivalente ao `LabelEncoder.inverse_transform` a partir de `classes_`."""
+
+    def __init__(self, classes: np.ndarray):
+        self.classes_ = classes
+
+    def inverse_transform(self, y) -> np.ndarray:
+        return self.classes_[np.asarray(y, dtype=np.intp)]
+
+
+def save_pack(pack_dir: Path, rf_model, scaler, label_encoder,
+              forest: Optional[CompiledForest] = None, redutor=None) -> CompiledForest:
+    """Compila o forest e grava forest, scaler e label encoder em `pack_dir`.
+
+    Um `forest` já compilado (ex.: a versão compacta ou com o scaler
+    incorporado) pode ser passado no lugar de `rf_model`. Com `redutor`,
+    grava a projeção combinada de scaler e redutor.
+    """
+    pack_dir = Path(pack_dir)
+    pack_dir.mkdir(parents=True, exist_ok=True)
+
+    if forest is None:
+        forest = CompiledForest.from_sklearn(rf_model)
+    if redutor is not None and forest.scaler_incorporado:
+        raise ValueError("O scaler não pode ser incorporado ao forest de um modelo com redutor")
+    forest.save(pack_dir)
+
+    packed = PackedScaler.from_sklearn(scaler)
+    if redutor is not None:
+        ProjecaoLinear.from_sklearn(redutor, scaler).save(pack_dir)
+        # A projeção já inclui o scaler
+        packed = PackedScaler.identidade(packed.n_features_in_)
+    elif forest.scaler_incorporado:
+        # Os thresholds já estão no espaço das features brutas
+        packed = PackedScaler.identidade(packed.n_features_in_)
+    if packed.mean_ is not None:
+        np.save(pack_dir / "scaler_mean.npy", packed.mean_, allow_pickle=False)
+    if packed.scale_ is not None:
+        np.save(pack_dir / "scaler_scale.npy", packed.scale_, allow_pickle=False)
+    np.save(pack_dir / "label_classes.npy", np.asarray(label_encoder.classes_), allow_pickle=False)
+
+    with open(pack_dir / "pacote.json", "w", encoding="utf-8") as f:
+        json.dump({"n_features_in": packed.n_features_in_}, f, indent=2)
+    return forest
+
+
+def load_pack(pack_dir: Path, mmap: bool = True):
+    """Carrega `(forest, scaler, label_encoder)` de um pacote gravado com `save_pack`.
+
+    Se o pacote tiver redutor, o "scaler" retornado é a `ProjecaoLinear`.
+    """
+    pack_dir = Path(pack_dir)
+    modo = "r" if mmap else None
+
+    def _opcional(nome):
+        path = pack_dir / nome
+        return np.load(path, mmap_mode=modo, allow_pickle=False) if path.exists() else None
+
+    with open(pack_dir / "pacote.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    forest = CompiledForest.load(pack_dir, mmap=mmap)
+    scaler = ProjecaoLinear.load(pack_dir, mmap=mmap)
+    if scaler is None:
+        scaler = PackedScaler(_opcional("scaler_mean.npy"), _opcional("scaler_scale.npy"),
+                              meta["n_features_in"])
+    label_encoder = PackedLabelEncoder(np.load(pack_dir / "label_classes.npy", allow_pickle=False))
+    return forest, scaler, label_encoder
@@ -1,73 +1,81 @@
 """
 Script para popular o banco de dados com dados do nutrition.csv.
-Execute uma vez após criar o banco de dados.
+Execute uma vez após criar o banco de dados (ou de novo para atualizar:
+alimentos já existentes são atualizados no lugar).
+
+O CSV é lido em blocos de `TAMANHO_BLOCO` linhas; cada bloco tem as unidades
+removidas de forma vetorizada e é gravado em uma única transação.
 """
 
+import time
+
 import pandas as pd
 from pathlib import Path
 from database import NutritionDB
-import json
 
 BASE_DATA_DIR = Path.cwd()
 NUTRITION_CSV_PATH = BASE_DATA_DIR / "nutrition.csv"
 
+TAMANHO_BLOCO = 2000
+
+# Colunas que não são valores numéricos
+COLUNAS_TEXTO = ("name", "serving_size")
+
+# Número no início da célula; o que vier depois ("g", "mg", "kcal", "µg"...) é a unidade
+_NUMERO = r"^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+
+
+def limpar_unidades(bloco: pd.DataFrame) -> pd.DataFrame:
+    """Converte as colunas numéricas de `bloco` para float, descartando a unidade.
+
+    Células sem número (vazias, "NaN", texto) viram NaN.
+    """
+    numericas = [c for c in bloco.columns if c not in COLUNAS_TEXTO]
+    limpo = bloco.copy()
+    for col in numericas:
+        if pd.api.types.is_numeric_dtype(bloco[col]):
+            limpo[col] = bloco[col].astype(float)
+        else:
+            valores = bloco[col].astype(str).str.extract(_NUMERO, expand=False)
+            limpo[col] = pd.to_numeric(valores, errors="coerce").astype(float)
+    return limpo
+
+
+def alimentos_do_bloco(bloco: pd.DataFrame):
+    """Pares `(nome, dados_nutricionais)` de um bloco já limpo (NaN vira None)."""
+    bloco = bloco[bloco["name"].notna()]
+    nomes = bloco["name"].astype(str).str.strip()
+    bloco = bloco[nomes != ""]
+    nomes = nomes[nomes != ""]
+
+    numericas = [c for c in bloco.columns if c not in COLUNAS_TEXTO]
+    valores = bloco[numericas].astype(object).where(bloco[numericas].notna(), None)
+    return list(zip(nomes, valores.to_dict("records")))
+
+
 def popular_banco():
     """Popula o banco de dados com dados do CSV."""
-    
+
     if not NUTRITION_CSV_PATH.exists():
         print(f"❌ Arquivo {NUTRITION_CSV_PATH} não encontrado!")
         return
-    
-    print("Carregando CSV...")
-    df = pd.read_csv(NUTRITION_CSV_PATH)
-    df.columns = df.columns.str.strip()
-    
-    print(f"Encontradas {len(df)} amostras no CSV")
-    
+
     db = NutritionDB()
-    
+
     print("Populando banco de dados...")
+    inicio = time.perf_counter()
     adicionados = 0
-    erros = 0
-    
-    for idx, row in df.iterrows():
-        try:
-            nome = str(row.get("name", "")).strip()
-            if not nome:
-                continue
-            
-            # Preparar dados nutricionais
-            dados = {}
-            for col in df.columns:
-                if col not in ["name", "serving_size"]:
-                    try:
-                        val = str(row[col])
-                        # Remove unidades
-                        val = val.replace("g", "").replace("mg", "").replace("kcal", "").replace("µg", "").strip()
-                        # Tenta converter
-                        if val and val.replace(".", "").replace("-", "").replace("e", "").replace("E", "").replace("+", "").isdigit():
-                            dados[col] = float(val)
-                        else:
-                            dados[col] = None
-                    except:
-                        dados[col] = None
-            
-            # Adicionar ao banco
-            db.adicionar_alimento(nome, dados)
-            adicionados += 1
-            
-            if (idx + 1) % 100 == 0:
-                print(f"Processados {idx + 1}/{len(df)} alimentos...")
-                
-        except Exception as e:
-            erros += 1
-            if erros <= 5:  # Mostrar apenas os primeiros 5 erros
-                print(f"Erro ao processar linha {idx}: {e}")
-    
-    print(f"\n✅ Concluído!")
+    linhas = 0
+
+    for bloco in pd.read_csv(NUTRITION_CSV_PATH, chunksize=TAMANHO_BLOCO, dtype=str):
+        bloco.columns = bloco.columns.str.strip()
+        linhas += len(bloco)
+        adicionados += db.adicionar_alimentos_em_lote(alimentos_do_bloco(limpar_unidades(bloco)))
+        print(f"Processados {linhas} alimentos...")
+
+    print(f"\n✅ Concluído em {time.perf_counter() - inicio:.1f}s!")
     print(f"   Alimentos adicionados: {adicionados}")
-    print(f"   Erros: {erros}")
+    print(f"   Linhas sem nome: {linhas - adicionados}")
 
 if __name__ == "__main__":
     popular_banco()
-
@@ -0,0 +1,123 @@
+"""
+Redução de dimensionalidade opcional entre o scaler e o forest.
+
+O vetor combinado de 96x96 tem 27.648 valores RGB mais o HOG; com uma
+redução (PCA ou projeção aleatória) o forest é treinado sobre algumas
+centenas de componentes. O redutor treinado é salvo como `reducer.joblib` ao
+lado do `scaler.joblib`, e na API scaler e redutor viram uma única projeção
+afim (`ProjecaoLinear`): uma multiplicação de matriz por lote, sem o
+`scaler.transform` separado.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import joblib
+import numpy as np
+
+from forest import _parametros_scaler
+
+REDUTOR_FILENAME = "reducer.joblib"
+
+# Métodos aceitos por `criar_redutor`
+METODOS_REDUCAO = ("pca", "projecao")
+
+
+def criar_redutor(metodo: str, n_componentes, seed: int = 42):
+    """Redutor do sklearn ainda não treinado.
+
+    `"pca"` usa o PCA randomizado (rápido para dezenas de milhares de
+    features); `n_componentes` entre 0 e 1 é a fração da variância mantida.
+    `"projecao"` usa uma projeção aleatória esparsa, sem treino.
+    """
+    if metodo == "pca":
+        from sklearn.decomposition import PCA
+        if isinstance(n_componentes, float) and 0 < n_componentes < 1:
+            return PCA(n_components=n_componentes, svd_solver="full", random_state=seed)
+        return PCA(n_components=int(n_componentes), svd_solver="randomized", random_state=seed)
+    if metodo == "projecao":
+        from sklearn.random_projection import SparseRandomProjection
+        return SparseRandomProjection(n_components=int(n_componentes), random_state=seed)
+    raise ValueError(f"Método de redução desconhecido: {metodo} (use {', '.join(METODOS_REDUCAO)})")
+
+
+def salvar_redutor(redutor, model_dir: Path) -> Path:
+    path = Path(model_dir) / REDUTOR_FILENAME
+    joblib.dump(redutor, path)
+    return path
+
+
+def carregar_redutor(model_dir: Path):
+    """Lê o `reducer.joblib`, se existir."""
+    path = Path(model_dir) / REDUTOR_FILENAME
+    return joblib.load(path) if path.exists() else None
+
+
+def _parametros_redutor(redutor):
+    """`(componentes (k, n), media (n,) ou None, divisor (k,) ou None)` de `X -> (X - media) @ C.T / divisor`."""
+    componentes = redutor.components_
+    if hasattr(componentes, "toarray"):
+        componentes = componentes.toarray()
+    componentes = np.asarray(componentes, dtype=np.float64)
+    if hasattr(redutor, "explained_variance_"):
+        media = np.asarray(redutor.mean_, dtype=np.float64)
+        divisor = np.sqrt(redutor.explained_variance_) if redutor.whiten else None
+        return componentes, media, divisor
+    if type(redutor).__name__.endswith("RandomProjection"):
+        return componentes, None, None
+    raise ValueError(f"Redutor não suportado: {type(redutor).__name__}")
+
+
+class ProjecaoLinear:
+    """Scaler e redutor combinados em `X @ pesos.T + vies`.
+
+    Tem a mesma interface usada do scaler (`transform` e `n_features_in_`),
+    então entra no lugar dele no `FeatureExtractor`.
+    """
+
+    def __init__(self, pesos: np.ndarray, vies: np.ndarray):
+        self.pesos = pesos
+        self.vies = vies
+        self.n_features_in_ = int(pesos.shape[1])
+        self.n_components_ = int(pesos.shape[0])
+
+    @classmethod
+    def from_sklearn(cls, redutor, scaler=None) -> "ProjecaoLinear":
+        """Combina o `scaler` (afim por feature, opcional) e o `redutor` treinado."""
+        componentes, media, divisor = _parametros_redutor(redutor)
+        pesos = componentes.copy()
+        vies = np.zeros(componentes.shape[0])
+        if media is not None:
+            vies -= componentes @ media
+        if scaler is not None:
+            # ((x - m) / s) @ C.T = x @ (C / s).T - (m / s) @ C.T
+            mean, scale = _parametros_scaler(scaler)
+            if scale is not None:
+                pesos /= scale
+            if mean is not None:
+                vies -= pesos @ mean
+        if divisor is not None:
+            pesos /= divisor[:, np.newaxis]
+            vies /= divisor
+        return cls(np.ascontiguousarray(pesos), vies)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        return X @ self.pesos.T + self.vies
+
+    def save(self, pack_dir: Path):
+        np.save(Path(pack_dir) / "redutor_pesos.npy", self.pesos, allow_pickle=False)
+        np.save(Path(pack_dir) / "redutor_vies.npy", self.vies, allow_pickle=False)
+
+    @classmethod
+    def load(cls, pack_dir: Path, mmap: bool = True) -> Optional["ProjecaoLinear"]:
+        """Lê a projeção gravada por `save()`, ou `None` se o pacote não tiver redutor."""
+        pack_dir = Path(pack_dir)
+        if not (pack_dir / "redutor_pesos.npy").exists():
+            return None
+        modo = "r" if mmap else None
+        return cls(np.load(pack_dir / "redutor_pesos.npy", mmap_mode=modo, allow_pickle=False),
+                   np.load(pack_dir / "redutor_vies.npy", allow_pickle=False))
+
+    def __repr__(self) -> str:
+        return f"ProjecaoLinear({self.n_features_in_} -> {self.n_components_})"
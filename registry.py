@@ -0,0 +1,301 @@
+"""
+Registro de versões do modelo com recarga sem reiniciar os workers.
+
+Cada versão carregada é um `ModelBundle` imutável (forest, scaler, label
+encoder, extrator de features e mapa nutricional). As requisições pegam o
+bundle atual uma vez e o usam até o fim, então uma troca no meio do caminho
+não mistura artefatos de versões diferentes: as requisições em andamento
+terminam na versão antiga e as novas já usam a nova.
+
+`ModelRegistry` carrega e aquece a nova versão fora do caminho das
+requisições e só então troca a referência. A recarga pode ser disparada
+manualmente (`recarregar()`) ou por uma thread que observa a pasta dos
+modelos a cada `intervalo` segundos.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import joblib
+from PIL import Image
+
+import metrics
+from features import FeatureExtractor, resolve_feature_spec, resolve_feature_spec_com_origem
+from forest import CompiledForest, top_k
+from metrics import medir
+from model_pack import PACK_DIRNAME, PackedScaler, load_pack
+from reducao import ProjecaoLinear, carregar_redutor
+
+
+def model_version(model_dir) -> str:
+    """Identificador da versão dos artefatos (nome, tamanho e data de cada arquivo)."""
+    h = hashlib.sha1()
+    model_dir = Path(model_dir)
+    if not model_dir.exists():
+        return "sem-modelo"
+    for path in sorted(model_dir.rglob("*")):
+        if path.is_file():
+            st = path.stat()
+            h.update(f"{path.relative_to(model_dir)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()[:12]
+
+
+@dataclass(frozen=True, eq=False)
+class ModelBundle:
+    """Uma versão do modelo, pronta para classificar. Nunca é alterada após criada."""
+
+    versao: str
+    feature_extractor: FeatureExtractor
+    rf_model: object = None
+    scaler: object = None
+    label_encoder: object = None
+    compiled_forest: Optional[CompiledForest] = None
+    origem_layout: str = "padrao"
+    nutricao_por_classe: Dict[str, Optional[dict]] = field(default_factory=dict)
+
+    @property
+    def carregado(self) -> bool:
+        return (self.rf_model is not None or self.compiled_forest is not None) \
+            and self.scaler is not None and self.label_encoder is not None
+
+    def classify_matrix(self, X, k=1):
+        """Classifica uma matriz de features já transformadas.
+
+        Faz uma única travessia do forest e retorna `(labels, confiancas)`,
+        ambos `(N, k)` e em ordem decrescente de probabilidade: a primeira
+        coluna é a classe prevista.
+        """
+        with medir("forest"):
+            if self.compiled_forest is not None:
+                preds, confiancas = self.compiled_forest.predict_top_k(X, k)
+            else:
+                idx, confiancas = top_k(self.rf_model.predict_proba(X), k)
+                preds = self.rf_model.classes_.take(idx)
+        with medir("labels"):
+            labels = self.label_encoder.inverse_transform(preds.ravel()).reshape(preds.shape)
+            return labels, confiancas
+
+    def aquecer(self):
+        """Passa uma imagem sintética pelo caminho completo antes de o bundle
+        receber tráfego (páginas do mmap, caches do HOG e do forest)."""
+        tamanho = (self.feature_extractor.spec.img_size,) * 2
+        img = Image.new("RGB", tamanho, (128, 128, 128))
+        X = self.feature_extractor.transform(self.feature_extractor.extract_batch([img]))
+        self.classify_matrix(X)
+
+
+def carregar_bundle(model_dir: Path, forest_compilado: bool = True,
+                    opcoes_extrator: Optional[dict] = None, nutrition_db=None,
+                    incorporar_scaler: bool = False) -> ModelBundle:
+    """Carrega os artefatos de `model_dir` em um novo `ModelBundle`.
+
+    Usa o pacote mapeado em memória (`pacote/`) quando existir; caso
+    contrário, os arquivos joblib. O pacote sempre tem o forest compilado:
+    com `forest_compilado=False`, os joblib são usados no lugar dele (se
+    existirem). Com `incorporar_scaler` (apenas com o forest compilado), o
+    scaler é incorporado aos thresholds e as features vão direto ao forest;
+    no pacote, isso é decidido na exportação. Se houver `reducer.joblib`, scaler e redutor viram
+    uma única `ProjecaoLinear`. Erros de carregamento são propagados.
+    """
+    model_dir = Path(model_dir)
+    opcoes_extrator = dict(opcoes_extrator or {})
+    versao = model_version(model_dir)
+    rf_model = None
+    compiled_forest = None
+
+    print(f"Carregando modelos de: {model_dir} (versão {versao})")
+    usar_pacote = (model_dir / PACK_DIRNAME).exists()
+    if usar_pacote and not forest_compilado:
+        if (model_dir / "rf_food_classifier.joblib").exists():
+            print(f"[INFO] FOREST_COMPILADO=0: ignorando {model_dir / PACK_DIRNAME} e usando os arquivos joblib")
+            usar_pacote = False
+        else:
+            print(f"[WARN] FOREST_COMPILADO=0 ignorado: {model_dir} só tem o pacote, que usa o forest compilado")
+
+    if usar_pacote:
+        # Pacote mapeado em memória: compartilhado entre os workers
+        compiled_forest, scaler, label_encoder = load_pack(model_dir / PACK_DIRNAME)
+        print(f"[OK] Pacote de modelo mapeado de: {model_dir / PACK_DIRNAME}")
+        if incorporar_scaler != compiled_forest.scaler_incorporado:
+            exportado = "com" if compiled_forest.scaler_incorporado else "sem"
+            print(f"[WARN] SCALER_INCORPORADO={int(incorporar_scaler)} ignorado: o pacote foi exportado "
+                  f"{exportado} o scaler incorporado (exportar_modelo.py --incorporar-scaler)")
+        rf_path = model_dir / "rf_food_classifier.joblib"
+        if rf_path.exists() and rf_path.stat().st_mtime > (model_dir / PACK_DIRNAME / "pacote.json").stat().st_mtime:
+            print("[WARN] rf_food_classifier.joblib é mais novo que o pacote - rode exportar_modelo.py")
+    else:
+        rf_model = joblib.load(model_dir / "rf_food_classifier.joblib")
+        scaler = joblib.load(model_dir / "scaler.joblib")
+        label_encoder = joblib.load(model_dir / "label_encoder.joblib")
+        redutor = carregar_redutor(model_dir)
+        if redutor is not None and incorporar_scaler:
+            # O forest recebe componentes, não features: o scaler vai para a projeção
+            print("[WARN] Modelo com redutor: o scaler é incorporado à projeção, não ao forest")
+            incorporar_scaler = False
+        if forest_compilado:
+            compiled_forest = CompiledForest.from_sklearn(
+                rf_model, scaler=scaler if incorporar_scaler else None)
+            # A inferência só usa o forest compilado: não manter duas cópias por worker
+            rf_model = None
+        if redutor is not None:
+            scaler = ProjecaoLinear.from_sklearn(redutor, scaler)
+    print("[OK] Modelos carregados com sucesso")
+
+    # Resolver o layout das features uma única vez
+    spec, origem_layout = resolve_feature_spec_com_origem(scaler, model_dir)
+    if isinstance(scaler, ProjecaoLinear):
+        print(f"[OK] Redução de dimensionalidade: {scaler}")
+    if compiled_forest is not None and compiled_forest.scaler_incorporado:
+        scaler = PackedScaler.identidade(int(scaler.n_features_in_))
+        print("[OK] Scaler incorporado ao forest (features brutas direto na inferência)")
+    feature_extractor = FeatureExtractor(spec, scaler, **opcoes_extrator)
+    print(f"[OK] Layout de features: {feature_extractor} (origem: {origem_layout})")
+    if compiled_forest is not None:
+        print(f"[OK] Forest compilado: {compiled_forest.n_estimators} árvores, "
+              f"{compiled_forest.n_nodes} nós, {compiled_forest.nbytes / 1e6:.1f} MB")
+
+    classes = [str(c) for c in getattr(label_encoder, "classes_", [])]
+    print(f"[OK] Label encoder com {len(classes)} classes")
+    print(f"[INFO] Classes disponiveis: {classes}")
+
+    # Dados nutricionais de cada classe, resolvidos uma vez (sem consulta por requisição)
+    nutricao_por_classe = {}
+    if nutrition_db is not None and classes:
+        try:
+            nutricao_por_classe = nutrition_db.mapear_alimentos(classes)
+            encontrados = sum(1 for v in nutricao_por_classe.values() if v is not None)
+            print(f"[OK] Dados nutricionais para {encontrados}/{len(nutricao_por_classe)} classes")
+        except Exception as e:
+            print(f"[ERRO] Erro ao mapear dados nutricionais: {e}")
+            traceback.print_exc()
+
+    return ModelBundle(
+        versao=versao,
+        feature_extractor=feature_extractor,
+        rf_model=rf_model,
+        scaler=scaler,
+        label_encoder=label_encoder,
+        compiled_forest=compiled_forest,
+        origem_layout=origem_layout,
+        nutricao_por_classe=nutricao_por_classe,
+    )
+
+
+def bundle_vazio(model_dir: Path, opcoes_extrator: Optional[dict] = None) -> ModelBundle:
+    """Bundle sem modelo (as predições retornam o fallback)."""
+    spec = resolve_feature_spec(None, model_dir)
+    return ModelBundle(versao="sem-modelo",
+                       feature_extractor=FeatureExtractor(spec, **dict(opcoes_extrator or {})))
+
+
+class ModelRegistry:
+    """Mantém o bundle atual e troca de versão sem interromper as requisições.
+
+    `carregar_fn()` deve retornar um `ModelBundle` novo a partir dos artefatos
+    em `model_dir`. Com `intervalo > 0`, uma thread (criada no primeiro uso de
+    cada processo, pois threads não sobrevivem ao fork) verifica a versão da
+    pasta periodicamente e recarrega quando ela muda e fica estável por duas
+    leituras seguidas (evita carregar arquivos ainda sendo gravados).
+    """
+
+    def __init__(self, model_dir: Path, carregar_fn: Callable[[], ModelBundle],
+                 inicial: ModelBundle, intervalo: float = 0.0,
+                 ao_trocar: Optional[Callable[[ModelBundle, ModelBundle], None]] = None):
+        self.model_dir = Path(model_dir)
+        self.carregar_fn = carregar_fn
+        self.intervalo = intervalo
+        self.ao_trocar = ao_trocar
+        self._atual = inicial
+        self._lock_recarga = threading.Lock()
+        self._lock_thread = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._versao_falha = None
+        self.recargas = 0
+        self.falhas = 0
+
+    def atual(self) -> ModelBundle:
+        """Bundle em uso. Pegue uma vez por requisição e use até o fim."""
+        if self.intervalo > 0:
+            self._garantir_thread()
+        return self._atual
+
+    def recarregar(self, forcar: bool = False) -> dict:
+        """Carrega, aquece e publica a versão atual da pasta dos modelos.
+
+        Sem `forcar`, não faz nada se a versão em disco for a mesma em uso (ou
+        a mesma que já falhou). Se o carregamento ou o aquecimento falhar, a
+        versão antiga continua ativa. Retorna um resumo com as versões anterior e atual.
+        """
+        with self._lock_recarga:
+            anterior = self._atual
+            versao_disco = model_version(self.model_dir)
+            if not forcar and versao_disco in (anterior.versao, self._versao_falha):
+                return {"trocado": False, "versao": anterior.versao}
+
+            inicio = time.perf_counter()
+            try:
+                novo = self.carregar_fn()
+                if not novo.carregado:
+                    raise RuntimeError("artefatos incompletos")
+                novo.aquecer()
+            except Exception as e:
+                self.falhas += 1
+                self._versao_falha = versao_disco
+                print(f"[ERRO] Recarga do modelo falhou, mantendo a versão {anterior.versao}: {e}")
+                traceback.print_exc()
+                return {"trocado": False, "versao": anterior.versao, "erro": str(e)}
+
+            # Troca atômica: uma única atribuição de referência
+            self._atual = novo
+            self.recargas += 1
+            if self.ao_trocar is not None:
+                self.ao_trocar(anterior, novo)
+            segundos = time.perf_counter() - inicio
+            print(f"[OK] Modelo trocado: {anterior.versao} -> {novo.versao} ({segundos:.1f}s)")
+            return {"trocado": True, "anterior": anterior.versao, "versao": novo.versao,
+                    "segundos": segundos}
+
+    def stats(self) -> dict:
+        return {
+            "versao": self._atual.versao,
+            "carregado": self._atual.carregado,
+            "recargas": self.recargas,
+            "falhas": self.falhas,
+            "intervalo": self.intervalo,
+        }
+
+    def _garantir_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock_thread:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._observar, name="model-watcher", daemon=True)
+                self._thread.start()
+
+    def _observar(self):
+        vista = None
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                versao = model_version(self.model_dir)
+            except OSError:
+                continue
+            if versao != self._atual.versao and versao == vista:
+                self.recarregar()
+            vista = versao
+
+
+def exportar_metricas(anterior: Optional[ModelBundle], novo: ModelBundle):
+    """Atualiza a métrica `modelo_info` para o bundle publicado."""
+    metrics.MODELO_INFO.clear()
+    spec = novo.feature_extractor.spec
+    metrics.MODELO_INFO.set(1, versao=novo.versao, img_size=spec.img_size,
+                            metodo=spec.metodo, origem_layout=novo.origem_layout)
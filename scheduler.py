@@ -0,0 +1,90 @@
+"""
+Agrupamento de requisições concorrentes em micro-lotes de inferência.
+"""
+
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class MicroBatcher:
+    """Junta itens enviados por várias threads e processa em lote.
+
+    Cada chamada a `submit()` coloca o item numa fila e devolve um `Future`.
+    Uma thread dedicada pega o primeiro item disponível e continua coletando
+    até atingir `max_batch` itens ou até passar `janela_ms` milissegundos;
+    então chama `process_fn(itens)` uma única vez e entrega a cada chamador o
+    seu resultado (a função deve retornar uma lista na mesma ordem).
+    """
+
+    def __init__(self, process_fn: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 32, janela_ms: float = 5.0):
+        self.process_fn = process_fn
+        self.max_batch = max_batch
+        self.janela = janela_ms / 1000.0
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.lotes = 0
+        self.itens = 0
+
+    def _garantir_thread(self):
+        # Criada no primeiro uso de cada processo (threads não sobrevivem ao fork)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Processo novo (fork): a fila herdada não tem consumidor
+                self._pid = os.getpid()
+                self._fila = queue.Queue()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Agenda `item` para o próximo lote e retorna o `Future` do seu resultado."""
+        self._garantir_thread()
+        future = Future()
+        self._fila.put((item, future))
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "lotes": self.lotes,
+            "itens": self.itens,
+            "media_por_lote": self.itens / self.lotes if self.lotes else 0.0,
+        }
+
+    def _coletar(self):
+        lote = [self._fila.get()]
+        prazo = time.monotonic() + self.janela
+        while len(lote) < self.max_batch:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        while True:
+            lote = self._coletar()
+            itens = [item for item, _ in lote]
+            try:
+                resultados = self.process_fn(itens)
+            except Exception as e:
+                traceback.print_exc()
+                for _, future in lote:
+                    future.set_exception(e)
+                continue
+
+            self.lotes += 1
+            self.itens += len(lote)
+            for (_, future), resultado in zip(lote, resultados):
+                future.set_result(resultado)
@@ -0,0 +1,387 @@
+"""
+Persistência dos uploads fora do caminho de latência das requisições.
+
+`BackgroundWriter` grava os arquivos numa thread separada e `UploadStore`
+organiza os uploads por conteúdo: cada imagem é gravada uma única vez, em
+`<raiz>/<ab>/<cd>/<sha256>.<ext>`, com uma miniatura ao lado, e as mais
+antigas são removidas quando a pasta passa do tamanho ou da idade máxima.
+"""
+
+import atexit
+import hashlib
+import io
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+from PIL import Image
+
+
+class BackgroundWriter:
+    """Grava arquivos em disco numa thread separada.
+
+    As requisições entregam os bytes já lidos com `submit()` e seguem direto
+    para a predição; a gravação acontece depois, na thread de escrita.
+    Enquanto um arquivo não foi gravado, seus bytes ficam disponíveis em
+    `pending()` para que ele possa ser servido normalmente. `data` também
+    pode ser uma função que gera os bytes (ex.: uma miniatura), chamada na
+    thread de escrita. `agendar()` roda outras tarefas de disco na mesma thread.
+    """
+
+    def __init__(self, max_pendentes: int = 256):
+        self._fila = queue.Queue(maxsize=max_pendentes)
+        self._pendentes: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def _garantir_thread(self):
+        # A thread é criada no primeiro uso de cada processo: threads não
+        # sobrevivem ao fork dos workers (ex.: Gunicorn com preload_app)
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="upload-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, path: Path, data: Union[bytes, Callable[[], Optional[bytes]]]):
+        """Agenda a gravação de `data` (bytes ou função que os gera) em `path`.
+
+        Se a função retornar `None`, nada é gravado.
+        """
+        chave = str(path)
+        with self._lock:
+            self._garantir_thread()
+            self._pendentes[chave] = data
+        # Bloqueia apenas se a fila estiver cheia (disco muito mais lento que as requisições)
+        self._fila.put((chave, data))
+
+    def agendar(self, tarefa: Callable[[], None]):
+        """Roda `tarefa` na thread de escrita, na ordem das gravações."""
+        with self._lock:
+            self._garantir_thread()
+        self._fila.put((None, tarefa))
+
+    def pending(self, path: Path) -> Optional[bytes]:
+        """Retorna os bytes de um arquivo ainda não gravado, se houver."""
+        with self._lock:
+            data = self._pendentes.get(str(path))
+        return data() if callable(data) else data
+
+    def flush(self):
+        """Aguarda até que todas as gravações agendadas terminem."""
+        self._fila.join()
+
+    def close(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self.flush()
+            self._fila.put(None)
+            self._thread.join(timeout=5)
+
+    def _loop(self):
+        while True:
+            item = self._fila.get()
+            try:
+                if item is None:
+                    return
+                chave, data = item
+                if chave is None:
+                    self._executar(data)
+                    continue
+                try:
+                    conteudo = data() if callable(data) else data
+                    if conteudo is None:
+                        continue
+                    path = Path(chave)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    # Nome temporário por processo: outro worker pode gravar o mesmo arquivo
+                    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                    tmp.write_bytes(conteudo)
+                    tmp.replace(path)
+                except Exception as e:
+                    print(f"[ERRO] Falha ao gravar {chave}: {e}")
+                    traceback.print_exc()
+                finally:
+                    with self._lock:
+                        if self._pendentes.get(chave) is data:
+                            del self._pendentes[chave]
+            finally:
+                self._fila.task_done()
+
+    @staticmethod
+    def _executar(tarefa):
+        try:
+            tarefa()
+        except Exception as e:
+            print(f"[ERRO] Falha na tarefa em segundo plano: {e}")
+            traceback.print_exc()
+
+
+# Nome de um arquivo do UploadStore: hash, ".thumb" nas miniaturas e extensão
+_NOME_ARMAZENADO = re.compile(r"^([0-9a-f]{64})(\.thumb)?\.([a-z0-9]{1,5})$")
+
+# Uploads e miniaturas nunca mudam de conteúdo para o mesmo nome
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+
+
+def extensao_do_conteudo(data: bytes, nome_original: str = "") -> str:
+    """Extensão canônica pela assinatura do arquivo (ou, na falta dela, pelo nome)."""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    ext = nome_original.rsplit(".", 1)[-1].lower() if "." in nome_original else "bin"
+    return "jpg" if ext == "jpeg" else ext
+
+
+def gerar_miniatura(data: bytes, tamanho=(160, 160)) -> Optional[bytes]:
+    """JPEG de no máximo `tamanho` pixels, mantendo a proporção (`None` se não decodificar)."""
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format == "JPEG":
+            img.draft("RGB", (tamanho[0] * 2, tamanho[1] * 2))
+        img = img.convert("RGB")
+    except Exception as e:
+        print(f"[WARN] Miniatura não gerada: {e}")
+        return None
+    img.thumbnail(tamanho)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=80)
+    return buf.getvalue()
+
+
+def etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+    """Se o cabeçalho `If-None-Match` inclui `etag` (ou `*`)."""
+    if not if_none_match:
+        return False
+    for valor in if_none_match.split(","):
+        valor = valor.strip()
+        if valor.startswith("W/"):
+            valor = valor[2:]
+        if valor == "*" or valor.strip('"') == etag:
+            return True
+    return False
+
+
+# Uploads usados há menos que isto (s) nunca são removidos pela limpeza: a
+# requisição que acabou de guardá-los (ou de achar a duplicata) ainda pode lê-los
+CARENCIA_LIMPEZA = 60.0
+
+
+class UploadStore:
+    """Uploads endereçados pelo conteúdo, com miniaturas e limpeza por tamanho e idade.
+
+    O nome público de um upload é `<sha256>.<ext>`, e o da miniatura,
+    `<sha256>.thumb.jpg`; no disco, ficam em `<raiz>/<ab>/<cd>/`, onde `abcd`
+    são os primeiros caracteres do hash (nenhuma pasta acumula milhões de
+    arquivos). Um conteúdo repetido não é gravado de novo: apenas tem a data
+    de uso renovada, que é o critério da limpeza. As gravações, as miniaturas
+    e a limpeza rodam na thread do `writer`.
+
+    Tamanho e último uso de cada upload ficam num índice em memória, em ordem
+    de uso: aplicar `max_bytes` e `max_idade` (segundos; 0 = sem limite)
+    custa O(removidos), sem percorrer a pasta. O índice é montado a partir do
+    disco na criação e refeito a cada `reindexar_a_cada` segundos (uploads
+    de outros processos só entram na conta nessa hora). Uploads usados nos
+    últimos `CARENCIA_LIMPEZA` segundos não são removidos, mesmo que a pasta
+    passe do limite por um momento.
+    """
+
+    def __init__(self, raiz: Path, writer: BackgroundWriter, max_bytes: int = 0,
+                 max_idade: float = 0.0, miniatura=(160, 160), reindexar_a_cada: float = 3600.0):
+        self.raiz = Path(raiz)
+        self.writer = writer
+        self.max_bytes = max_bytes
+        self.max_idade = max_idade
+        self.miniatura = tuple(miniatura)
+        self.reindexar_a_cada = reindexar_a_cada
+        # hash -> [último uso, bytes, nomes públicos], do menos para o mais recente
+        self._indice: "OrderedDict[str, list]" = OrderedDict()
+        self._total = 0
+        self._reindexado_em = time.monotonic()
+        self._limpeza_agendada = False
+        self._lock = threading.Lock()
+        self.writer.agendar(self.reindexar)
+
+    @staticmethod
+    def nome_miniatura(nome: str) -> str:
+        return nome.split(".", 1)[0] + ".thumb.jpg"
+
+    def caminho(self, nome: str) -> Optional[Path]:
+        """Caminho no disco de um nome público, ou `None` se o nome não for do armazenamento."""
+        if not _NOME_ARMAZENADO.match(nome):
+            return None
+        return self.raiz / nome[:2] / nome[2:4] / nome
+
+    @staticmethod
+    def etag(nome: str) -> Optional[str]:
+        """ETag forte de um nome público: o próprio hash (mais ".thumb" nas miniaturas)."""
+        m = _NOME_ARMAZENADO.match(nome)
+        if m is None:
+            return None
+        return m.group(1) + (m.group(2) or "")
+
+    def pendente(self, nome: str) -> Optional[bytes]:
+        path = self.caminho(nome)
+        return self.writer.pending(path) if path is not None else None
+
+    def guardar(self, data: bytes, nome_original: str = "", sincrono: bool = False) -> str:
+        """Guarda um upload (se ainda não existir) e retorna seu nome público.
+
+        Com `sincrono`, o original está no disco ao retornar (a predição lê
+        do disco): uma duplicata é marcada como usada sob o mesmo lock da
+        limpeza, que não remove uploads recém-usados. A duplicata é conferida
+        no disco, não só no índice, que pode não ver a limpeza de outro
+        processo. A miniatura sempre é gerada em segundo plano.
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        nome = f"{sha}.{extensao_do_conteudo(data, nome_original)}"
+        nome_miniatura = self.nome_miniatura(nome)
+        path = self.caminho(nome)
+        miniatura = self.caminho(nome_miniatura)
+
+        with self._lock:
+            existe = self.writer.pending(path) is not None or path.exists()
+            if not existe and sha in self._indice:
+                # Removido por outro processo: a entrada é velha e o upload é gravado de novo
+                self._total -= self._indice.pop(sha)[1]
+            if existe:
+                # Duplicata: renova a data (no disco, para a próxima reindexação)
+                tamanho = 0
+                if sha not in self._indice:
+                    # Gravado por outro processo depois da última reindexação
+                    tamanho = sum(p.stat().st_size for p in (path, miniatura) if p.exists())
+                if sincrono:
+                    self._tocar(path, miniatura)
+                self._registrar(sha, [nome, nome_miniatura], tamanho)
+
+        if existe:
+            if not sincrono:
+                self.writer.agendar(lambda: self._tocar(path, miniatura))
+        else:
+            if sincrono:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+                tmp.write_bytes(data)
+                tmp.replace(path)
+            else:
+                self.writer.submit(path, data)
+            # Registrado só agora: a limpeza não conhece (e não remove) o arquivo antes disso
+            with self._lock:
+                self._registrar(sha, [nome, nome_miniatura], len(data))
+            self.writer.submit(miniatura, lambda: self._gerar_miniatura(sha, data))
+        self._agendar_manutencao()
+        return nome
+
+    def _registrar(self, sha: str, nomes, tamanho: int, quando: Optional[float] = None):
+        """Marca `sha` como usado agora (chamar com `_lock`), somando `tamanho` bytes."""
+        entrada = self._indice.get(sha)
+        if entrada is None:
+            entrada = self._indice[sha] = [0.0, 0, []]
+        entrada[0] = max(entrada[0], quando if quando is not None else time.time())
+        entrada[1] += tamanho
+        entrada[2].extend(n for n in nomes if n not in entrada[2])
+        self._total += tamanho
+        self._indice.move_to_end(sha)
+
+    def _gerar_miniatura(self, sha: str, data: bytes) -> Optional[bytes]:
+        conteudo = gerar_miniatura(data, self.miniatura)
+        if conteudo is not None:
+            with self._lock:
+                entrada = self._indice.get(sha)
+                if entrada is not None:
+                    entrada[1] += len(conteudo)
+                    self._total += len(conteudo)
+        return conteudo
+
+    def _agendar_manutencao(self):
+        """Agenda a limpeza se algum limite foi passado, e a reindexação periódica."""
+        agora = time.time()
+        with self._lock:
+            reindexar = time.monotonic() - self._reindexado_em > self.reindexar_a_cada
+            if reindexar:
+                self._reindexado_em = time.monotonic()
+            velho = (self.max_idade > 0 and self._indice
+                     and agora - next(iter(self._indice.values()))[0] > self.max_idade)
+            excesso = self.max_bytes > 0 and self._total > self.max_bytes
+            limpar = (velho or excesso) and not self._limpeza_agendada
+            if limpar:
+                self._limpeza_agendada = True
+        if reindexar:
+            self.writer.agendar(self.reindexar)
+        if limpar:
+            self.writer.agendar(self.limpar)
+
+    @staticmethod
+    def _tocar(*paths):
+        for path in paths:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+    def reindexar(self):
+        """Refaz o índice a partir do disco (e remove gravações `.tmp` interrompidas).
+
+        Uploads usados no último minuto que não estão no disco (gravação
+        ainda na fila) são mantidos.
+        """
+        agora = time.time()
+        encontrados: Dict[str, list] = {}
+        for pasta, _, arquivos in os.walk(self.raiz):
+            for arquivo in arquivos:
+                path = Path(pasta) / arquivo
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                if arquivo.endswith(".tmp"):
+                    # Gravação interrompida
+                    if agora - st.st_mtime > 3600:
+                        path.unlink(missing_ok=True)
+                    continue
+                if _NOME_ARMAZENADO.match(arquivo):
+                    entrada = encontrados.setdefault(arquivo[:64], [0.0, 0, []])
+                    entrada[0] = max(entrada[0], st.st_mtime)
+                    entrada[1] += st.st_size
+                    entrada[2].append(arquivo)
+
+        indice = OrderedDict(sorted(encontrados.items(), key=lambda item: item[1][0]))
+        with self._lock:
+            for sha, entrada in self._indice.items():
+                if entrada[0] >= agora - 60 and sha not in indice:
+                    indice[sha] = entrada
+            self._indice = indice
+            self._total = sum(e[1] for e in indice.values())
+
+    def limpar(self) -> dict:
+        """Remove os uploads (original e miniatura juntos) além da idade ou do
+        tamanho máximo, dos usados há mais tempo para os mais recentes."""
+        agora = time.time()
+        removidos = liberados = 0
+        with self._lock:
+            self._limpeza_agendada = False
+            while self._indice:
+                sha, (ultimo_uso, tamanho, nomes) = next(iter(self._indice.items()))
+                if agora - ultimo_uso < CARENCIA_LIMPEZA:
+                    break
+                velho = self.max_idade > 0 and agora - ultimo_uso > self.max_idade
+                excesso = self.max_bytes > 0 and self._total > self.max_bytes
+                if not (velho or excesso):
+                    break
+                del self._indice[sha]
+                for nome in nomes:
+                    self.caminho(nome).unlink(missing_ok=True)
+                self._total -= tamanho
+                removidos += 1
+                liberados += tamanho
+            total = self._total
+        if removidos:
+            print(f"[INFO] Limpeza de uploads: {removidos} removidos, {liberados / 1e6:.1f} MB liberados")
+        return {"removidos": removidos, "bytes_liberados": liberados, "bytes_restantes": total}
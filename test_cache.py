@@ -0,0 +1,54 @@
+"""
+Cache de predições com nível em disco (cache.py).
+"""
+
+import os
+import time
+
+from cache import PredictionCache
+
+
+def _arquivos(pasta):
+    return list(pasta.rglob("*.json"))
+
+
+def test_varredura_remove_expiradas_e_mais_antigas(tmp_path):
+    cache = PredictionCache(ttl=3600, disk_dir=tmp_path, varrer_a_cada=3600)
+    chaves = [PredictionCache.key(bytes([i]), "v1") for i in range(6)]
+    for chave in chaves:
+        cache.set(chave, [["pizza", 0.9]])
+
+    # A primeira passou da TTL; as demais em ordem de gravação
+    agora = time.time()
+    for i, chave in enumerate(chaves):
+        mtime = agora - 7200 if i == 0 else agora - 100 + i
+        os.utime(cache._disk_path(chave), (mtime, mtime))
+    tamanho = cache._disk_path(chaves[1]).stat().st_size
+
+    cache.disk_max_bytes = 3 * tamanho
+    resultado = cache.varrer_disco()
+    assert resultado == {"removidos": 3, "bytes_restantes": 3 * tamanho}
+    assert sorted(_arquivos(tmp_path)) == sorted(cache._disk_path(c) for c in chaves[3:])
+
+
+class _WriterFalso:
+    def __init__(self):
+        self.tarefas = []
+
+    def agendar(self, tarefa):
+        self.tarefas.append(tarefa)
+
+
+def test_gravacoes_alem_do_limite_agendam_varredura(tmp_path):
+    writer = _WriterFalso()
+    cache = PredictionCache(ttl=None, disk_dir=tmp_path, writer=writer, varrer_a_cada=3600)
+    cache.set(PredictionCache.key(b"a", "v1"), [["sushi", 0.5]])
+    assert writer.tarefas == []
+
+    cache.disk_max_bytes = _arquivos(tmp_path)[0].stat().st_size * 2
+    for i in range(5):
+        cache.set(PredictionCache.key(bytes([i]), "v1"), [["sushi", 0.5]])
+    # Uma única varredura agendada até ela rodar
+    assert len(writer.tarefas) == 1
+    writer.tarefas.pop()()
+    assert len(_arquivos(tmp_path)) == 2
@@ -0,0 +1,164 @@
+"""
+Conexões persistentes e modo do SQLite (database.py).
+"""
+
+import gc
+import threading
+
+import pandas as pd
+import pytest
+
+from database import MAX_OCIOSAS, NutritionDB
+from popular_banco import alimentos_do_bloco, limpar_unidades
+
+DADOS = {"calories": 0, "protein": 11, "carbohydrate": 33, "fat": 10}
+
+
+def test_conexao_por_thread_e_pragmas(tmp_path):
+    db = NutritionDB(tmp_path / "n.db")
+    conn = db.get_connection()
+    assert db.get_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    outra = []
+    t = threading.Thread(target=lambda: outra.append(db.get_connection()))
+    t.start()
+    t.join()
+    assert outra[0] is not conn
+    db.close()
+
+
+def test_atualizar_alimento_mantem_id(tmp_path):
+    db = NutritionDB(tmp_path / "n.db")
+    alimento_id = db.adicionar_alimento("pizza", dict(DADOS, calories=266))
+    refeicao_id = db.criar_refeicao(nome="almoço")
+    db.adicionar_item_refeicao(refeicao_id, alimento_id, 2.0)
+
+    assert db.adicionar_alimento("pizza", dict(DADOS, calories=280)) == alimento_id
+    refeicao = db.obter_refeicao(refeicao_id)
+    assert refeicao["totais"]["calorias"] == 560
+    db.close()
+
+
+def test_carga_em_lote_com_unidades(tmp_path):
+    bloco = pd.DataFrame({
+        "name": ["Pizza", " ", "Arroz", "Pizza"],
+        "serving_size": ["100 g"] * 4,
+        "calories": ["266", "1", "130", "280"],
+        "protein": ["11.4 g", "1 g", "2.7g", "12 g"],
+        "sodium": ["598.00 mg", "1 mg", "NaN", "1e2 mg"],
+    })
+    alimentos = alimentos_do_bloco(limpar_unidades(bloco))
+    assert [nome for nome, _ in alimentos] == ["Pizza", "Arroz", "Pizza"]
+    assert alimentos[1][1] == {"calories": 130.0, "protein": 2.7, "sodium": None}
+
+    db = NutritionDB(tmp_path / "n.db")
+    pizza_id = db.adicionar_alimento("Pizza", DADOS)
+    assert db.adicionar_alimentos_em_lote(alimentos) == 3
+    pizza = db.buscar_alimento("Pizza")
+    assert pizza["id"] == pizza_id and pizza["calorias"] == 280 and pizza["sodio"] == 100
+    assert len(db.listar_alimentos()) == 2
+    db.close()
+
+
+def test_busca_prefere_exato_e_prefixo(tmp_path):
+    db = NutritionDB(tmp_path / "n.db")
+    db.adicionar_alimentos_em_lote([(nome, DADOS) for nome in [
+        "Potatoes, french fried, frozen", "Sweet french fries", "French fries, restaurant",
+        "French fries", "Hot dog, beef", "Pizza, cheese",
+    ]])
+    assert db.buscar_alimento("french_fries")["nome"] == "French fries"
+    assert db.buscar_alimento("FRENCH-FRIES, rest")["nome"] == "French fries, restaurant"
+    assert db.buscar_alimento("fried french")["nome"] == "Potatoes, french fried, frozen"
+    assert db.buscar_alimento("hot_dog")["nome"] == "Hot dog, beef"
+    assert db.buscar_alimento("pi")["nome"] == "Pizza, cheese"
+    assert db.buscar_alimento("sushi") is None
+    assert db.busca.cache.stats()["itens"] == 6
+
+    # Escritas invalidam o cache e o índice acompanha a tabela
+    db.adicionar_alimento("Sushi", DADOS)
+    assert db.busca.cache.stats()["itens"] == 0
+    assert db.buscar_alimento("sushi")["nome"] == "Sushi"
+    db.close()
+
+
+def test_totais_materializados(tmp_path):
+    db = NutritionDB(tmp_path / "n.db")
+    pizza = db.adicionar_alimento("Pizza", {"calories": 266, "protein": 11})
+    arroz = db.adicionar_alimento("Arroz", {"calories": 130, "protein": None})
+    refeicao_id = db.criar_refeicao(nome="almoço")
+    db.adicionar_item_refeicao(refeicao_id, pizza, 2.0)
+    db.adicionar_item_refeicao(refeicao_id, arroz)
+    db.adicionar_item_refeicao(refeicao_id, pizza, 1.0)  # INSERT OR REPLACE do mesmo item
+
+    refeicao = db.obter_refeicao(refeicao_id)
+    assert refeicao["totais"] == {"calorias": 396, "proteinas": 11, "carboidratos": 0, "gorduras": 0}
+    assert refeicao["num_itens"] == 2 and len(refeicao["itens"]) == 2
+
+    # Mudança nos nutrientes de um alimento e remoção de item
+    db.adicionar_alimento("Arroz", {"calories": 100})
+    conn = db.get_connection()
+    with conn:
+        conn.execute("DELETE FROM refeicao_itens WHERE alimento_id = ?", (pizza,))
+    [listada] = db.listar_refeicoes()
+    assert listada["total_calorias"] == 100 and listada["num_itens"] == 1
+    db.close()
+
+
+def test_paginacao_por_cursor(tmp_path):
+    db = NutritionDB(tmp_path / "n.db")
+    # Várias refeições no mesmo segundo: o id desempata a ordem
+    ids = [db.criar_refeicao(nome=f"r{i}") for i in range(7)]
+
+    vistos, cursor = [], None
+    while True:
+        pagina = db.pagina_refeicoes(3, cursor)
+        assert pagina["total"] == 7
+        vistos += [r["id"] for r in pagina["refeicoes"]]
+        cursor = pagina["proximo"]
+        if cursor is None:
+            break
+    assert vistos == ids[::-1]
+    assert [r["id"] for r in db.listar_refeicoes(2)] == ids[:-3:-1]
+
+    conn = db.get_connection()
+    with conn:
+        conn.execute("DELETE FROM refeicoes WHERE id = ?", (ids[0],))
+    assert db.pagina_refeicoes(50)["total"] == 6
+    with pytest.raises(ValueError):
+        db.pagina_refeicoes(3, "nao-e-um-cursor")
+    db.close()
+
+
+def test_conexoes_de_threads_encerradas_sao_reaproveitadas(tmp_path):
+    db = NutritionDB(tmp_path / "n.db")
+    db.get_connection()
+    for _ in range(30):
+        threads = [threading.Thread(target=db.pagina_refeicoes, args=(5,)) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    gc.collect()
+    # A conexão desta thread mais as ociosas devolvidas pelas threads encerradas
+    assert db.conexoes_abertas() <= 1 + MAX_OCIOSAS
+    db.close()
+    assert db.conexoes_abertas() == 0
+
+
+def test_recarga_sem_mudanca_nao_recalcula_refeicoes(tmp_path):
+    db = NutritionDB(tmp_path / "n.db")
+    pizza = db.adicionar_alimento("Pizza", DADOS)
+    for _ in range(3):
+        db.adicionar_item_refeicao(db.criar_refeicao(), pizza)
+
+    # total_changes conta também as linhas alteradas pelos triggers
+    conn = db.get_connection()
+    antes = conn.total_changes
+    db.adicionar_alimentos_em_lote([("Pizza", DADOS)])
+    assert conn.total_changes - antes == 1
+    db.adicionar_alimentos_em_lote([("Pizza", dict(DADOS, calories=300))])
+    assert conn.total_changes - antes == 1 + 1 + 3
+    assert db.listar_refeicoes()[0]["total_calorias"] == 300
+    db.close()
@@ -0,0 +1,63 @@
+"""
+Pool de processos de extração de features (feature_pool.py).
+"""
+
+import io
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from feature_pool import FeaturePool
+from features import FeatureExtractor, FeatureSpec
+
+SPEC = FeatureSpec(img_size=32)
+
+
+def _jpeg(cor):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), cor).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_lotes_concorrentes_sem_deadlock():
+    pool = FeaturePool(SPEC, n_processos=2, n_slots=4)
+    try:
+        lotes = [[_jpeg((i * 60, j * 50, 0)) for j in range(4)] for i in range(2)]
+        resultados = {}
+
+        def enviar(i):
+            for _ in range(5):
+                resultados[i] = pool.extract_batch(lotes[i])
+
+        threads = [threading.Thread(target=enviar, args=(i,), daemon=True) for i in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=60)
+        assert not any(t.is_alive() for t in threads)
+        assert len(pool._livres) == 4
+
+        extrator = FeatureExtractor(SPEC)
+        for i, lote in enumerate(lotes):
+            esperado = extrator.extract_batch([extrator.load(io.BytesIO(d)) for d in lote])
+            np.testing.assert_allclose(resultados[i], esperado, rtol=1e-6, atol=1e-6)
+    finally:
+        pool.close()
+
+
+def test_erro_devolve_slots_so_depois_do_lote():
+    pool = FeaturePool(SPEC, n_processos=2, n_slots=4)
+    try:
+        lote = [b"nao e imagem"] + [_jpeg((0, j * 60, 200)) for j in range(3)]
+        with pytest.raises(Exception):
+            pool.extract_batch(lote)
+        assert len(pool._livres) == 4
+        assert not pool._executor._pending_work_items
+
+        extrator = FeatureExtractor(SPEC)
+        esperado = extrator.extract_batch([extrator.load(io.BytesIO(d)) for d in lote[1:]])
+        np.testing.assert_allclose(pool.extract_batch(lote[1:]), esperado, rtol=1e-6, atol=1e-6)
+    finally:
+        pool.close()
@@ -0,0 +1,162 @@
+"""
+Paridade entre o forest compilado (forest.py) e o RandomForest do sklearn.
+"""
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from forest import CompiledForest
+from model_pack import load_pack, save_pack
+
+
+def _treinar(n_classes=5, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(600, 40))
+    y = rng.randint(0, n_classes, size=600)
+    # Sinal simples para as árvores terem estrutura
+    X[:, 0] += y
+    rf = RandomForestClassifier(
+        n_estimators=25, max_depth=12, min_samples_leaf=2,
+        class_weight="balanced", random_state=seed, n_jobs=1
+    )
+    rf.fit(X, y)
+    return rf, rng
+
+
+def test_predict_proba_igual_ao_sklearn():
+    rf, rng = _treinar()
+    forest = CompiledForest.from_sklearn(rf)
+    X = rng.normal(size=(200, 40))
+
+    np.testing.assert_allclose(forest.predict_proba(X), rf.predict_proba(X), rtol=1e-9, atol=1e-12)
+
+
+def test_predict_with_proba_igual_ao_sklearn():
+    rf, rng = _treinar()
+    forest = CompiledForest.from_sklearn(rf)
+    X = rng.normal(size=(200, 40))
+
+    preds, confiancas = forest.predict_with_proba(X)
+    np.testing.assert_array_equal(preds, rf.predict(X))
+    np.testing.assert_allclose(confiancas, rf.predict_proba(X).max(axis=1), rtol=1e-9)
+
+
+def test_folhas_iguais_ao_sklearn_em_thresholds():
+    # Amostras exatamente sobre os thresholds exercitam o arredondamento float32
+    rf, _ = _treinar(seed=1)
+    forest = CompiledForest.from_sklearn(rf)
+    tree = rf.estimators_[0].tree_
+    internos = tree.children_left != -1
+    X = np.zeros((internos.sum(), 40))
+    X[np.arange(internos.sum()), tree.feature[internos]] = tree.threshold[internos]
+
+    folhas = forest.apply(X) - forest.roots
+    np.testing.assert_array_equal(folhas, rf.apply(X))
+
+
+def test_classes_nao_inteiras():
+    rng = np.random.RandomState(2)
+    X = rng.normal(size=(300, 10))
+    y = np.array(["pizza", "sushi", "waffles"])[rng.randint(0, 3, size=300)]
+    rf = RandomForestClassifier(n_estimators=10, random_state=2).fit(X, y)
+    forest = CompiledForest.from_sklearn(rf)
+
+    X_teste = rng.normal(size=(50, 10))
+    np.testing.assert_array_equal(forest.predict(X_teste), rf.predict(X_teste))
+
+
+def test_pacote_mapeado_igual_ao_sklearn(tmp_path):
+    rf, rng = _treinar(seed=3)
+    X_treino = rng.normal(loc=2.0, scale=3.0, size=(100, 40))
+    scaler = StandardScaler().fit(X_treino)
+    encoder = LabelEncoder().fit(["a", "b", "c", "d", "e"])
+    save_pack(tmp_path, rf, scaler, encoder)
+
+    forest, packed_scaler, packed_encoder = load_pack(tmp_path, mmap=True)
+    # Arrays mapeados somente-leitura, sem cópia privada
+    assert not forest.value.flags.writeable and not forest.value.flags.owndata
+
+    X = rng.normal(loc=2.0, scale=3.0, size=(50, 40))
+    np.testing.assert_allclose(packed_scaler.transform(X), scaler.transform(X))
+    X_scaled = scaler.transform(X)
+    np.testing.assert_allclose(forest.predict_proba(X_scaled), rf.predict_proba(X_scaled), rtol=1e-9)
+    np.testing.assert_array_equal(
+        packed_encoder.inverse_transform(forest.predict(X_scaled)),
+        encoder.inverse_transform(rf.predict(X_scaled)),
+    )
+
+
+def test_predict_top_k_igual_ao_sklearn():
+    rf, rng = _treinar(seed=4)
+    forest = CompiledForest.from_sklearn(rf)
+    X = rng.normal(size=(100, 40))
+
+    classes, probas = forest.predict_top_k(X, 3)
+    proba_sk = rf.predict_proba(X)
+    assert classes.shape == probas.shape == (100, 3)
+    np.testing.assert_array_equal(classes[:, 0], rf.predict(X))
+    np.testing.assert_allclose(probas, -np.sort(-proba_sk, axis=1)[:, :3], rtol=1e-9)
+
+
+def test_forest_compacto_mesmas_decisoes():
+    rf, rng = _treinar(seed=5)
+    forest = CompiledForest.from_sklearn(rf)
+    X = rng.normal(size=(200, 40))
+
+    compacto = forest.compactar(bits_folha=16)
+    assert compacto.nbytes < forest.nbytes
+    assert compacto.left.dtype == np.int16 and compacto.feature.dtype == np.int16
+    np.testing.assert_array_equal(compacto.apply(X), forest.apply(X))
+    # Quantização em 16 bits: erro de no máximo meio passo por folha
+    np.testing.assert_allclose(compacto.predict_proba(X), rf.predict_proba(X), atol=1e-5)
+    np.testing.assert_allclose(forest.compactar(bits_folha=32).predict_proba(X),
+                               rf.predict_proba(X), rtol=1e-6)
+
+
+def test_selecionar_arvores_igual_ao_subconjunto_do_sklearn():
+    rf, rng = _treinar(seed=6)
+    forest = CompiledForest.from_sklearn(rf)
+    X = rng.normal(size=(100, 40))
+    indices = [7, 2, 19]
+
+    esperado = np.mean([rf.estimators_[i].predict_proba(X) for i in indices], axis=0)
+    np.testing.assert_allclose(forest.selecionar_arvores(indices).predict_proba(X), esperado, rtol=1e-9)
+
+
+def test_pacote_compacto(tmp_path):
+    rf, rng = _treinar(seed=7)
+    scaler = StandardScaler().fit(rng.normal(size=(100, 40)))
+    encoder = LabelEncoder().fit(["a", "b", "c", "d", "e"])
+    compacto = CompiledForest.from_sklearn(rf).compactar(bits_folha=8)
+    save_pack(tmp_path, rf, scaler, encoder, forest=compacto)
+
+    forest, _, _ = load_pack(tmp_path, mmap=True)
+    X = rng.normal(size=(50, 40))
+    assert forest.compacto and forest.value.dtype == np.uint8
+    np.testing.assert_array_equal(forest.predict_proba(X), compacto.predict_proba(X))
+
+
+def test_scaler_incorporado_mesmas_decisoes(tmp_path):
+    rng = np.random.RandomState(8)
+    X_bruto = rng.uniform(0, 255, size=(600, 40))
+    y = rng.randint(0, 4, size=600)
+    X_bruto[:, 0] += 40 * y
+    scaler = StandardScaler().fit(X_bruto)
+    rf = RandomForestClassifier(n_estimators=15, max_depth=10, random_state=8, n_jobs=1)
+    rf.fit(scaler.transform(X_bruto), y)
+    encoder = LabelEncoder().fit(["a", "b", "c", "d"])
+
+    incorporado = CompiledForest.from_sklearn(rf, scaler=scaler)
+    X = np.round(rng.uniform(0, 255, size=(300, 40)), 1)
+    assert incorporado.scaler_incorporado
+    np.testing.assert_array_equal(incorporado.predict(X), rf.predict(scaler.transform(X)))
+    np.testing.assert_allclose(incorporado.predict_proba(X), rf.predict_proba(scaler.transform(X)),
+                               rtol=1e-9, atol=1e-12)
+
+    # No pacote, o scaler gravado vira identidade: a API passa as features brutas
+    save_pack(tmp_path, rf, scaler, encoder, forest=incorporado)
+    forest, scaler_pacote, _ = load_pack(tmp_path, mmap=True)
+    assert forest.scaler_incorporado
+    np.testing.assert_array_equal(scaler_pacote.transform(X), X)
+    np.testing.assert_array_equal(forest.predict(scaler_pacote.transform(X)), incorporado.predict(X))
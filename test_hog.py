@@ -0,0 +1,57 @@
+"""
+Paridade entre o HOG vetorizado (fast_hog.py) e skimage.feature.hog.
+"""
+
+import numpy as np
+from PIL import Image
+from skimage import color
+from skimage.feature import hog
+
+from fast_hog import BatchHOG
+from features import FeatureExtractor, FeatureSpec
+
+HOG_KWARGS = dict(orientations=9, pixels_per_cell=(8, 8), cells_per_block=(2, 2))
+
+
+def _imagens(n, shape, seed=0):
+    rng = np.random.RandomState(seed)
+    rgb = (rng.rand(n, shape[0], shape[1], 3) * 255).astype(np.uint8)
+    return color.rgb2gray(rgb.astype(np.float32) / 255.0)
+
+
+def test_lote_igual_ao_skimage_96():
+    imagens = _imagens(16, (96, 96))
+    esperado = np.stack([hog(img, **HOG_KWARGS) for img in imagens])
+
+    obtido = BatchHOG((96, 96), **HOG_KWARGS)(imagens)
+    assert obtido.shape == esperado.shape
+    assert obtido.dtype == esperado.dtype
+    np.testing.assert_allclose(obtido, esperado, rtol=1e-5, atol=1e-6)
+
+
+def test_geometrias_nao_multiplas_e_float64():
+    rng = np.random.RandomState(1)
+    imagens = rng.rand(4, 70, 53)
+    for kwargs in (HOG_KWARGS, dict(orientations=7, pixels_per_cell=(6, 5), cells_per_block=(3, 2))):
+        esperado = np.stack([hog(img, **kwargs) for img in imagens])
+        obtido = BatchHOG((70, 53), **kwargs)(imagens)
+        assert obtido.dtype == np.float64
+        # O skimage acumula os histogramas em precisão simples internamente
+        np.testing.assert_allclose(obtido, esperado, rtol=1e-6, atol=1e-7)
+
+
+def test_imagem_constante():
+    # Gradiente nulo: todos os histogramas zerados, como no skimage
+    imagens = np.full((2, 64, 64), 0.5, dtype=np.float32)
+    esperado = np.stack([hog(img, **HOG_KWARGS) for img in imagens])
+    np.testing.assert_array_equal(BatchHOG((64, 64), **HOG_KWARGS)(imagens), esperado)
+
+
+def test_extractor_vetorizado_igual_ao_skimage():
+    rng = np.random.RandomState(2)
+    imgs = [Image.fromarray((rng.rand(120, 150, 3) * 255).astype(np.uint8)) for _ in range(5)]
+    spec = FeatureSpec(img_size=96, metodo="combined")
+
+    vetorizado = FeatureExtractor(spec, hog_vetorizado=True).extract_batch(imgs)
+    referencia = FeatureExtractor(spec, hog_vetorizado=False).extract_batch(imgs)
+    np.testing.assert_allclose(vetorizado, referencia, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,49 @@
+"""
+Predição em lote com imagens ilegíveis (app.py).
+"""
+
+import importlib
+import io
+
+import numpy as np
+from PIL import Image
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from features import FeatureExtractor, FeatureSpec
+from registry import ModelBundle
+
+
+def _jpeg(cor):
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), cor).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _bundle():
+    spec = FeatureSpec(img_size=16)
+    rng = np.random.RandomState(0)
+    X = rng.uniform(0, 1, size=(60, spec.n_features))
+    y = rng.randint(0, 2, size=60)
+    scaler = StandardScaler().fit(X)
+    rf = RandomForestClassifier(n_estimators=5, random_state=0, n_jobs=1).fit(scaler.transform(X), y)
+    return ModelBundle(versao="teste", feature_extractor=FeatureExtractor(spec, scaler), rf_model=rf,
+                       scaler=scaler, label_encoder=LabelEncoder().fit(["pizza", "sushi"]))
+
+
+def test_imagem_ilegivel_nao_derruba_o_lote(tmp_path, monkeypatch):
+    # O app cria uploads/ e o banco no diretório atual ao ser importado
+    monkeypatch.chdir(tmp_path)
+    app = importlib.import_module("app")
+    bundle = _bundle()
+    erros_antes = app.metrics.ERROS_INFERENCIA.valor(motivo="imagem_invalida")
+
+    imagens = [io.BytesIO(_jpeg((200, 30, 30))), io.BytesIO(b"nao e uma imagem"),
+               io.BytesIO(_jpeg((30, 30, 200)))]
+    rankings = app.rank_batch(imagens, bundle)
+
+    assert rankings[1] == [("erro_na_predicao", 0.0)]
+    for i in (0, 2):
+        assert rankings[i][0][0] in ("pizza", "sushi")
+        assert rankings[i] == app.rank_batch([io.BytesIO(imagens[i].getvalue())], bundle)[0]
+    assert app.metrics.ERROS_INFERENCIA.valor(motivo="imagem_invalida") == erros_antes + 1
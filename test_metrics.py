@@ -0,0 +1,34 @@
+"""
+Formato de exposição das métricas (metrics.py).
+"""
+
+from metrics import Counter, Histogram, Registry
+
+
+def test_histograma_cumulativo():
+    registro = Registry()
+    hist = registro.registrar(Histogram("etapa_segundos", "Duração.", labels=("etapa",),
+                                        buckets=(0.01, 0.1)))
+    for valor in (0.005, 0.05, 0.5):
+        hist.observe(valor, etapa="hog")
+
+    linhas = registro.expor().splitlines()
+    assert "# TYPE etapa_segundos histogram" in linhas
+    assert 'etapa_segundos_bucket{etapa="hog",le="0.01"} 1' in linhas
+    assert 'etapa_segundos_bucket{etapa="hog",le="0.1"} 2' in linhas
+    assert 'etapa_segundos_bucket{etapa="hog",le="+Inf"} 3' in linhas
+    assert 'etapa_segundos_count{etapa="hog"} 3' in linhas
+    assert hist.contagem(etapa="hog") == 3
+
+
+def test_contador_com_labels():
+    registro = Registry()
+    contador = registro.registrar(Counter("req_total", "Requisições.", labels=("rota", "status")))
+    contador.inc(rota="/api/upload", status=200)
+    contador.inc(2, rota="/api/upload", status=200)
+    contador.inc(rota="/api/upload", status=400)
+
+    texto = registro.expor()
+    assert 'req_total{rota="/api/upload",status="200"} 3.0' in texto
+    assert 'req_total{rota="/api/upload",status="400"} 1.0' in texto
+    assert contador.valor(rota="/api/upload", status="200") == 3.0
@@ -0,0 +1,46 @@
+"""
+Paridade entre a projeção combinada (reducao.py) e scaler + redutor do sklearn.
+"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from model_pack import load_pack, save_pack
+from reducao import ProjecaoLinear, criar_redutor
+
+
+def _dados(seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.uniform(0, 1, size=(300, 120))
+    y = rng.randint(0, 3, size=300)
+    X[:, :10] += 0.5 * y[:, np.newaxis]
+    return X, y, StandardScaler().fit(X)
+
+
+@pytest.mark.parametrize("metodo,whiten", [("pca", False), ("pca", True), ("projecao", False)])
+def test_projecao_igual_a_scaler_e_redutor(metodo, whiten):
+    X, _, scaler = _dados()
+    redutor = criar_redutor(metodo, 16)
+    if whiten:
+        redutor.set_params(whiten=True)
+    redutor.fit(scaler.transform(X))
+
+    projecao = ProjecaoLinear.from_sklearn(redutor, scaler)
+    assert projecao.n_features_in_ == 120 and projecao.n_components_ == 16
+    np.testing.assert_allclose(projecao.transform(X), redutor.transform(scaler.transform(X)),
+                               rtol=1e-9, atol=1e-9)
+
+
+def test_pacote_com_redutor(tmp_path):
+    X, y, scaler = _dados(seed=1)
+    redutor = criar_redutor("pca", 8).fit(scaler.transform(X))
+    Z = redutor.transform(scaler.transform(X))
+    rf = RandomForestClassifier(n_estimators=10, random_state=1, n_jobs=1).fit(Z, y)
+    encoder = LabelEncoder().fit(["a", "b", "c"])
+    save_pack(tmp_path, rf, scaler, encoder, redutor=redutor)
+
+    forest, entrada, _ = load_pack(tmp_path, mmap=True)
+    assert isinstance(entrada, ProjecaoLinear) and entrada.n_features_in_ == 120
+    np.testing.assert_array_equal(forest.predict(entrada.transform(X)), rf.predict(Z))
@@ -0,0 +1,81 @@
+"""
+Troca de versões do modelo (registry.py).
+"""
+
+import shutil
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from features import FeatureExtractor, FeatureSpec
+from model_pack import PACK_DIRNAME, save_pack
+from registry import ModelBundle, ModelRegistry, carregar_bundle, model_version
+
+
+class _BundleFalso(ModelBundle):
+    @property
+    def carregado(self):
+        return True
+
+    def aquecer(self):
+        pass
+
+
+def _bundle(versao):
+    return _BundleFalso(versao=versao, feature_extractor=FeatureExtractor(FeatureSpec(img_size=16)))
+
+
+def test_recarga_troca_apenas_quando_a_versao_muda(tmp_path):
+    (tmp_path / "modelo.bin").write_bytes(b"v1")
+    registry = ModelRegistry(tmp_path, lambda: _bundle(model_version(tmp_path)),
+                             _bundle(model_version(tmp_path)))
+    antigo = registry.atual()
+
+    assert registry.recarregar()["trocado"] is False
+
+    (tmp_path / "modelo.bin").write_bytes(b"v2-maior")
+    resultado = registry.recarregar()
+    assert resultado["trocado"] is True
+    assert registry.atual() is not antigo
+    assert registry.atual().versao == model_version(tmp_path) == resultado["versao"]
+
+
+def test_falha_na_recarga_mantem_a_versao_anterior(tmp_path):
+    (tmp_path / "modelo.bin").write_bytes(b"v1")
+    inicial = _bundle("v1")
+
+    def carregar():
+        raise ValueError("arquivo corrompido")
+
+    registry = ModelRegistry(tmp_path, carregar, inicial)
+    resultado = registry.recarregar(forcar=True)
+
+    assert resultado["trocado"] is False and "erro" in resultado
+    assert registry.atual() is inicial
+    assert registry.stats()["falhas"] == 1
+
+
+def test_pacote_respeita_forest_compilado_desligado(tmp_path, capsys):
+    rng = np.random.RandomState(0)
+    X = rng.uniform(0, 1, size=(40, FeatureSpec(img_size=16).n_features))
+    y = rng.randint(0, 2, size=40)
+    scaler = StandardScaler().fit(X)
+    rf = RandomForestClassifier(n_estimators=3, random_state=0, n_jobs=1).fit(scaler.transform(X), y)
+    encoder = LabelEncoder().fit(["pizza", "sushi"])
+    for nome, obj in [("rf_food_classifier", rf), ("scaler", scaler), ("label_encoder", encoder)]:
+        joblib.dump(obj, tmp_path / f"{nome}.joblib")
+    save_pack(tmp_path / PACK_DIRNAME, rf, scaler, encoder)
+
+    bundle = carregar_bundle(tmp_path, forest_compilado=False)
+    assert bundle.compiled_forest is None and bundle.rf_model is not None
+
+    bundle = carregar_bundle(tmp_path, incorporar_scaler=True)
+    assert bundle.compiled_forest is not None
+    assert "SCALER_INCORPORADO=1 ignorado" in capsys.readouterr().out
+
+    # Sem pacote, o forest do sklearn é descartado depois de compilado
+    shutil.rmtree(tmp_path / PACK_DIRNAME)
+    bundle = carregar_bundle(tmp_path)
+    assert bundle.compiled_forest is not None and bundle.rf_model is None and bundle.carregado
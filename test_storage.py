@@ -0,0 +1,101 @@
+"""
+Armazenamento de uploads por conteúdo (storage.py).
+"""
+
+import io
+import os
+import time
+
+from PIL import Image
+
+import storage
+from storage import BackgroundWriter, UploadStore, etag_corresponde
+
+
+def _jpeg(cor, tamanho=(400, 300)):
+    buf = io.BytesIO()
+    Image.new("RGB", tamanho, cor).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_deduplicacao_e_miniatura(tmp_path):
+    writer = BackgroundWriter()
+    store = UploadStore(tmp_path, writer, miniatura=(64, 64))
+    data = _jpeg((200, 30, 30))
+
+    nome = store.guardar(data, "foto.JPEG")
+    assert store.guardar(data, "outra.jpg") == nome
+    writer.flush()
+
+    assert nome.endswith(".jpg") and len(nome) == 64 + 4
+    path = store.caminho(nome)
+    assert path == tmp_path / nome[:2] / nome[2:4] / nome
+    assert path.read_bytes() == data
+    assert sorted(p.name for p in path.parent.iterdir()) == sorted([nome, store.nome_miniatura(nome)])
+    with Image.open(store.caminho(store.nome_miniatura(nome))) as miniatura:
+        assert max(miniatura.size) == 64
+    assert store.caminho("../../etc/passwd") is None and store.etag("20240101_foto.jpg") is None
+    assert etag_corresponde(f'W/"x", "{store.etag(nome)}"', store.etag(nome))
+    writer.close()
+
+
+def test_limpeza_por_idade_e_tamanho(tmp_path):
+    writer = BackgroundWriter()
+    store = UploadStore(tmp_path, writer, max_idade=3600, miniatura=(32, 32))
+    nomes = [store.guardar(_jpeg((i * 40, 0, 0)), "a.jpg") for i in range(4)]
+    writer.flush()
+
+    # O mais antigo passa da idade máxima; os demais ficam em ordem de uso
+    agora = time.time()
+    for i, nome in enumerate(nomes):
+        mtime = agora - 7200 if i == 0 else agora - 100 + i
+        for path in (store.caminho(nome), store.caminho(store.nome_miniatura(nome))):
+            os.utime(path, (mtime, mtime))
+
+    store.reindexar()
+    assert store.limpar()["removidos"] == 1
+    assert not store.caminho(nomes[0]).exists()
+    assert not store.caminho(store.nome_miniatura(nomes[0])).exists()
+
+    tamanho = sum(p.stat().st_size for p in tmp_path.rglob("*") if p.is_file())
+    store.max_bytes = tamanho - 1
+    assert store.limpar()["removidos"] == 1
+    assert not store.caminho(nomes[1]).exists() and store.caminho(nomes[3]).exists()
+    writer.close()
+
+
+def test_limites_aplicados_pelo_indice(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "CARENCIA_LIMPEZA", 0.0)
+    writer = BackgroundWriter()
+    store = UploadStore(tmp_path, writer, miniatura=(32, 32))
+    nomes = [store.guardar(_jpeg((0, i * 40, 0)), "a.jpg", sincrono=True) for i in range(3)]
+    writer.flush()
+    tamanho = sum(p.stat().st_size for p in tmp_path.rglob("*") if p.is_file())
+
+    # Uma duplicata volta para o fim da fila; o limite passa a ser checado a cada upload
+    store.guardar(_jpeg((0, 0, 0)), "de-novo.jpg", sincrono=True)
+    store.max_bytes = tamanho - 1
+    store.guardar(_jpeg((0, 0, 0)), "de-novo.jpg", sincrono=True)
+    writer.flush()
+    assert not store.caminho(nomes[1]).exists()
+    assert store.caminho(nomes[0]).exists() and store.caminho(nomes[2]).exists()
+    assert store.limpar()["bytes_restantes"] <= store.max_bytes
+    writer.close()
+
+
+def test_upload_removido_por_outro_processo(tmp_path):
+    writer = BackgroundWriter()
+    store = UploadStore(tmp_path, writer, miniatura=(32, 32))
+    data = _jpeg((0, 0, 200))
+    nome = store.guardar(data, "a.jpg", sincrono=True)
+    writer.flush()
+
+    # A limpeza de outro worker apaga os arquivos; o índice deste processo não vê
+    for path in (store.caminho(nome), store.caminho(store.nome_miniatura(nome))):
+        path.unlink()
+    assert store.guardar(data, "a.jpg", sincrono=True) == nome
+    assert store.caminho(nome).read_bytes() == data
+    writer.flush()
+    tamanho = sum(p.stat().st_size for p in tmp_path.rglob("*") if p.is_file())
+    assert store.limpar()["bytes_restantes"] == tamanho
+    writer.close()
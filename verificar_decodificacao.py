@@ -0,0 +1,88 @@
+"""
+Script para verificar que a decodificação reduzida de JPEG (draft) não muda
+as predições. Compara, em um conjunto de imagens de referência, as predições
+com decodificação completa e com draft, e o tempo de cada caminho.
+
+    python verificar_decodificacao.py "Food Classification dataset" --limite 500
+
+Retorna código de saída 1 se a concordância ficar abaixo de `--min-concordancia`.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import app
+from features import FeatureExtractor
+
+EXTENSOES = {".jpg", ".jpeg", ".png"}
+
+
+def listar_imagens(pasta: Path, limite: int):
+    imagens = sorted(p for p in pasta.rglob("*") if p.suffix.lower() in EXTENSOES)
+    return imagens[:limite] if limite else imagens
+
+
+def classificar(extrator: FeatureExtractor, imagens):
+    """Retorna `(labels, confiancas, segundos_de_decodificacao)`."""
+    vetores = []
+    decodificacao = 0.0
+    for path in imagens:
+        t0 = time.perf_counter()
+        img = extrator.load(path)
+        img.load()
+        decodificacao += time.perf_counter() - t0
+        vetores.append(extrator.extract(img))
+    X = extrator.transform(np.vstack(vetores))
+    labels, confiancas = app.classify_matrix(X)
+    return np.asarray(labels)[:, 0], np.asarray(confiancas)[:, 0], decodificacao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pasta", type=Path, help="pasta com as imagens de referência")
+    parser.add_argument("--limite", type=int, default=0, help="máximo de imagens (0 = todas)")
+    parser.add_argument("--min-concordancia", type=float, default=1.0,
+                        help="fração mínima de predições iguais (padrão: 1.0)")
+    args = parser.parse_args()
+
+    if not app.modelos_carregados():
+        print("[ERRO] Modelos não carregados")
+        return 2
+
+    imagens = listar_imagens(args.pasta, args.limite)
+    if not imagens:
+        print(f"[ERRO] Nenhuma imagem encontrada em {args.pasta}")
+        return 2
+
+    extrator = app.model_registry.atual().feature_extractor
+    spec, scaler = extrator.spec, extrator.scaler
+    completo = FeatureExtractor(spec, scaler, jpeg_draft=False)
+    draft = FeatureExtractor(spec, scaler, jpeg_draft=True)
+
+    print(f"Comparando {len(imagens)} imagens ({spec.img_size}x{spec.img_size}, {spec.metodo})...")
+    labels_c, conf_c, t_c = classificar(completo, imagens)
+    labels_d, conf_d, t_d = classificar(draft, imagens)
+
+    iguais = labels_c == labels_d
+    concordancia = float(iguais.mean())
+    print(f"\nConcordância das predições: {concordancia:.2%} ({iguais.sum()}/{len(imagens)})")
+    print(f"Diferença média de confiança: {np.abs(conf_c - conf_d).mean():.4f}")
+    print(f"Decodificação completa: {t_c * 1000 / len(imagens):.1f} ms/imagem")
+    print(f"Decodificação draft:    {t_d * 1000 / len(imagens):.1f} ms/imagem")
+
+    for i in np.flatnonzero(~iguais)[:10]:
+        print(f"  [DIFERENTE] {imagens[i]}: {labels_c[i]} -> {labels_d[i]}")
+
+    if concordancia < args.min_concordancia:
+        print(f"\n[ERRO] Concordância abaixo do mínimo ({args.min_concordancia:.2%})")
+        return 1
+    print("\n[OK] Predições preservadas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())